@@ -1,13 +1,28 @@
-from sqlalchemy import create_engine, text
+import os
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-DATABASE_URL = "sqlite:///./cbse.db"
+# API and job workers must point at the same file (e.g. a shared volume)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./cbse.db")
 
 engine = create_engine(
     DATABASE_URL,
-    connect_args={"check_same_thread": False}
+    # Wait for other workers' write locks instead of failing immediately
+    connect_args={"check_same_thread": False, "timeout": 30}
 )
 
+# WAL lets readers (listing endpoints, cache lookups) run while the
+# evaluation store and job queue write; NORMAL sync is safe under WAL.
+SQLITE_WAL = os.getenv("SQLITE_WAL", "1") == "1"
+
+if DATABASE_URL.startswith("sqlite") and SQLITE_WAL:
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
 SessionLocal = sessionmaker(
     autocommit=False,
     autoflush=False,
@@ -27,6 +42,85 @@ def create_tables():
             uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         );
         """))
+        conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS extraction_cache (
+            cache_key TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            answers TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_used_at REAL NOT NULL
+        );
+        """))
+        conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS ix_extraction_cache_last_used
+        ON extraction_cache (last_used_at);
+        """))
+        conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS evaluation_jobs (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            callback_url TEXT,
+            result TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            lease_owner TEXT,
+            lease_expires_at REAL,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        """))
+        conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS ix_evaluation_jobs_claim
+        ON evaluation_jobs (status, created_at);
+        """))
+        conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS evaluation_job_files (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            filename TEXT,
+            content_type TEXT NOT NULL,
+            data BLOB NOT NULL
+        );
+        """))
+        conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS ix_evaluation_job_files_job
+        ON evaluation_job_files (job_id, position);
+        """))
+        conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS evaluations (
+            id TEXT PRIMARY KEY,
+            exam_id TEXT,
+            student_id TEXT,
+            created_at REAL NOT NULL,
+            request_id TEXT,
+            engine TEXT,
+            total_questions INTEGER NOT NULL,
+            correct INTEGER NOT NULL,
+            score REAL NOT NULL,
+            error TEXT,
+            answer_key TEXT NOT NULL,
+            answers TEXT NOT NULL,
+            details TEXT NOT NULL,
+            timings TEXT NOT NULL,
+            result TEXT NOT NULL
+        );
+        """))
+        # One index per listing filter, each ending in the keyset (created_at, id)
+        conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS ix_evaluations_exam
+        ON evaluations (exam_id, created_at, id);
+        """))
+        conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS ix_evaluations_student
+        ON evaluations (student_id, created_at, id);
+        """))
+        conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS ix_evaluations_created
+        ON evaluations (created_at, id);
+        """))
         conn.commit()
 
 
@@ -39,6 +39,7 @@ def fallback_result():
         "total_questions": 3,
         "correct": 3,
         "wrong": 0,
+        "unanswered": 0,
         "score": 3,
         "details": [
             {"question": "1", "student_answer": "A", "correct_answer": "A", "result": "Correct"},
@@ -1,22 +1,52 @@
 from contextlib import asynccontextmanager
+import os
+import time
 import asyncio
 import logging
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import mcq
+from app import models
+from app.database import engine
+from app.routers import mcq, answer_keys, jobs, omr_templates, evaluations
+from app.worker import run_workers
+from app.utils.pool import shutdown_process_pool
+from app.utils.provider_clients import provider_clients
+from app.utils.evaluation_store import evaluation_store
+from app.utils import warmup, tracing
+from app.utils.metrics import metrics, CONTENT_TYPE
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+models.Base.metadata.create_all(bind=engine)
+
+# Job workers inside the API process (single-box deployments); 0 = use `python -m app.worker`
+EMBEDDED_JOB_WORKERS = int(os.getenv("EMBEDDED_JOB_WORKERS", "0"))
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Server starting up...")
+    # Heavy imports, provider clients and the CPU pool warm up in the background (see /ready)
+    warming = warmup.start_warm_up()
+    stop_workers = asyncio.Event()
+    workers = None
+    if EMBEDDED_JOB_WORKERS > 0:
+        workers = asyncio.create_task(run_workers(EMBEDDED_JOB_WORKERS, stop_workers))
     try:
         yield
     except (asyncio.CancelledError, KeyboardInterrupt):
         logger.info("Server interrupt caught (CancelledError/KeyboardInterrupt).")
     finally:
+        if warming and not warming.done():
+            warming.cancel()
+            await asyncio.gather(warming, return_exceptions=True)
+        if workers:
+            stop_workers.set()
+            await asyncio.gather(workers, return_exceptions=True)
+        await evaluation_store.close()
+        shutdown_process_pool()
+        await provider_clients.aclose()
         logger.info("Server shutting down...")
 
 app = FastAPI(title="MCQ Backend", lifespan=lifespan)
@@ -27,18 +57,69 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "Server-Timing"],
 )
 
 @app.middleware("http")
 async def catch_interruptions(request: Request, call_next):
-    try:
-        return await call_next(request)
-    except (asyncio.CancelledError, KeyboardInterrupt):
-        logger.warning("Request interrupted (CancelledError/KeyboardInterrupt).")
-        return JSONResponse(status_code=499, content={"detail": "Interrupted"})
+    """
+    Also times the request (metrics), and traces its stages (Server-Timing + JSON log).
+    Latency and the trace log are taken when the body has been sent, so streamed
+    responses (/mcq/evaluate-batch) include the work done while streaming; their
+    Server-Timing header can only hold the spans recorded before it was sent.
+    """
+    started = time.perf_counter()
+    request_id = tracing.new_request_id(request.headers.get("x-request-id"))
+
+    def finish(status: int, trace):
+        # Route template, not the raw path, so IDs in URLs don't explode the label set
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        metrics.requests.observe(time.perf_counter() - started, method=request.method, route=route, status=status)
+        if trace and trace.spans:
+            trace.log(method=request.method, route=route, status=status)
+
+    with tracing.traced(request_id) as trace:
+        try:
+            response = await call_next(request)
+        except (asyncio.CancelledError, KeyboardInterrupt):
+            logger.warning("Request interrupted (CancelledError/KeyboardInterrupt).")
+            finish(499, trace)
+            return JSONResponse(status_code=499, content={"detail": "Interrupted"}, headers={"X-Request-ID": request_id})
+        except BaseException:
+            finish(500, trace)
+            raise
+        response.headers["X-Request-ID"] = request_id
+        if trace:
+            response.headers["Server-Timing"] = trace.server_timing()
+
+    body = response.body_iterator
+
+    async def body_then_finish():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            finish(response.status_code, trace)
+
+    response.body_iterator = body_then_finish()
+    return response
 
 app.include_router(mcq.router)
+app.include_router(answer_keys.router)
+app.include_router(jobs.router)
+app.include_router(omr_templates.router)
+app.include_router(evaluations.router)
 
 @app.get("/")
 def root():
     return {"status": "online"}
+
+@app.get("/ready")
+def ready():
+    """Readiness: 503 until the startup warm-up has finished. `/` stays the liveness check."""
+    return JSONResponse(status_code=200 if warmup.state["ready"] else 503, content=warmup.state)
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Prometheus text exposition of request, stage, provider, cache and queue metrics."""
+    return Response(metrics.render(), media_type=CONTENT_TYPE)
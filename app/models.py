@@ -7,3 +7,10 @@ class AnswerKey(Base):
     subject = Column(String, nullable=False)
     answers = Column(Text, nullable=False)  # JSON string {"1":"A","2":"B"}
     total_marks = Column(Integer, nullable=False)
+
+
+class OMRTemplate(Base):
+    __tablename__ = "omr_templates"
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    definition = Column(Text, nullable=False)  # JSON: width, height, markers, aruco_ids, bubbles, fill_threshold
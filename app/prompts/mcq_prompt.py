@@ -32,3 +32,32 @@ Rules:
   ]
 }
 """
+
+ANSWER_KEY_EXTRACTION_PROMPT = """
+Extract the MCQ Answer Key from this document.
+Format: {"answers": {"1": "A", "2": "B", ...}}
+Rules: Map i->A, ii->B, iii->C, iv->D. Output STRICT JSON.
+"""
+
+STUDENT_ANSWER_EXTRACTION_PROMPT = """
+You are an MCQ answer extractor.
+Extract ONLY the selected option per question.
+Rules: Map i->A, ii->B, iii->C, iv->D. Output STRICT JSON.
+FORMAT: {"answers": {"1": "A", "2": "B"}}
+"""
+
+STUDENT_ANSWERS_FOR_KEY_PROMPT = """
+You are an MCQ answer extractor.
+Extract ONLY the selected option for each of these question numbers: {questions}.
+Return every one of them. Use "" for a question left unanswered.
+Rules: Map i->A, ii->B, iii->C, iv->D. Output STRICT JSON.
+FORMAT: {{"answers": {{"{first}": "A"}}}}
+"""
+
+MISSING_ANSWERS_EXTRACTION_PROMPT = """
+You are an MCQ answer extractor.
+Extract ONLY the selected option for these question numbers: {questions}.
+Ignore every other question. Use "" for a question left unanswered.
+Rules: Map i->A, ii->B, iii->C, iv->D. Output STRICT JSON.
+FORMAT: {{"answers": {{"{first}": "A"}}}}
+"""
@@ -0,0 +1,60 @@
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+import asyncio
+from typing import Optional
+
+from app.schemas import AnswerKeyCreate, AnswerKeyOut
+from app.prompts.mcq_prompt import ANSWER_KEY_EXTRACTION_PROMPT
+from app.routers.mcq import ai_extract_answers, normalize_answer_key
+from app.utils.answer_keys import create_answer_key, get_answer_key
+from app.utils.uploads import UploadBuffer, UploadTooLarge, MAX_UPLOAD_BYTES
+
+router = APIRouter(prefix="/mcq/answer-keys", tags=["Answer Keys"])
+
+
+@router.post("", response_model=AnswerKeyOut, summary="Register an answer key")
+def register_answer_key(payload: AnswerKeyCreate):
+    if not payload.answers:
+        raise HTTPException(status_code=400, detail="The answer key has no answers.")
+    return create_answer_key(payload.subject, payload.answers, payload.total_marks)
+
+
+@router.post("/upload", response_model=AnswerKeyOut, summary="Register an answer key from text or a file")
+async def upload_answer_key(
+    subject: str = Form(..., description="Subject or exam name for this key."),
+    type_answer_key_text: Optional[str] = Form(None, description="Type answer key here, e.g. '1 A, 2 B'."),
+    upload_answer_key_file: Optional[UploadFile] = File(None, description="Upload image/PDF of answer key."),
+    total_marks: Optional[int] = Form(None, description="Defaults to the number of questions."),
+):
+    answer_map = {}
+
+    if upload_answer_key_file:
+        if upload_answer_key_file.content_type not in ["image/jpeg", "image/png", "image/jpg", "application/pdf"]:
+            raise HTTPException(status_code=400, detail="The answer key file format is not supported. Please upload a PDF or Image (JPG/PNG).")
+
+        try:
+            key_buffer = await UploadBuffer.from_upload(upload_answer_key_file)
+        except UploadTooLarge:
+            raise HTTPException(status_code=413, detail=f"The answer key file is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+        try:
+            extracted_key = await ai_extract_answers([key_buffer], ANSWER_KEY_EXTRACTION_PROMPT)
+        finally:
+            key_buffer.close()
+        if not extracted_key:
+            raise HTTPException(status_code=422, detail="We couldn't read the answers from your uploaded answer key file. Please ensure it is clear and contains a list of answers.")
+        answer_map = {str(k): str(v).upper() for k, v in extracted_key.items()}
+
+    if not answer_map and type_answer_key_text:
+        answer_map = normalize_answer_key(type_answer_key_text)
+
+    if not answer_map:
+        raise HTTPException(status_code=400, detail="Answer key missing. Please either type the answers in the text box or upload an answer key file.")
+
+    return await asyncio.to_thread(create_answer_key, subject, answer_map, total_marks)
+
+
+@router.get("/{key_id}", response_model=AnswerKeyOut, summary="Fetch a registered answer key")
+def fetch_answer_key(key_id: int):
+    record = get_answer_key(key_id)
+    if not record:
+        raise HTTPException(status_code=404, detail=f"Answer key {key_id} not found.")
+    return record
@@ -0,0 +1,50 @@
+from fastapi import APIRouter, HTTPException, Query
+import asyncio
+import binascii
+from datetime import datetime
+from typing import Optional
+
+from app.utils.evaluation_store import evaluation_store
+from app.utils.metrics import metrics
+
+router = APIRouter(prefix="/mcq/evaluations", tags=["Evaluation History"])
+
+
+@router.get("", summary="List saved evaluations, newest first (keyset-paginated)")
+async def list_evaluations(
+    exam_id: Optional[str] = Query(None, description="Only this exam."),
+    student_id: Optional[str] = Query(None, description="Only this student."),
+    since: Optional[datetime] = Query(None, description="Created at or after (ISO 8601 or Unix time)."),
+    until: Optional[datetime] = Query(None, description="Created before (ISO 8601 or Unix time)."),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page."),
+    limit: int = Query(50, ge=1, le=500),
+):
+    try:
+        return await asyncio.to_thread(
+            evaluation_store.list,
+            exam_id=exam_id,
+            student_id=student_id,
+            since=since.timestamp() if since else None,
+            until=until.timestamp() if until else None,
+            cursor=cursor,
+            limit=limit,
+        )
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor. Pass next_cursor from the previous page unchanged.")
+
+
+@router.get("/{evaluation_id}", summary="One saved evaluation with key, answers, results and timings")
+async def get_evaluation(evaluation_id: str):
+    evaluation = await asyncio.to_thread(evaluation_store.get, evaluation_id)
+    if not evaluation:
+        raise HTTPException(status_code=404, detail=f"Evaluation {evaluation_id} not found.")
+    return evaluation
+
+
+@metrics.registry.collector
+def store_metrics():
+    stats = evaluation_store.snapshot()
+    yield "mcq_evaluation_store_rows_total", "counter", "Evaluations by write-behind outcome.", [
+        ({"outcome": outcome}, stats[outcome]) for outcome in ("queued", "written", "dropped", "failed")
+    ]
+    yield "mcq_evaluation_store_pending", "gauge", "Evaluations queued but not yet written.", [({}, stats["pending"])]
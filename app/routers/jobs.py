@@ -0,0 +1,140 @@
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import JSONResponse
+import asyncio
+from typing import List, Optional
+
+from app.utils import job_queue
+from app.utils.metrics import metrics
+from app.utils.uploads import UploadBuffer, UploadTooLarge, MAX_UPLOAD_BYTES
+
+router = APIRouter(prefix="/mcq/jobs", tags=["Evaluation Jobs"])
+
+SUPPORTED_TYPES = ["image/jpeg", "image/png", "image/jpg", "application/pdf"]
+
+
+@router.post("", status_code=202, summary="Queue an MCQ evaluation and return immediately")
+async def submit_job(
+    request: Request,
+    student_answer_scripts: List[UploadFile] = File(
+        ...,
+        description="Upload images/PDFs of student answers."
+    ),
+    type_answer_key_text: Optional[str] = Form(
+        None,
+        description="Type answer key here."
+    ),
+    upload_answer_key_file: Optional[UploadFile] = File(
+        None,
+        description="Upload image/PDF of answer key."
+    ),
+    answer_key_id: Optional[int] = Form(
+        None,
+        description="ID of an answer key registered via /mcq/answer-keys."
+    ),
+    omr_template_id: Optional[int] = Form(
+        None,
+        description="ID of a sheet layout registered via /mcq/omr-templates."
+    ),
+    callback_url: Optional[str] = Form(
+        None,
+        description="Optional URL that receives a POST with the result when the job finishes."
+    ),
+    marks_correct: Optional[float] = Form(
+        None,
+        description="Marks for a correct answer (default 1)."
+    ),
+    marks_wrong: Optional[float] = Form(
+        None,
+        description="Marks for a wrong answer; negative for negative marking, e.g. -0.25 (default 0)."
+    ),
+    marks_unanswered: Optional[float] = Form(
+        None,
+        description="Marks for an unanswered question (default 0)."
+    ),
+    exam_id: Optional[str] = Form(
+        None,
+        description="Exam this evaluation belongs to (saved with it; see /mcq/evaluations)."
+    ),
+    student_id: Optional[str] = Form(
+        None,
+        description="Student this evaluation belongs to (saved with it; see /mcq/evaluations)."
+    )
+):
+    if callback_url:
+        callback_error = await asyncio.to_thread(job_queue.callback_url_error, callback_url)
+        if callback_error:
+            raise HTTPException(status_code=400, detail=callback_error)
+
+    if not (type_answer_key_text or upload_answer_key_file or answer_key_id is not None):
+        raise HTTPException(status_code=400, detail="Answer key missing. Please either type the answers in the text box, upload an answer key file or pass an answer_key_id.")
+
+    uploads = [("script", i, script) for i, script in enumerate(student_answer_scripts)]
+    for _, _, script in uploads:
+        if script.content_type not in SUPPORTED_TYPES:
+            raise HTTPException(status_code=400, detail=f"The file '{script.filename}' is not supported. Only PDF, JPG, and PNG are allowed.")
+
+    if upload_answer_key_file:
+        if upload_answer_key_file.content_type not in SUPPORTED_TYPES:
+            raise HTTPException(status_code=400, detail="The answer key file format is not supported. Please upload a PDF or Image (JPG/PNG).")
+        uploads.append(("key", 0, upload_answer_key_file))
+
+    # Spooled uploads go straight into the BLOB column from their buffers
+    buffers = []
+    try:
+        for role, pos, upload in uploads:
+            try:
+                buffers.append((role, pos, await UploadBuffer.from_upload(upload)))
+            except UploadTooLarge:
+                raise HTTPException(status_code=413, detail=f"The file '{upload.filename}' is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+
+        files = [(role, pos, buf.filename, buf.content_type, buf.view) for role, pos, buf in buffers]
+        payload = {
+            "type_answer_key_text": type_answer_key_text,
+            "answer_key_id": answer_key_id,
+            "omr_template_id": omr_template_id,
+            "marks_correct": marks_correct,
+            "marks_wrong": marks_wrong,
+            "marks_unanswered": marks_unanswered,
+            "exam_id": exam_id,
+            "student_id": student_id,
+        }
+        job_id = await asyncio.to_thread(job_queue.enqueue_job, payload, files, callback_url)
+    finally:
+        for _, _, buf in buffers:
+            buf.close()
+
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": str(request.url_for("job_status", job_id=job_id)),
+        "result_url": str(request.url_for("job_result", job_id=job_id)),
+    }
+
+
+@router.get("/{job_id}", name="job_status", summary="Job status")
+async def job_status(job_id: str):
+    job = await asyncio.to_thread(job_queue.get_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+    job.pop("result")
+    return job
+
+
+@router.get("/{job_id}/result", name="job_result", summary="Job result (202 while still running)")
+async def job_result(job_id: str):
+    job = await asyncio.to_thread(job_queue.get_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+    if job["status"] == "done":
+        return job["result"]
+    if job["status"] == "failed":
+        return JSONResponse(status_code=422, content={"job_id": job_id, "status": "failed", "error": job["error"]})
+    return JSONResponse(status_code=202, content={"job_id": job_id, "status": job["status"]})
+
+
+@metrics.registry.collector
+def queue_metrics():
+    depth = job_queue.queue_depth()
+    yield "mcq_job_queue_depth", "gauge", "Evaluation jobs by status.", [
+        ({"status": status}, depth.get(status, 0)) for status in sorted({"queued", "running", *depth})
+    ]
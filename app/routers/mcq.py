@@ -1,24 +1,75 @@
 from fastapi import APIRouter, UploadFile, File, Form
-import os, json, re, base64, io
-from typing import List, Optional
+from fastapi.responses import StreamingResponse
+import os, json, re, base64, io, time, asyncio, logging, functools, contextlib
+from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
+from pydantic import BaseModel, Field
 
-from google import genai
-from google.genai import types
-from google.genai import errors as genai_errors
-import cohere
-import fitz  # PyMuPDF
+
+from app.prompts.mcq_prompt import ANSWER_KEY_EXTRACTION_PROMPT, STUDENT_ANSWERS_FOR_KEY_PROMPT, MISSING_ANSWERS_EXTRACTION_PROMPT
+from app.utils.answer_keys import get_answer_map
+from app.utils.extraction_cache import extraction_cache, content_digest, CACHE_ENABLED
+from app.utils.omr_templates import load_template
+from app.utils.pool import run_in_process
+from app.utils.rasterize import render_pdf, render_cache, page_count
+from app.utils.chunking import EXTRACTION_CHUNK_PAGES, EXTRACTION_CHUNK_MIN_PAGES, plan_chunks, split_pdf, merge_answers
+from app.utils.uploads import UploadBuffer, UploadTooLarge, MAX_UPLOAD_BYTES
+from app.utils.provider_router import provider_router
+from app.utils.provider_clients import provider_clients
+from app.utils.metrics import metrics
+from app.utils.evaluation_store import evaluation_store
+from app.utils import tracing, text_layer
 
 # --------------------------------------------------
 # ENV + ROUTER
 # --------------------------------------------------
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/mcq", tags=["MCQ Evaluation"])
 
-client = genai.Client(
-    api_key=os.getenv("GEMINI_API_KEY")
-)
+# Provider clients live in a process-wide registry (pooled connections,
+# opened and closed by the app lifespan)
+
+# --------------------------------------------------
+# PROVIDER CONCURRENCY LIMITS
+# --------------------------------------------------
+# Upper bound on in-flight calls per provider so a burst of uploads
+# cannot exhaust provider quotas or open unbounded connections.
+PROVIDER_CONCURRENCY = {
+    "gemini": int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")),
+    "azure": int(os.getenv("AZURE_MAX_CONCURRENCY", "4")),
+    "cohere": int(os.getenv("COHERE_MAX_CONCURRENCY", "4")),
+}
+
+provider_slots = {
+    name: asyncio.Semaphore(limit) for name, limit in PROVIDER_CONCURRENCY.items()
+}
+provider_in_flight = {name: 0 for name in PROVIDER_CONCURRENCY}
+
+
+@contextlib.asynccontextmanager
+async def provider_slot(name: str):
+    """Holds one of the provider's concurrency slots, counted in provider_in_flight."""
+    async with provider_slots[name]:
+        provider_in_flight[name] += 1
+        try:
+            yield
+        finally:
+            provider_in_flight[name] -= 1
+
+COHERE_MODEL = "command-r-plus-08-2024"
+
+# Questions of the key that the model skipped are asked for once more, by number
+MISSING_REEXTRACT_ENABLED = os.getenv("MISSING_REEXTRACT_ENABLED", "1") == "1"
+
+# Files above this size go to Gemini through the Files API, streamed in
+# chunks from the upload buffer, instead of as one inline bytes copy.
+GEMINI_INLINE_MAX_BYTES = int(os.getenv("GEMINI_INLINE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+# PDF pages sent to Azure as images (72 DPI matches PyMuPDF's default render)
+AZURE_PAGE_DPI = int(os.getenv("AZURE_PAGE_DPI", "72"))
 
 # --------------------------------------------------
 # HELPER: Normalize ANY answer key to {q: A/B/C/D}
@@ -43,99 +94,791 @@ def zero_score(answer_map: dict, error_msg: str):
             "question": q,
             "student_answer": "",
             "correct_answer": ans,
-            "result": "Wrong"
+            "result": "Unanswered"
         })
 
     return {
         "total_questions": len(details),
         "correct": 0,
-        "wrong": len(details),
+        "wrong": 0,
+        "unanswered": len(details),
         "score": 0,
         "details": details,
         "error": error_msg
     }
 
 
+# --------------------------------------------------
+# HELPER: PDF parsing (blocking, run in a worker thread)
+# --------------------------------------------------
+def pdf_text(pdf_bytes) -> str:
+    import fitz  # PyMuPDF
+
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        return "".join(page.get_text() for page in doc)
+    finally:
+        doc.close()
+
+
+# --------------------------------------------------
+# HELPER: Provider payloads (built once, shared by every tier)
+# --------------------------------------------------
+class TierSkipped(Exception):
+    """The tier cannot handle this input (e.g. no PDF text for Cohere); not a health signal."""
+
+
+class ProviderPayloads:
+    """
+    Lazily prepares what each provider needs from the upload buffers.
+    Each payload is built at most once per extraction, even if several
+    tiers of the same provider are tried.
+    """
+
+    def __init__(self, files: List[UploadBuffer]):
+        self.files = files
+        self._tasks = {}
+        self.uploaded = []
+
+    def _once(self, name: str, build):
+        if name not in self._tasks:
+            self._tasks[name] = asyncio.ensure_future(build())
+        # Shielded so a cancelled hedge does not cancel the build other tiers are waiting on
+        return asyncio.shield(self._tasks[name])
+
+    async def gemini_parts(self) -> list:
+        """Small files are sent inline; large ones are uploaded chunk by chunk to the Files API."""
+        async def build():
+            from google.genai import types
+
+            parts = []
+            async with provider_slot("gemini"):
+                for f in self.files:
+                    if f.size <= GEMINI_INLINE_MAX_BYTES:
+                        parts.append(types.Part.from_bytes(data=f.bytes(), mime_type=f.content_type))
+                        continue
+                    with metrics.time_stage("gemini_file_upload"):
+                        remote = await provider_clients.gemini.aio.files.upload(file=f.stream(), config=types.UploadFileConfig(mime_type=f.content_type))
+                    metrics.provider_bytes.inc(f.size, provider="gemini")
+                    self.uploaded.append(remote.name)
+                    parts.append(types.Part.from_uri(file_uri=remote.uri, mime_type=f.content_type))
+            return parts
+        return await self._once("gemini", build)
+
+    async def azure_content(self) -> list:
+        async def build():
+            content = []
+            for f in self.files:
+                if f.content_type == "application/pdf":
+                    with metrics.time_stage("render_pages"):
+                        pages = await render_pdf(f.bytes(), dpi=AZURE_PAGE_DPI)
+                    for png in pages:
+                        content.append({"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64.b64encode(png).decode('ascii')}"}})
+                else:
+                    content.append({"type": "image_url", "image_url": {"url": f"data:{f.content_type};base64,{base64.b64encode(f.view).decode('ascii')}"}})
+            return content
+        return await self._once("azure", build)
+
+    async def pdf_text(self) -> str:
+        async def build():
+            text_content = ""
+            for f in self.files:
+                if f.content_type == "application/pdf":
+                    try:
+                        with metrics.time_stage("pdf_text"):
+                            text_content += await asyncio.to_thread(pdf_text, f.view)
+                    except Exception: pass
+            return text_content
+        return await self._once("text", build)
+
+    async def close(self):
+        for task in self._tasks.values():
+            task.cancel()
+        for name in self.uploaded:
+            try:
+                await provider_clients.gemini.aio.files.delete(name=name)
+            except Exception:
+                pass
+
+
+def parse_answers(raw: str) -> dict:
+    with metrics.time_stage("parse"):
+        return _parse_answers(raw)
+
+
+def _parse_answers(raw: str) -> dict:
+    raw = raw.strip().replace("```json", "").replace("```", "").strip()
+    data = json.loads(raw)
+    answers = data.get("answers", data) if isinstance(data, dict) else data # Support both nested and flat responses
+    if not isinstance(answers, dict):
+        raise ValueError("response is not a JSON answer map")
+    return answers
+
+
+# --------------------------------------------------
+# HELPER: One call per provider tier (raise on failure)
+# --------------------------------------------------
+def record_usage(provider: str, model: str, input_tokens, output_tokens):
+    if isinstance(input_tokens, int):
+        metrics.provider_tokens.inc(input_tokens, provider=provider, model=model, kind="input")
+    if isinstance(output_tokens, int):
+        metrics.provider_tokens.inc(output_tokens, provider=provider, model=model, kind="output")
+
+
+async def call_gemini(model: str, payloads: ProviderPayloads, prompt: str) -> dict:
+    from google.genai import types
+
+    parts = await payloads.gemini_parts()
+    inline = sum(len(p.inline_data.data) for p in parts if getattr(p, "inline_data", None))
+    metrics.provider_bytes.inc(inline + len(prompt), provider="gemini")
+    async with provider_slot("gemini"):
+        response = await provider_clients.gemini.aio.models.generate_content(
+            model=model,
+            contents=[types.Content(role="user", parts=parts + [types.Part.from_text(text=prompt)])],
+            config=types.GenerateContentConfig(response_mime_type="application/json")
+        )
+    usage = getattr(response, "usage_metadata", None)
+    record_usage("gemini", model, getattr(usage, "prompt_token_count", None), getattr(usage, "candidates_token_count", None))
+    if not response.text:
+        raise ValueError(f"{model} returned an empty response")
+    return parse_answers(response.text)
+
+
+async def call_azure(payloads: ProviderPayloads, prompt: str) -> dict:
+    msg_content = [{"type": "text", "text": prompt}] + await payloads.azure_content()
+    metrics.provider_bytes.inc(len(prompt) + sum(len(c["image_url"]["url"]) for c in msg_content[1:]), provider="azure")
+    deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
+    async with provider_slot("azure"):
+        resp = await provider_clients.azure.chat.completions.create(model=deployment, messages=[{"role": "system", "content": "Extract MCQ answers. JSON only."}, {"role": "user", "content": msg_content}], response_format={"type": "json_object"})
+    usage = getattr(resp, "usage", None)
+    record_usage("azure", deployment, getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None))
+    return parse_answers(resp.choices[0].message.content)
+
+
+async def call_cohere(payloads: ProviderPayloads, prompt: str) -> dict:
+    text_content = await payloads.pdf_text()
+    if not text_content:
+        raise TierSkipped("no PDF text layer")
+    message = prompt + "\n\nTEXT:\n" + text_content
+    metrics.provider_bytes.inc(len(message.encode("utf-8")), provider="cohere")
+    async with provider_slot("cohere"):
+        resp = await provider_clients.cohere.chat(model=COHERE_MODEL, message=message, response_format={"type": "json_object"})
+    tokens = getattr(getattr(resp, "meta", None), "tokens", None)
+    record_usage("cohere", COHERE_MODEL, getattr(tokens, "input_tokens", None), getattr(tokens, "output_tokens", None))
+    return parse_answers(resp.text)
+
+
 # --------------------------------------------------
 # HELPER: AI EXTRACTION ENGINE (REUSABLE)
 # --------------------------------------------------
-async def ai_extract_answers(files: List[UploadFile], custom_prompt: str) -> dict:
+GEMINI_MODELS = ["gemini-2.0-flash-exp", "gemini-1.5-flash", "gemini-1.5-flash-8b", "gemini-1.5-pro"]
+
+# Hedging: if the running tier has not answered after its observed p95
+# (or HEDGE_DELAY_SECONDS before there are samples), the next tier starts
+# in parallel and the first valid answer map wins.
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "0") == "1"
+HEDGE_DELAY_SECONDS = float(os.getenv("HEDGE_DELAY_SECONDS", "4.0"))
+HEDGE_MIN_DELAY_SECONDS = float(os.getenv("HEDGE_MIN_DELAY_SECONDS", "0.5"))
+HEDGE_USE_P95 = os.getenv("HEDGE_USE_P95", "1") == "1"
+
+
+def hedge_delay(tier: str) -> float:
+    p95 = provider_router.p95(tier) if HEDGE_USE_P95 else None
+    return max(HEDGE_MIN_DELAY_SECONDS, p95 if p95 is not None else HEDGE_DELAY_SECONDS)
+
+
+def tier_labels(tier: str) -> Tuple[str, str]:
+    """("azure", "deployment") for "azure:deployment"; bare tier names are Gemini models."""
+    provider, _, model = tier.partition(":")
+    return (provider, model) if model else ("gemini", tier)
+
+
+async def race_tiers(tiers: List[str], calls: dict, payloads: ProviderPayloads, prompt: str, hedge: bool) -> Tuple[Optional[str], dict]:
+    """
+    Tries tiers in order and returns (winning tier, answers), or (None, {}).
+    Without hedging one tier runs at a time; with hedging a second one is
+    started when the first is slower than its hedge delay.
+    """
+    pending = {}  # task -> (tier, started, is_hedge)
+    queue = list(tiers)
+
+    def launch(is_hedge: bool):
+        tier = queue.pop(0)
+        task = asyncio.ensure_future(calls[tier](payloads, prompt))
+        pending[task] = (tier, time.perf_counter(), is_hedge)
+        return tier
+
+    if hedge:
+        provider_router.hedging["requests"] += 1
+    try:
+        while pending or queue:
+            if not pending:
+                launch(False)
+            timeout = None
+            if hedge and queue and len(pending) == 1:
+                (tier, started, _), = pending.values()
+                timeout = max(0.0, started + hedge_delay(tier) - time.perf_counter())
+
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                hedged = launch(True)
+                provider_router.hedging["hedges_fired"] += 1
+                logger.info(f"Hedging extraction with {hedged} (slow primary)")
+                continue
+
+            for task in done:
+                tier, started, is_hedge = pending.pop(task)
+                provider, model = tier_labels(tier)
+                elapsed = time.perf_counter() - started
+                try:
+                    answers = task.result()
+                except TierSkipped:
+                    provider_router.release(tier)
+                    metrics.provider_calls.inc(provider=provider, model=model, outcome="skipped")
+                    tracing.record("attempt", elapsed, tier=tier, outcome="skipped")
+                    continue
+                except Exception as e:
+                    provider_router.record_failure(tier, e, elapsed)
+                    metrics.provider_calls.inc(provider=provider, model=model, outcome="error")
+                    metrics.provider_latency.observe(elapsed, provider=provider, model=model)
+                    tracing.record("attempt", elapsed, tier=tier, outcome="error", hedge=is_hedge, error=type(e).__name__)
+                    logger.warning(f"Extraction tier {tier} failed: {e}")
+                    continue
+
+                provider_router.record_success(tier, elapsed)
+                metrics.provider_calls.inc(provider=provider, model=model, outcome="success")
+                metrics.provider_latency.observe(elapsed, provider=provider, model=model)
+                tracing.record("attempt", elapsed, tier=tier, outcome="success", hedge=is_hedge)
+                if is_hedge:
+                    provider_router.hedging["hedges_won"] += 1
+                return tier, answers
+        return None, {}
+    finally:
+        for task, (tier, started, is_hedge) in pending.items():
+            task.cancel()
+            provider_router.release(tier)
+            provider, model = tier_labels(tier)
+            metrics.provider_calls.inc(provider=provider, model=model, outcome="cancelled")
+            tracing.record("attempt", time.perf_counter() - started, tier=tier, outcome="cancelled", hedge=is_hedge)
+        for tier in queue:
+            provider_router.release(tier)
+
+
+def preprocess_variant(files: List[UploadBuffer]) -> str:
+    """Preprocessing settings, for the cache key of submissions with photos (PDFs are sent as uploaded)."""
+    if all(f.content_type == "application/pdf" for f in files):
+        return ""
+    from app.utils.preprocess import options_signature
+    return options_signature()
+
+
+async def preprocess_files(files: List[UploadBuffer], options=None) -> Tuple[List[UploadBuffer], List[UploadBuffer]]:
+    """
+    Runs the image preprocessing stage on every photo in the CPU pool.
+    Returns (files to send, new buffers the caller must close). A photo
+    that fails to preprocess is sent as uploaded.
+    """
+    from app.utils import preprocess
+
+    if not preprocess.PREPROCESS_ENABLED:
+        return files, []
+    images = [f for f in files if f.content_type != "application/pdf"]
+    results = await asyncio.gather(
+        *(run_in_process(preprocess.preprocess_image, f.bytes(), f.content_type, options) for f in images),
+        return_exceptions=True
+    )
+    processed = {}
+    for f, result in zip(images, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Preprocessing {f.filename} failed: {result}")
+        elif not result[2].get("kept_original"):
+            data, content_type, info = result
+            processed[id(f)] = UploadBuffer(f.filename, content_type, memoryview(data))
+            logger.info(f"Preprocessed {f.filename}: {info['original_bytes']} -> {info['bytes']} bytes, warped={info['warped']}, skew={info['skew']}")
+    return [processed.get(id(f), f) for f in files], list(processed.values())
+
+
+async def chunk_files(files: List[UploadBuffer], chunk_pages: int) -> Tuple[List[List[UploadBuffer]], List[UploadBuffer]]:
+    """
+    Splits a long submission into page chunks (see app.utils.chunking).
+    Returns (chunks, new buffers the caller must close); a single chunk
+    holding the original files when chunking is off or not worth it.
+    """
+    if chunk_pages <= 0:
+        return [files], []
+    counts = [
+        await asyncio.to_thread(page_count, f.view) if f.content_type == "application/pdf" else 1
+        for f in files
+    ]
+    if sum(counts) < max(EXTRACTION_CHUNK_MIN_PAGES, chunk_pages + 1):
+        return [files], []
+
+    plan = plan_chunks(counts, chunk_pages)
+    runs_by_file = {}
+    for chunk in plan:
+        for file_index, start, end in chunk:
+            runs_by_file.setdefault(file_index, []).append((start, end))
+    parts = {}
+    for file_index, runs in runs_by_file.items():
+        f = files[file_index]
+        if f.content_type != "application/pdf" or runs == [(0, counts[file_index] - 1)]:
+            continue
+        pdfs = await run_in_process(split_pdf, f.bytes(), runs)
+        for (start, end), pdf in zip(runs, pdfs):
+            parts[(file_index, start, end)] = UploadBuffer(f"{f.filename}[{start + 1}-{end + 1}]", "application/pdf", memoryview(pdf))
+
+    chunks = [[parts.get(run, files[run[0]]) for run in chunk] for chunk in plan]
+    return chunks, list(parts.values())
+
+
+async def extract_chunk(files: List[UploadBuffer], candidates: List[tuple], calls: dict, prompt: str, hedge: bool) -> Tuple[Optional[str], dict]:
+    payloads = ProviderPayloads(files)
+    try:
+        return await race_tiers(provider_router.order(candidates), calls, payloads, prompt, hedge)
+    finally:
+        await payloads.close()
+
+
+async def text_layer_answers(files: List[UploadBuffer], expected_questions: List[str]) -> Optional[dict]:
+    """
+    Answers read from the text layer of typed / digitally filled PDFs, or
+    None unless every file is a PDF and every expected question is found.
+    """
+    if not (text_layer.TEXT_LAYER_ENABLED and expected_questions) or any(f.content_type != "application/pdf" for f in files):
+        return None
+    with metrics.time_stage("text_layer"):
+        try:
+            answers = {}
+            for f in files:
+                answers.update(await asyncio.to_thread(text_layer.read_answers, f.view))
+        except Exception as e:
+            logger.warning(f"Text layer skipped: {e}")
+            return None
+    if not text_layer.covers(answers, expected_questions):
+        return None
+    return {str(q): answers[str(q)] for q in expected_questions}
+
+
+async def ai_extract_answers(files: List[UploadBuffer], custom_prompt: str, hedge: Optional[bool] = None, chunk_pages: Optional[int] = None) -> dict:
     """
     Common extraction logic for both student sheets and answer keys.
+    Every provider call is awaited on its async client, so a slow model
+    never blocks the event loop for other requests.
+    Tiers are tried in the order given by the provider router, which
+    skips tiers with an open circuit and prefers the faster, healthier
+    ones within each provider. With hedging (HEDGE_ENABLED or hedge=True)
+    a slow tier is raced against the next one. Long submissions can be
+    split into page chunks extracted concurrently (EXTRACTION_CHUNK_PAGES
+    or chunk_pages) and merged.
     Returns: {"1": "A", "2": "B", ...}
     """
-    all_parts = []
-    text_content = ""
+    files = [
+        f for f in files
+        if f.content_type in ["image/jpeg", "image/png", "image/jpg", "image/webp", "application/pdf"] and f.size >= 10
+    ]
+    if not files:
+        metrics.extractions.inc(source="none")
+        return {}
 
-    for file in files:
-        if file.content_type not in ["image/jpeg", "image/png", "image/jpg", "application/pdf"]:
-            continue
+    blobs = [(f.content_type, f.view) for f in files]
+
+    azure_deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
+    azure_tier, cohere_tier = f"azure:{azure_deployment}", f"cohere:{COHERE_MODEL}"
+
+    # 0. Cache (same bytes + same prompt + a model that answered before)
+    digest = content_digest(blobs, preprocess_variant(files)) if CACHE_ENABLED else None
+    if digest:
+        with metrics.time_stage("cache_lookup"):
+            hit = await extraction_cache.get(digest, custom_prompt, GEMINI_MODELS + [azure_tier, cohere_tier])
+        if hit:
+            metrics.extractions.inc(source="cache")
+            return hit[1]
+
+    # 1. Gemini -> 2. Azure -> 3. Cohere, health-ordered
+    candidates = [(model, "gemini") for model in GEMINI_MODELS]
+    calls = {model: functools.partial(call_gemini, model) for model in GEMINI_MODELS}
+    if provider_clients.azure_configured:
+        candidates.append((azure_tier, "azure"))
+        calls[azure_tier] = call_azure
+    if os.getenv("COHERE_API_KEY") and any(f.content_type == "application/pdf" for f in files):
+        candidates.append((cohere_tier, "cohere"))
+        calls[cohere_tier] = call_cohere
+
+    hedge = HEDGE_ENABLED if hedge is None else hedge
+    # Photos are straightened and shrunk once, before any provider payload is built
+    with metrics.time_stage("preprocess"):
+        files, owned = await preprocess_files(files)
+    started = time.perf_counter()
+    try:
+        chunks, parts = await chunk_files(files, EXTRACTION_CHUNK_PAGES if chunk_pages is None else chunk_pages)
+        owned += parts
+        if len(chunks) == 1:
+            tier, answers = await extract_chunk(chunks[0], candidates, calls, custom_prompt, hedge)
+        else:
+            results = await asyncio.gather(*(extract_chunk(chunk, candidates, calls, custom_prompt, hedge) for chunk in chunks))
+            answers, conflicts = merge_answers([chunk_answers for _, chunk_answers in results])
+            failed = sum(1 for chunk_tier, _ in results if chunk_tier is None)
+            tier = next((chunk_tier for chunk_tier, _ in results if chunk_tier), None)
+            logger.info(f"Chunked extraction: {len(chunks)} chunks, {failed} failed, {len(conflicts)} conflicting questions")
+            if failed:
+                tier = None  # a partial answer map is returned but not cached
+    finally:
+        for buffer in owned:
+            buffer.close()
+        elapsed = time.perf_counter() - started
+        metrics.stages.observe(elapsed, pipeline="mcq", stage="extraction")
+
+    if not answers:
+        source = "none"
+    else:
+        source = "chunked" if len(chunks) > 1 else "provider"
+    metrics.extractions.inc(source=source)
+    tracing.record("extraction", elapsed, source=source, tier=tier, chunks=len(chunks))
+    if tier and digest:
+        await extraction_cache.put(digest, custom_prompt, tier, answers)
+    return answers
+
+
+# --------------------------------------------------
+# HELPER: Answer key resolution (ID -> file -> text)
+# --------------------------------------------------
+ANSWER_KEY_MISSING = "Answer key missing. Please either type the answers in the text box, upload an answer key file or pass an answer_key_id."
+
+
+async def resolve_answer_key(
+    type_answer_key_text: Optional[str],
+    upload_answer_key_file: Optional[UploadFile],
+    answer_key_id: Optional[int]
+) -> Tuple[dict, Optional[str]]:
+    """
+    Returns (answer_map, error). answer_map is empty when error is set.
+    """
+    answer_map = {}
+
+    if answer_key_id is not None:
+        answer_map = await get_answer_map(answer_key_id)
+        if not answer_map:
+            return {}, f"Answer key {answer_key_id} was not found. Please register it first or pick another key."
+    
+    if not answer_map and upload_answer_key_file:
+        # Validate format
+        if upload_answer_key_file.content_type not in ["image/jpeg", "image/png", "image/jpg", "application/pdf"]:
+            return {}, "The answer key file format is not supported. Please upload a PDF or Image (JPG/PNG)."
+
+        try:
+            key_buffer = await UploadBuffer.from_upload(upload_answer_key_file)
+        except UploadTooLarge:
+            return {}, f"The answer key file is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB. Please upload a smaller file."
+        try:
+            extracted_key = await ai_extract_answers([key_buffer], ANSWER_KEY_EXTRACTION_PROMPT)
+        finally:
+            key_buffer.close()
+        if not extracted_key:
+            return {}, "We couldn't read the answers from your uploaded answer key file. Please ensure it is clear and contains a list of answers."
         
-        file_bytes = await file.read()
-        await file.seek(0)
-        if not file_bytes or len(file_bytes) < 10:
-            continue
+        # Normalize keys/values to string uppercase
+        answer_map = {str(k): str(v).upper() for k, v in extracted_key.items()}
+    
+    if not answer_map and type_answer_key_text:
+        answer_map = normalize_answer_key(type_answer_key_text)
 
-        all_parts.append(types.Part.from_bytes(data=file_bytes, mime_type=file.content_type))
+    if not answer_map:
+        return {}, ANSWER_KEY_MISSING
 
-        if file.content_type == "application/pdf":
-            try:
-                doc = fitz.open(stream=file_bytes, filetype="pdf")
-                for page in doc:
-                    text_content += page.get_text()
-            except: pass
+    return answer_map, None
 
-    if not all_parts:
-        return {}
 
-    # 1. Gemini
-    models = ["gemini-2.0-flash-exp", "gemini-1.5-flash", "gemini-1.5-flash-8b", "gemini-1.5-pro"]
-    for model in models:
+async def resolve_omr_template(omr_template_id: Optional[int]) -> Tuple[Optional[dict], Optional[str]]:
+    if omr_template_id is None:
+        return None, None
+    template = await load_template(omr_template_id)
+    if not template:
+        return None, f"OMR template {omr_template_id} was not found. Please register it first or pick another template."
+    return template, None
+
+
+# --------------------------------------------------
+# HELPER: Student script validation
+# --------------------------------------------------
+def save_evaluation(result: dict, answer_map: dict, exam_id: Optional[str], student_id: Optional[str]) -> dict:
+    """Queues a graded result in the evaluation store and adds its evaluation_id."""
+    if not result.get("details"):
+        return result  # rejected uploads and missing keys are not evaluations
+    trace = tracing.current()
+    evaluation_id = evaluation_store.record(
+        result, answer_map, exam_id, student_id,
+        timings=list(trace.spans) if trace else None,
+        request_id=trace.request_id if trace else None,
+    )
+    return {**result, "evaluation_id": evaluation_id} if evaluation_id else result
+
+
+def resolve_marking(marks_correct: Optional[float], marks_wrong: Optional[float], marks_unanswered: Optional[float]):
+    """A Marking with the given overrides, or None for the default (MCQ_MARKS_* env) marking."""
+    overrides = {"correct": marks_correct, "wrong": marks_wrong, "unanswered": marks_unanswered}
+    overrides = {k: v for k, v in overrides.items() if v is not None}
+    if not overrides:
+        return None
+    from app.utils.scoring import Marking
+    return Marking(**overrides)
+
+
+async def validate_scripts(scripts: List[UploadFile]) -> Tuple[List[UploadBuffer], Optional[str]]:
+    """
+    Reads each script once into an UploadBuffer. The caller owns the
+    returned buffers and must close() them; on error none are left open.
+    """
+    valid_scripts = []
+    error = None
+    for script in scripts:
+        if script.content_type not in ["image/jpeg", "image/png", "image/jpg", "application/pdf"]:
+            error = f"The file '{script.filename}' is not supported. Only PDF, JPG, and PNG are allowed."
+            break
+
         try:
-            response = client.models.generate_content(
-                model=model,
-                contents=[types.Content(role="user", parts=all_parts + [types.Part.from_text(text=custom_prompt)])],
-                config=types.GenerateContentConfig(response_mime_type="application/json")
-            )
-            if response.text:
-                raw = response.text.strip().replace("```json", "").replace("```", "").strip()
-                data = json.loads(raw)
-                return data.get("answers", data) # Support both nested and flat responses
-        except: continue
-
-    # 2. Azure
-    azure_key, azure_endpoint, azure_deployment = os.getenv("AZURE_OPENAI_KEY"), os.getenv("AZURE_OPENAI_ENDPOINT"), os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
-    if azure_key and azure_endpoint and azure_deployment:
+            buffer = await UploadBuffer.from_upload(script)
+        except UploadTooLarge:
+            error = f"The file '{script.filename}' is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB. Please upload a smaller file."
+            break
+        valid_scripts.append(buffer)
+
+        # Check size (basic blank check)
+        if buffer.size < 100:
+            error = f"The file '{script.filename}' appears to be empty or corrupted. Please upload a valid image or PDF."
+            break
+
+    if error:
+        for buffer in valid_scripts:
+            buffer.close()
+        return [], error
+    return valid_scripts, None
+
+
+# --------------------------------------------------
+# HELPER: Python-side scoring
+# --------------------------------------------------
+def score_answers(answer_map: dict, ai_answers: dict, marking=None) -> dict:
+    with metrics.time_stage("scoring"):
+        return _score_answers(answer_map, ai_answers, marking)
+
+
+def _score_answers(answer_map: dict, ai_answers: dict, marking=None) -> dict:
+    """One student through the class scoring engine (a 1 x questions matrix)."""
+    from app.utils.scoring import encode_answers, score_matrix
+
+    matrix = encode_answers(answer_map, {"student": ai_answers})
+    scored = score_matrix(matrix, marking)
+    correct, blank, answers = scored["correct"][0], scored["blank"][0], matrix.answers[0]
+
+    details = [
+        {
+            "question": q,
+            "student_answer": matrix.options[answers[j]],
+            "correct_answer": answer_map[q],
+            "result": "Correct" if correct[j] else "Unanswered" if blank[j] else "Wrong"
+        }
+        for j, q in enumerate(matrix.questions)
+    ]
+    marks = float(scored["marks"][0])
+    return {
+        "total_questions": len(answer_map),
+        "correct": int(scored["correct_count"][0]),
+        "wrong": int(scored["wrong_count"][0]),
+        "unanswered": int(scored["blank_count"][0]),
+        "score": int(marks) if marks.is_integer() else round(marks, 4),
+        "details": details
+    }
+
+
+# --------------------------------------------------
+# HELPER: Local OMR for printed bubble sheets
+# --------------------------------------------------
+async def omr_extract_answers(files: List[UploadBuffer]) -> Optional[dict]:
+    """
+    Runs the local OMR engine on every script in the CPU pool.
+    Returns {"answers": {...}, "confidence": {...}} or None when any page
+    is not a recognizable bubble sheet.
+    """
+    from app.utils import omr
+
+    jobs = [run_in_process(omr.read_document, file.bytes(), file.content_type) for file in files]
+
+    try:
+        pages = [page for doc in await asyncio.gather(*jobs) for page in doc]
+        return omr.merge_pages(pages)
+    except Exception:
+        return None
+
+
+async def template_extract_answers(files: List[UploadBuffer], template: dict) -> Optional[dict]:
+    """
+    Grades scripts against a registered sheet template (homography +
+    precomputed bubble masks). None if any page could not be aligned.
+    """
+    from app.utils import omr
+
+    jobs = [
+        run_in_process(omr.read_document_with_template, file.bytes(), file.content_type, template["id"], template)
+        for file in files
+    ]
+
+    try:
+        pages = [page for doc in await asyncio.gather(*jobs) for page in doc]
+        return omr.merge_pages(pages, renumber=False)
+    except Exception:
+        return None
+
+
+# --------------------------------------------------
+# HELPER: Local page triage before the AI call
+# --------------------------------------------------
+def pdf_preprocess_options():
+    """Preprocessing options for photos that go into a PDF (MuPDF cannot embed WebP)."""
+    from app.utils.preprocess import PreprocessOptions
+
+    options = PreprocessOptions()
+    return options.model_copy(update={"fmt": "jpeg"}) if options.fmt == "webp" else options
+
+
+async def triage_scripts(files: List[UploadBuffer]) -> Tuple[List[UploadBuffer], Optional[dict]]:
+    """
+    Screens every page locally (blank, upside down, printed page order).
+    When something needs fixing, one rebuilt PDF buffer replaces the
+    uploads; the caller closes it if it is not one of the inputs.
+    """
+    from app.utils import triage
+
+    if not triage.TRIAGE_ENABLED:
+        return files, None
+    with metrics.time_stage("triage"):
         try:
-            from openai import AzureOpenAI
-            azure_client = AzureOpenAI(api_key=azure_key, api_version="2024-02-15-preview", azure_endpoint=azure_endpoint)
-            msg_content = [{"type": "text", "text": custom_prompt}]
-            for file in files:
-                await file.seek(0)
-                fb = await file.read()
-                if file.content_type == "application/pdf":
-                    doc = fitz.open(stream=fb, filetype="pdf")
-                    for page in doc:
-                        msg_content.append({"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64.b64encode(page.get_pixmap().tobytes('png')).decode('utf-8')}"}})
-                else:
-                    msg_content.append({"type": "image_url", "image_url": {"url": f"data:{file.content_type};base64,{base64.b64encode(fb).decode('utf-8')}"}})
-            
-            resp = azure_client.chat.completions.create(model=azure_deployment, messages=[{"role": "system", "content": "Extract MCQ answers. JSON only."}, {"role": "user", "content": msg_content}], response_format={"type": "json_object"})
-            data = json.loads(resp.choices[0].message.content.strip())
-            return data.get("answers", data)
-        except: pass
-
-    # 3. Cohere
-    cohere_key = os.getenv("COHERE_API_KEY")
-    if cohere_key and text_content:
+            scans = await asyncio.gather(*(
+                run_in_process(triage.scan_document, file.bytes(), file.content_type, i) for i, file in enumerate(files)
+            ))
+        except Exception as e:
+            logger.warning(f"Page triage skipped: {e}")
+            return files, None
+
+        kept, report = triage.plan_pages(scans)
+        if not report["changed"] or not kept:
+            return files, report
+        # Photos are embedded in the rebuilt PDF, where the later preprocessing step cannot reach them
+        sources, owned = await preprocess_files(files, pdf_preprocess_options())
         try:
-            co = cohere.Client(cohere_key)
-            resp = co.chat(model="command-r-plus-08-2024", message=custom_prompt + "\n\nTEXT:\n" + text_content, response_format={"type": "json_object"})
-            data = json.loads(resp.text)
-            return data.get("answers", data)
-        except: pass
+            pdf = await run_in_process(triage.rebuild_pdf, [(file.bytes(), file.content_type) for file in sources], kept)
+        finally:
+            for buffer in owned:
+                buffer.close()
+    return [UploadBuffer("triaged.pdf", "application/pdf", memoryview(pdf))], report
+
+
+async def extract_missing(files: List[UploadBuffer], answers: dict, questions: List[str]) -> dict:
+    """
+    Asks once more for the questions the model left out of its answer map,
+    with a prompt naming only those numbers, and fills them in. Answers
+    already extracted are never replaced. Blanks the model reported as ""
+    are answers, not gaps.
+    """
+    missing = [q for q in questions if q not in answers]
+    if not (MISSING_REEXTRACT_ENABLED and answers and missing):
+        return answers
+    with metrics.time_stage("reextract"):
+        prompt = MISSING_ANSWERS_EXTRACTION_PROMPT.format(questions=", ".join(missing), first=missing[0])
+        found = await ai_extract_answers(files, prompt)
+    found = {str(q): a for q, a in found.items() if str(q) in missing}
+    recovered = sum(1 for a in found.values() if str(a).strip())
+    metrics.reextractions.inc(recovered, outcome="recovered")
+    metrics.reextractions.inc(len(missing) - recovered, outcome="missing")
+    logger.info(f"Re-extraction: {recovered} of {len(missing)} missing questions recovered")
+    return {**answers, **found}
 
-    return {}
+
+async def ai_extract_student(valid_scripts: List[UploadBuffer], questions: List[str]) -> Tuple[dict, Optional[dict]]:
+    """AI extraction on the triaged pages. Returns (answers, triage report)."""
+    files, report = await triage_scripts(valid_scripts)
+    try:
+        if report and not report["kept"]:
+            return {}, report
+        prompt = STUDENT_ANSWERS_FOR_KEY_PROMPT.format(questions=", ".join(questions), first=questions[0])
+        answers = await ai_extract_answers(files, prompt)
+        return await extract_missing(files, answers, questions), report
+    finally:
+        if files is not valid_scripts:
+            for buffer in files:
+                buffer.close()
+
+
+def with_triage(result: dict, report: Optional[dict]) -> dict:
+    return {**result, "triage": report} if report else result
+
+
+# --------------------------------------------------
+# HELPER: Grade one student's scripts against a resolved key
+# --------------------------------------------------
+async def grade_student(answer_map: dict, scripts: List[UploadFile], omr_template: Optional[dict] = None, marking=None) -> dict:
+    with metrics.time_stage("read_uploads"):
+        valid_scripts, error = await validate_scripts(scripts)
+    if error:
+        return {"error": error}
+    try:
+        return await grade_buffers(answer_map, valid_scripts, omr_template, marking)
+    finally:
+        for buffer in valid_scripts:
+            buffer.close()
+
+
+async def grade_buffers(answer_map: dict, valid_scripts: List[UploadBuffer], omr_template: Optional[dict] = None, marking=None) -> dict:
+    result = await _grade_buffers(answer_map, valid_scripts, omr_template, marking)
+    metrics.grades.inc(engine="zero_score" if "error" in result else result.get("engine", "ai"))
+    return result
+
+
+async def _grade_buffers(answer_map: dict, valid_scripts: List[UploadBuffer], omr_template: Optional[dict] = None, marking=None) -> dict:
+    from app.utils import omr  # cv2/NumPy load on first use (or in the startup warm-up)
+
+    # Registered layouts are graded entirely locally; only unalignable photos fall through
+    if omr_template:
+        with metrics.time_stage("omr_template"):
+            template_result = await template_extract_answers(valid_scripts, omr_template)
+        if template_result:
+            return {
+                **score_answers(answer_map, template_result["answers"], marking),
+                "engine": "omr-template",
+                "omr": {"confidence": template_result["confidence"], "fallback_questions": []}
+            }
+
+    # Typed / digitally filled PDFs that answer every question in their text layer need no rendering or model call
+    text_answers = await text_layer_answers(valid_scripts, list(answer_map))
+    if text_answers:
+        return {**score_answers(answer_map, text_answers, marking), "engine": "text-layer"}
+
+    # Bubble sheets are read locally; the AI only sees sheets/questions OMR is unsure about
+    omr_result = None
+    if omr.OMR_ENABLED:
+        with metrics.time_stage("omr"):
+            omr_result = await omr_extract_answers(valid_scripts)
+    if omr_result:
+        confidence = omr_result["confidence"]
+        unsure = [q for q in answer_map if confidence.get(q, 0) < omr.OMR_CONFIDENCE_THRESHOLD]
+        omr_info = {"confidence": confidence, "fallback_questions": unsure}
+
+        if not unsure:
+            return {**score_answers(answer_map, omr_result["answers"], marking), "engine": "omr", "omr": omr_info}
+
+        ai_answers, report = await ai_extract_student(valid_scripts, unsure)
+        merged = dict(omr_result["answers"])
+        merged.update({q: ai_answers[q] for q in unsure if q in ai_answers})
+        return with_triage({**score_answers(answer_map, merged, marking), "engine": "omr+ai" if ai_answers else "omr", "omr": omr_info}, report)
+
+    ai_answers, report = await ai_extract_student(valid_scripts, list(answer_map))
+
+    if report and not report["kept"]:
+        return with_triage(zero_score(answer_map, "Every uploaded page appears to be blank. Please check the scans and upload the student's answer pages."), report)
+
+    if not any(str(a).strip() for a in ai_answers.values()):
+        return with_triage(zero_score(answer_map, "We couldn't detect any student answers on the uploaded scripts. Please check if the images are clear or if the student has marked their choices."), report)
+
+    return with_triage(score_answers(answer_map, ai_answers, marking), report)
 
 
 # --------------------------------------------------
@@ -159,91 +902,264 @@ async def evaluate_mcq(
     upload_answer_key_file: Optional[UploadFile] = File(
         None, 
         description="Upload image/PDF of answer key."
+    ),
+    answer_key_id: Optional[int] = Form(
+        None,
+        description="ID of an answer key registered via /mcq/answer-keys."
+    ),
+    omr_template_id: Optional[int] = Form(
+        None,
+        description="ID of a sheet layout registered via /mcq/omr-templates."
+    ),
+    marks_correct: Optional[float] = Form(
+        None,
+        description="Marks for a correct answer (default 1)."
+    ),
+    marks_wrong: Optional[float] = Form(
+        None,
+        description="Marks for a wrong answer; negative for negative marking, e.g. -0.25 (default 0)."
+    ),
+    marks_unanswered: Optional[float] = Form(
+        None,
+        description="Marks for an unanswered question (default 0)."
+    ),
+    exam_id: Optional[str] = Form(
+        None,
+        description="Exam this evaluation belongs to (saved with it; see /mcq/evaluations)."
+    ),
+    student_id: Optional[str] = Form(
+        None,
+        description="Student this evaluation belongs to (saved with it; see /mcq/evaluations)."
     )
 ):
 
     # ---------- 1. Get Answer Key ----------
-    answer_map = {}
-    
-    if upload_answer_key_file:
-        # Validate format
-        if upload_answer_key_file.content_type not in ["image/jpeg", "image/png", "image/jpg", "application/pdf"]:
-            return {"error": "The answer key file format is not supported. Please upload a PDF or Image (JPG/PNG)."}
-
-        key_prompt = """
-Extract the MCQ Answer Key from this document.
-Format: {"answers": {"1": "A", "2": "B", ...}}
-Rules: Map i->A, ii->B, iii->C, iv->D. Output STRICT JSON.
-"""
-        extracted_key = await ai_extract_answers([upload_answer_key_file], key_prompt)
-        if not extracted_key:
-            return {"error": "We couldn't read the answers from your uploaded answer key file. Please ensure it is clear and contains a list of answers."}
-        
-        # Normalize keys/values to string uppercase
-        answer_map = {str(k): str(v).upper() for k, v in extracted_key.items()}
-    
-    if not answer_map and type_answer_key_text:
-        answer_map = normalize_answer_key(type_answer_key_text)
+    with metrics.time_stage("answer_key"):
+        answer_map, error = await resolve_answer_key(type_answer_key_text, upload_answer_key_file, answer_key_id)
 
-    if not answer_map:
+    if error == ANSWER_KEY_MISSING:
         return {
             "total_questions": 0,
             "correct": 0,
             "wrong": 0,
+            "unanswered": 0,
             "score": 0,
             "details": [],
-            "error": "Answer key missing. Please either type the answers in the text box or upload an answer key file."
+            "error": error
         }
+    if error:
+        return {"error": error}
 
-    # ---------- 2. Validate Student Scripts ----------
-    valid_scripts = []
-    for script in student_answer_scripts:
-        if script.content_type not in ["image/jpeg", "image/png", "image/jpg", "application/pdf"]:
-            return {"error": f"The file '{script.filename}' is not supported. Only PDF, JPG, and PNG are allowed."}
-        
-        # Check size (basic blank check)
-        content = await script.read()
-        await script.seek(0)
-        if len(content) < 100:
-            return {"error": f"The file '{script.filename}' appears to be empty or corrupted. Please upload a valid image or PDF."}
-        valid_scripts.append(script)
-
-    # ---------- 3. Extract Student Answers ----------
-    student_prompt = """
-You are an MCQ answer extractor.
-Extract ONLY the selected option per question.
-Rules: Map i->A, ii->B, iii->C, iv->D. Output STRICT JSON.
-FORMAT: {"answers": {"1": "A", "2": "B"}}
-"""
-    ai_answers = await ai_extract_answers(valid_scripts, student_prompt)
-
-    if not ai_answers:
-        return zero_score(answer_map, "We couldn't detect any student answers on the uploaded scripts. Please check if the images are clear or if the student has marked their choices.")
-
-    # ---------- 3. Python-side scoring ----------
-    details = []
-    correct = 0
+    omr_template, error = await resolve_omr_template(omr_template_id)
+    if error:
+        return {"error": error}
 
-    for q, correct_ans in answer_map.items():
-        student_ans = str(ai_answers.get(q, "")).upper()
+    # ---------- 2. Validate, extract and score ----------
+    marking = resolve_marking(marks_correct, marks_wrong, marks_unanswered)
+    with metrics.time_stage("grade"):
+        result = await grade_student(answer_map, student_answer_scripts, omr_template, marking)
 
-        if student_ans == correct_ans:
-            correct += 1
-            result = "Correct"
-        else:
-            result = "Wrong"
+    # ---------- 3. Save (write-behind; never delays the response) ----------
+    return save_evaluation(result, answer_map, exam_id, student_id)
 
-        details.append({
-            "question": q,
-            "student_answer": student_ans,
-            "correct_answer": correct_ans,
-            "result": result
-        })
 
+# --------------------------------------------------
+# CLASS SCORING + ITEM ANALYSIS (no extraction)
+# --------------------------------------------------
+class ClassScoreRequest(BaseModel):
+    students: Dict[str, Dict[str, str]] = Field(..., description="{student_id: {question: answer}}")
+    answer_key: Optional[Dict[str, str]] = Field(None, description="{question: answer}")
+    type_answer_key_text: Optional[str] = Field(None, description='Answer key as text, e.g. "1 A, 2 B"')
+    answer_key_id: Optional[int] = Field(None, description="ID of an answer key registered via /mcq/answer-keys.")
+    marks_correct: Optional[float] = None
+    marks_wrong: Optional[float] = None
+    marks_unanswered: Optional[float] = None
+
+
+def class_report(answer_map: dict, students: Dict[str, dict], marking=None) -> dict:
+    """Class statistics and item analysis (difficulty, discrimination, distractors, KR-20)."""
+    from app.utils.scoring import score_class
+
+    with metrics.time_stage("class_scoring"):
+        report = score_class(answer_map, students, marking)
+    summary = report["summary"]
     return {
-        "total_questions": len(answer_map),
-        "correct": correct,
-        "wrong": len(answer_map) - correct,
-        "score": correct,
-        "details": details
+        "score_stats": {k: summary[k] for k in ("max_score", "mean", "median", "std", "min", "max")},
+        "item_analysis": report["item_analysis"],
     }
+
+
+@router.post("/score-class", summary="Score already-extracted answers for a whole class, with item analysis")
+async def score_class_answers(body: ClassScoreRequest):
+    if body.answer_key:
+        answer_map = {str(q).strip(): str(a).strip().upper() for q, a in body.answer_key.items()}
+    else:
+        answer_map, error = await resolve_answer_key(body.type_answer_key_text, None, body.answer_key_id)
+        if error:
+            return {"error": error}
+    if not answer_map:
+        return {"error": "The answer key has no readable answers."}
+
+    from app.utils.scoring import score_class
+
+    marking = resolve_marking(body.marks_correct, body.marks_wrong, body.marks_unanswered)
+    with metrics.time_stage("class_scoring"):
+        return score_class(answer_map, body.students, marking)
+
+
+# --------------------------------------------------
+# CLASS BATCH API (NDJSON stream, one line per student)
+# --------------------------------------------------
+BATCH_MAX_PARALLEL = int(os.getenv("BATCH_MAX_PARALLEL", "8"))
+
+
+@router.post("/evaluate-batch", summary="Evaluate a whole class, streaming one result per student")
+async def evaluate_mcq_batch(
+    student_answer_scripts: List[UploadFile] = File(
+        ...,
+        description="Upload images/PDFs for every student in the class."
+    ),
+    student_ids: Optional[List[str]] = Form(
+        None,
+        description="One student ID per uploaded file, in the same order. Files sharing an ID are pages of the same student. Defaults to one student per file, named by filename."
+    ),
+    type_answer_key_text: Optional[str] = Form(
+        None,
+        description="Type answer key here."
+    ),
+    upload_answer_key_file: Optional[UploadFile] = File(
+        None,
+        description="Upload image/PDF of answer key."
+    ),
+    answer_key_id: Optional[int] = Form(
+        None,
+        description="ID of an answer key registered via /mcq/answer-keys."
+    ),
+    omr_template_id: Optional[int] = Form(
+        None,
+        description="ID of a sheet layout registered via /mcq/omr-templates."
+    ),
+    max_parallel: Optional[int] = Form(
+        None,
+        description=f"Students extracted concurrently (1-{BATCH_MAX_PARALLEL})."
+    ),
+    marks_correct: Optional[float] = Form(
+        None,
+        description="Marks for a correct answer (default 1)."
+    ),
+    marks_wrong: Optional[float] = Form(
+        None,
+        description="Marks for a wrong answer; negative for negative marking, e.g. -0.25 (default 0)."
+    ),
+    marks_unanswered: Optional[float] = Form(
+        None,
+        description="Marks for an unanswered question (default 0)."
+    ),
+    exam_id: Optional[str] = Form(
+        None,
+        description="Exam this evaluation belongs to (saved with it; see /mcq/evaluations)."
+    ),
+):
+    if student_ids and len(student_ids) != len(student_answer_scripts):
+        return {"error": f"Got {len(student_ids)} student IDs for {len(student_answer_scripts)} files. Please send one student ID per file."}
+
+    # ---------- 1. Resolve the shared answer key once ----------
+    answer_map, error = await resolve_answer_key(type_answer_key_text, upload_answer_key_file, answer_key_id)
+    if error:
+        return {"error": error}
+
+    omr_template, error = await resolve_omr_template(omr_template_id)
+    if error:
+        return {"error": error}
+
+    # ---------- 2. Group files by student, keeping upload order ----------
+    students = {}
+    for i, script in enumerate(student_answer_scripts):
+        student_id = student_ids[i] if student_ids else (script.filename or f"student_{i + 1}")
+        students.setdefault(student_id, []).append(script)
+
+    parallel = max(1, min(max_parallel or BATCH_MAX_PARALLEL, BATCH_MAX_PARALLEL))
+    slots = asyncio.Semaphore(parallel)
+    marking = resolve_marking(marks_correct, marks_wrong, marks_unanswered)
+
+    async def grade(student_id: str, scripts: List[UploadFile]) -> dict:
+        async with slots:
+            try:
+                result = await grade_student(answer_map, scripts, omr_template, marking)
+            except Exception as e:
+                result = {"error": f"Evaluation failed: {e}"}
+        return {"student_id": student_id, **save_evaluation(result, answer_map, exam_id, student_id)}
+
+    # ---------- 3. Stream results as they finish ----------
+    async def stream():
+        tasks = [asyncio.create_task(grade(sid, scripts)) for sid, scripts in students.items()]
+        graded = failed = 0
+        extracted = {}  # student_id -> answers, for the class item analysis
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                if "error" in result and not result.get("details"):
+                    failed += 1
+                else:
+                    graded += 1
+                    if "error" not in result:
+                        extracted[result["student_id"]] = {d["question"]: d["student_answer"] for d in result["details"]}
+                yield json.dumps(result) + "\n"
+            summary = {"students": len(tasks), "graded": graded, "failed": failed, "total_questions": len(answer_map)}
+            if extracted:
+                summary.update(class_report(answer_map, extracted, marking))
+            yield json.dumps({"summary": summary}) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+# --------------------------------------------------
+# CACHE STATS
+# --------------------------------------------------
+@router.get("/cache/stats", summary="Extraction cache hit/miss counters")
+def cache_stats():
+    return {**extraction_cache.snapshot(), "render": render_cache.snapshot()}
+
+
+# --------------------------------------------------
+# METRICS COLLECTORS (read at /metrics scrape time)
+# --------------------------------------------------
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+@metrics.registry.collector
+def cache_metrics():
+    cache, render = extraction_cache.snapshot(), render_cache.snapshot()
+    yield "mcq_extraction_cache_events_total", "counter", "Extraction cache lookups and writes.", [
+        ({"event": event}, cache[event]) for event in ("memory_hits", "db_hits", "misses", "stores", "evictions")
+    ]
+    yield "mcq_extraction_cache_hit_ratio", "gauge", "Extraction cache hit rate since start.", [({}, cache["hit_rate"])]
+    yield "mcq_render_cache_events_total", "counter", "Rendered page cache lookups.", [
+        ({"event": event}, render[event]) for event in ("hits", "misses", "evictions")
+    ]
+    yield "mcq_render_cache_bytes", "gauge", "Bytes held by the rendered page cache.", [({}, render["bytes"])]
+
+
+@metrics.registry.collector
+def provider_metrics():
+    health = provider_router.snapshot()
+    yield "mcq_provider_circuit_state", "gauge", "Circuit breaker per tier (0 closed, 1 half open, 2 open).", [
+        (dict(zip(("provider", "model"), tier_labels(name))), CIRCUIT_STATES[tier["state"]]) for name, tier in health["tiers"].items()
+    ]
+    yield "mcq_provider_hedging_total", "counter", "Hedged extraction requests.", [
+        ({"event": event}, health["hedging"][event]) for event in ("requests", "hedges_fired", "hedges_won")
+    ]
+    yield "mcq_provider_in_flight", "gauge", "Provider calls holding a concurrency slot.", [
+        ({"provider": name}, count) for name, count in provider_in_flight.items()
+    ]
+
+
+# --------------------------------------------------
+# PROVIDER HEALTH
+# --------------------------------------------------
+@router.get("/providers/health", summary="Per-tier latency, success rate and circuit state")
+def providers_health():
+    return provider_router.snapshot()
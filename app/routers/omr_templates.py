@@ -0,0 +1,30 @@
+from fastapi import APIRouter, HTTPException
+
+from app.schemas import OMRTemplateCreate, OMRTemplateOut
+from app.utils.omr_templates import create_template, get_template
+
+router = APIRouter(prefix="/mcq/omr-templates", tags=["OMR Templates"])
+
+
+@router.post("", response_model=OMRTemplateOut, summary="Register a printed answer sheet layout")
+def register_template(payload: OMRTemplateCreate):
+    if len(payload.markers) != 4:
+        raise HTTPException(status_code=400, detail="A template needs exactly 4 fiducial markers (TL, TR, BR, BL).")
+    if payload.aruco_ids is not None and len(payload.aruco_ids) != 4:
+        raise HTTPException(status_code=400, detail="Give one ArUco ID per marker (4 in total).")
+    if not payload.bubbles:
+        raise HTTPException(status_code=400, detail="A template needs at least one bubble.")
+    from app.utils import omr
+
+    bad = [b.option for b in payload.bubbles if b.option not in omr.OPTIONS]
+    if bad:
+        raise HTTPException(status_code=400, detail=f"Unsupported option labels {sorted(set(bad))}. Use {', '.join(omr.OPTIONS)}.")
+    return create_template(payload.model_dump())
+
+
+@router.get("/{template_id}", response_model=OMRTemplateOut, summary="Fetch a registered template")
+def fetch_template(template_id: int):
+    record = get_template(template_id)
+    if not record:
+        raise HTTPException(status_code=404, detail=f"OMR template {template_id} not found.")
+    return record
@@ -5,6 +5,12 @@ class AnswerKeyCreate(BaseModel):
     subject: str
     answers: Dict[str, str]  # {"1":"A","2":"C"}
     total_marks: int
+
+
+class AnswerKeyOut(AnswerKeyCreate):
+    id: int
+
+
 class MCQResult(BaseModel):
     question: str
     correct_answer: str
@@ -17,4 +23,25 @@ class MCQEvaluationResponse(BaseModel):
     attempted: int
     correct: int
     score: int
-    evaluation: List[MCQResult]
\ No newline at end of file
+    evaluation: List[MCQResult]
+
+class OMRBubble(BaseModel):
+    question: str
+    option: str   # "A".."F"
+    x: float      # centre, template canvas px
+    y: float
+    r: float      # radius, template canvas px
+
+
+class OMRTemplateCreate(BaseModel):
+    name: str
+    width: int                          # template canvas size in px
+    height: int
+    markers: List[List[float]]          # fiducial centres [x, y]: TL, TR, BR, BL
+    aruco_ids: Optional[List[int]] = None  # ArUco (4x4_50) IDs of the markers; corner squares if omitted
+    bubbles: List[OMRBubble]
+    fill_threshold: float = 0.45
+
+
+class OMRTemplateOut(OMRTemplateCreate):
+    id: int
@@ -0,0 +1,70 @@
+"""
+Stored answer keys: persistence in cbse.db plus an in-process cache of
+parsed {question: option} maps, so a key registered once is never
+re-extracted or re-parsed while grading a class.
+"""
+
+import os
+import json
+import asyncio
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from app.database import SessionLocal
+from app.models import AnswerKey
+
+CACHE_SIZE = int(os.getenv("ANSWER_KEY_CACHE_SIZE", "128"))
+
+_parsed_keys: "OrderedDict[int, dict]" = OrderedDict()
+
+
+def _remember(key: AnswerKey) -> dict:
+    record = {
+        "id": key.id,
+        "subject": key.subject,
+        "answers": json.loads(key.answers),
+        "total_marks": key.total_marks,
+    }
+    _parsed_keys[key.id] = record
+    _parsed_keys.move_to_end(key.id)
+    while len(_parsed_keys) > CACHE_SIZE:
+        _parsed_keys.popitem(last=False)
+    return record
+
+
+def create_answer_key(subject: str, answers: Dict[str, str], total_marks: Optional[int] = None) -> dict:
+    answers = {str(q): str(a).upper() for q, a in answers.items()}
+    db = SessionLocal()
+    try:
+        key = AnswerKey(
+            subject=subject,
+            answers=json.dumps(answers),
+            total_marks=total_marks if total_marks is not None else len(answers),
+        )
+        db.add(key)
+        db.commit()
+        db.refresh(key)
+        return _remember(key)
+    finally:
+        db.close()
+
+
+def get_answer_key(key_id: int) -> Optional[dict]:
+    if key_id in _parsed_keys:
+        _parsed_keys.move_to_end(key_id)
+        return _parsed_keys[key_id]
+
+    db = SessionLocal()
+    try:
+        key = db.get(AnswerKey, key_id)
+        return _remember(key) if key else None
+    finally:
+        db.close()
+
+
+async def get_answer_map(key_id: int) -> Optional[dict]:
+    """Async accessor for the request path; only touches the DB on a cache miss."""
+    record = _parsed_keys.get(key_id)
+    if record is None:
+        record = await asyncio.to_thread(get_answer_key, key_id)
+    return record["answers"] if record else None
@@ -0,0 +1,85 @@
+"""
+Page chunking for long answer scripts.
+
+A 10+ page submission sent as one provider call takes as long as the
+model needs for every page, and one unreadable page fails all of them.
+With EXTRACTION_CHUNK_PAGES set, the pages of a submission are split
+into contiguous chunks that are extracted concurrently, so wall-clock
+time is roughly that of the slowest chunk, and the per-chunk answer
+maps are merged:
+
+- a non-blank answer beats a blank one;
+- otherwise the answer given by the most chunks wins;
+- remaining ties go to the later chunk (a later page usually holds the
+  corrected answer).
+
+The result depends only on the chunk answers, never on which chunk
+finished first. split_pdf is picklable so it can run in the process pool.
+"""
+
+import os
+from collections import Counter
+from typing import Dict, List, Tuple
+
+EXTRACTION_CHUNK_PAGES = int(os.getenv("EXTRACTION_CHUNK_PAGES", "0"))  # 0 = one call per submission
+EXTRACTION_CHUNK_MIN_PAGES = int(os.getenv("EXTRACTION_CHUNK_MIN_PAGES", "10"))
+
+# (file index, first page, last page) of one contiguous run inside a chunk
+Run = Tuple[int, int, int]
+
+
+def plan_chunks(page_counts: List[int], chunk_pages: int) -> List[List[Run]]:
+    """Splits the pages of all files, in order, into chunks of at most chunk_pages."""
+    chunks, current, size = [], [], 0
+    for file_index, count in enumerate(page_counts):
+        page = 0
+        while page < count:
+            take = min(chunk_pages - size, count - page)
+            current.append((file_index, page, page + take - 1))
+            page += take
+            size += take
+            if size == chunk_pages:
+                chunks.append(current)
+                current, size = [], 0
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def split_pdf(pdf_bytes: bytes, runs: List[Tuple[int, int]]) -> List[bytes]:
+    """One PDF per (first page, last page) run."""
+    import fitz  # PyMuPDF
+
+    src = fitz.open(stream=pdf_bytes, filetype="pdf")
+    parts = []
+    try:
+        for start, end in runs:
+            part = fitz.open()
+            part.insert_pdf(src, from_page=start, to_page=end)
+            parts.append(part.tobytes(garbage=3, deflate=True, no_new_id=True))
+            part.close()
+    finally:
+        src.close()
+    return parts
+
+
+def merge_answers(chunks: List[Dict[str, str]]) -> Tuple[Dict[str, str], Dict[str, List[str]]]:
+    """
+    Merges per-chunk answer maps (in page order). Returns the merged map
+    and, for each question answered differently by several chunks, the
+    answers seen (in chunk order).
+    """
+    seen: Dict[str, List[Tuple[int, str]]] = {}
+    for position, answers in enumerate(chunks):
+        for q, answer in answers.items():
+            seen.setdefault(str(q), []).append((position, str(answer).strip().upper()))
+
+    merged, conflicts = {}, {}
+    for q, votes in seen.items():
+        filled = [(position, answer) for position, answer in votes if answer] or votes
+        counts = Counter(answer for _, answer in filled)
+        last_seen = {answer: position for position, answer in filled}
+        merged[q] = max(counts, key=lambda answer: (counts[answer], last_seen[answer]))
+        if len({answer for _, answer in votes}) > 1:
+            conflicts[q] = [answer for _, answer in votes]
+    return merged, conflicts
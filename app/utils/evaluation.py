@@ -1,11 +1,20 @@
 # app/utils/evaluation.py
-# Check if file is empty
-file_bytes = await file.read()
-if file_bytes == b"":
-    raise HTTPException(status_code=400, detail="Uploaded file is empty")
+from fastapi import HTTPException, UploadFile
+
+from app.utils.scoring import Marking, encode_answers, score_matrix
+
+
+async def read_nonempty_upload(file: UploadFile) -> bytes:
+    """Reads an upload, rejecting empty files, and rewinds it so Gemini can read it."""
+    # Check if file is empty
+    file_bytes = await file.read()
+    if file_bytes == b"":
+        raise HTTPException(status_code=400, detail="Uploaded file is empty")
+
+    # Reset file pointer so Gemini can read it
+    await file.seek(0)
+    return file_bytes
 
-# Reset file pointer so Gemini can read it
-await file.seek(0)
 
 def normalize_gemini_answers(raw_answers: dict) -> dict:
     """
@@ -22,36 +31,33 @@ def normalize_gemini_answers(raw_answers: dict) -> dict:
     return normalized
 
 
-def evaluate_mcqs(detected_answers: dict, answer_key: dict) -> dict:
-    evaluation = []
-    score = 0
-    attempted = 0
-
-    for q_no, correct_ans in answer_key.items():
-        detected = detected_answers.get(q_no)
+def evaluate_mcqs(detected_answers: dict, answer_key: dict, marking: Marking = None) -> dict:
+    """Scores one student with the vectorized engine (see app.utils.scoring)."""
+    matrix = encode_answers(answer_key, {"student": detected_answers})
+    scored = score_matrix(matrix, marking)
+    correct, blank = scored["correct"][0], scored["blank"][0]
 
-        if detected is not None:
-            attempted += 1
-
-        if detected == correct_ans:
+    evaluation = []
+    for j, q_no in enumerate(matrix.questions):
+        if correct[j]:
             status = "correct"
-            score += 1
-        elif detected is None:
+        elif blank[j]:
             status = "unanswered"
         else:
             status = "wrong"
 
         evaluation.append({
             "question": q_no,
-            "correct_answer": correct_ans,
-            "detected_answer": detected,
+            "correct_answer": answer_key[q_no],
+            "detected_answer": matrix.options[matrix.answers[0, j]] or None,
             "status": status
         })
 
+    marks = float(scored["marks"][0])
     return {
         "total_questions": len(answer_key),
-        "attempted": attempted,
-        "correct": score,
-        "score": score,
+        "attempted": len(answer_key) - int(scored["blank_count"][0]),
+        "correct": int(scored["correct_count"][0]),
+        "score": int(marks) if marks.is_integer() else round(marks, 4),
         "evaluation": evaluation
     }
@@ -0,0 +1,227 @@
+"""
+Persistent store of every graded evaluation, in cbse.db.
+
+Each row keeps the exam and student it belongs to, the answer key, the
+extracted answers, the per-question results, the full response and the
+request's stage timings. Requests never wait for the database:
+`record()` only appends the row to an in-process queue, and one
+background writer drains it in batches (EVAL_STORE_BATCH rows or
+EVAL_STORE_FLUSH_SECONDS, whichever comes first), writing each batch
+in a single transaction on a worker thread. With SQLite in WAL mode
+(see app.database) those writes do not block readers.
+
+Rows still in the queue are served from memory by `get()`, so a client
+can read an evaluation back right after receiving its ID. Listing uses
+keyset pagination over (created_at, id), backed by one index per
+filter (exam, student, date), so page N costs the same as page 1.
+
+Call `close()` before the event loop ends (the app does on shutdown).
+Rows still queued when a loop ends without it stay in memory and are
+written only if a later loop in the same process records another
+evaluation or calls `close()`.
+"""
+
+import os
+import json
+import time
+import uuid
+import base64
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+EVAL_STORE_ENABLED = os.getenv("EVAL_STORE_ENABLED", "1") == "1"
+EVAL_STORE_BATCH = int(os.getenv("EVAL_STORE_BATCH", "100"))
+EVAL_STORE_FLUSH_SECONDS = float(os.getenv("EVAL_STORE_FLUSH_SECONDS", "0.5"))
+EVAL_STORE_QUEUE_MAX = int(os.getenv("EVAL_STORE_QUEUE_MAX", "10000"))
+
+_STOP = object()  # queued by close(): the writer flushes what it holds and exits
+
+LIST_COLUMNS = "id, exam_id, student_id, created_at, engine, total_questions, correct, score, error"
+
+
+def encode_cursor(created_at: float, row_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([created_at, row_id]).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    return float(created_at), str(row_id)
+
+
+class EvaluationStore:
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: Dict[str, dict] = {}  # id -> row, until written
+        self.stats = {"queued": 0, "written": 0, "batches": 0, "dropped": 0, "failed": 0}
+
+    # ---------- write-behind ----------
+    def record(self, result: dict, answer_key: dict, exam_id: Optional[str] = None, student_id: Optional[str] = None,
+               timings: Optional[list] = None, request_id: Optional[str] = None) -> Optional[str]:
+        """Queues one graded result and returns its evaluation ID (None if the store is off or full)."""
+        if not EVAL_STORE_ENABLED:
+            return None
+        self._ensure_writer()
+        row_id = uuid.uuid4().hex
+        details = result.get("details", [])
+        row = {
+            "id": row_id,
+            "exam_id": exam_id,
+            "student_id": student_id,
+            "created_at": time.time(),
+            "request_id": request_id,
+            "engine": result.get("engine", "ai"),
+            "total_questions": result.get("total_questions", len(details)),
+            "correct": result.get("correct", 0),
+            "score": result.get("score", 0),
+            "error": result.get("error"),
+            "answer_key": json.dumps(answer_key),
+            "answers": json.dumps({d["question"]: d["student_answer"] for d in details}),
+            "details": json.dumps(details),
+            "timings": json.dumps(timings or []),
+            "result": json.dumps(result, default=str),
+        }
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            logger.warning(f"Evaluation store queue full ({EVAL_STORE_QUEUE_MAX}); evaluation not saved")
+            return None
+        self._pending[row_id] = row
+        self.stats["queued"] += 1
+        return row_id
+
+    def _ensure_writer(self):
+        """Starts the queue and its writer together, on the running loop."""
+        loop = asyncio.get_running_loop()
+        if self._writer and not self._writer.done() and self._loop is loop:
+            return
+        self._queue = asyncio.Queue(maxsize=EVAL_STORE_QUEUE_MAX)
+        self._loop = loop
+        # Rows stranded by a loop that ended without close() are queued again
+        # (INSERT OR IGNORE makes a row that did get written a no-op)
+        for row in list(self._pending.values())[:EVAL_STORE_QUEUE_MAX]:
+            self._queue.put_nowait(row)
+        self._writer = loop.create_task(self._write_loop())
+
+    async def _write_loop(self):
+        while True:
+            row = await self._queue.get()
+            if row is _STOP:
+                return
+            batch, stop = [row], False
+            deadline = time.monotonic() + EVAL_STORE_FLUSH_SECONDS
+            while len(batch) < EVAL_STORE_BATCH:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                # asyncio.timeout rather than wait_for: a wait_for whose get() completes as the
+                # task is cancelled returns the row and drops the cancellation, so the loop's
+                # shutdown would wait on this writer forever
+                try:
+                    async with asyncio.timeout(timeout):
+                        row = await self._queue.get()
+                except TimeoutError:
+                    break
+                if row is _STOP:
+                    stop = True
+                    break
+                batch.append(row)
+            await self._flush(batch)
+            if stop:
+                return
+
+    async def _flush(self, batch: List[dict]):
+        try:
+            await asyncio.to_thread(self._write_batch, batch)
+            self.stats["written"] += len(batch)
+            self.stats["batches"] += 1
+        except Exception as e:
+            self.stats["failed"] += len(batch)
+            logger.error(f"Saving {len(batch)} evaluations failed: {e}")
+        finally:
+            for row in batch:
+                self._pending.pop(row["id"], None)
+
+    def _write_batch(self, rows: List[dict]):
+        with engine.begin() as conn:
+            conn.execute(text("""
+                INSERT OR IGNORE INTO evaluations (id, exam_id, student_id, created_at, request_id, engine, total_questions,
+                                         correct, score, error, answer_key, answers, details, timings, result)
+                VALUES (:id, :exam_id, :student_id, :created_at, :request_id, :engine, :total_questions,
+                        :correct, :score, :error, :answer_key, :answers, :details, :timings, :result)
+            """), rows)
+
+    async def close(self):
+        """Stops the writer and writes whatever is still queued."""
+        if self._writer and not self._writer.done() and self._loop is asyncio.get_running_loop():
+            # The writer finishes its current batch (and any flush in flight) before it sees the stop
+            await self._queue.put(_STOP)
+            await self._writer
+        leftover = list(self._pending.values())
+        self._queue = self._writer = self._loop = None
+        if leftover:
+            await self._flush(leftover)
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "pending": len(self._pending)}
+
+    # ---------- reads (blocking; call via asyncio.to_thread) ----------
+    @staticmethod
+    def _decode(row: dict) -> dict:
+        for field in ("answer_key", "answers", "details", "timings", "result"):
+            if field in row and isinstance(row[field], str):
+                row[field] = json.loads(row[field])
+        return row
+
+    def get(self, evaluation_id: str) -> Optional[dict]:
+        pending = self._pending.get(evaluation_id)
+        if pending:
+            return self._decode(dict(pending))
+        with engine.connect() as conn:
+            row = conn.execute(text("SELECT * FROM evaluations WHERE id = :id"), {"id": evaluation_id}).mappings().first()
+        return self._decode(dict(row)) if row else None
+
+    def list(self, exam_id: Optional[str] = None, student_id: Optional[str] = None, since: Optional[float] = None,
+             until: Optional[float] = None, cursor: Optional[str] = None, limit: int = 50) -> dict:
+        """Newest first. Pass the returned next_cursor to get the following page."""
+        where, params = [], {"limit": limit + 1}
+        if exam_id is not None:
+            where.append("exam_id = :exam_id")
+            params["exam_id"] = exam_id
+        if student_id is not None:
+            where.append("student_id = :student_id")
+            params["student_id"] = student_id
+        if since is not None:
+            where.append("created_at >= :since")
+            params["since"] = since
+        if until is not None:
+            where.append("created_at < :until")
+            params["until"] = until
+        if cursor:
+            params["cursor_at"], params["cursor_id"] = decode_cursor(cursor)
+            where.append("(created_at, id) < (:cursor_at, :cursor_id)")
+
+        sql = f"SELECT {LIST_COLUMNS} FROM evaluations"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at DESC, id DESC LIMIT :limit"
+        with engine.connect() as conn:
+            rows = [dict(r) for r in conn.execute(text(sql), params).mappings()]
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+        return {"items": rows, "next_cursor": next_cursor}
+
+
+evaluation_store = EvaluationStore()
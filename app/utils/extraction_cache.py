@@ -0,0 +1,188 @@
+"""
+Content-addressed cache for AI answer extraction.
+
+Entries are keyed on sha256(file bytes + how they are preprocessed) +
+sha256(prompt) + the model that served the answer. Lookups hit an
+in-process LRU first and then the `extraction_cache` table in cbse.db,
+which every uvicorn worker shares. Expired and surplus rows are trimmed
+on the first write and then every EXTRACTION_CACHE_TRIM_EVERY writes.
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "1") == "1"
+MEMORY_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MEMORY_ENTRIES", "256"))
+TTL_SECONDS = int(os.getenv("EXTRACTION_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+MAX_ROWS = int(os.getenv("EXTRACTION_CACHE_MAX_ROWS", "10000"))
+TRIM_EVERY = int(os.getenv("EXTRACTION_CACHE_TRIM_EVERY", "100"))  # writes between expiry / size checks
+
+
+def content_digest(blobs: Iterable[Tuple[str, bytes]], variant: str = "") -> str:
+    """Hash a sequence of (content_type, bytes) uploads in order, plus anything that changes what is sent."""
+    h = hashlib.sha256(variant.encode())
+    for content_type, data in blobs:
+        h.update(content_type.encode())
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+def cache_key(digest: str, prompt: str, model: str) -> str:
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{digest}:{prompt_hash}:{model}".encode()).hexdigest()
+
+
+class ExtractionCache:
+    def __init__(self, memory_entries: int = MEMORY_ENTRIES, ttl_seconds: int = TTL_SECONDS, max_rows: int = MAX_ROWS,
+                 trim_every: int = TRIM_EVERY):
+        self.memory_entries = memory_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_rows = max_rows
+        self.trim_every = max(1, trim_every)
+        self._writes = 0
+        self._memory: "OrderedDict[str, Tuple[float, str, dict]]" = OrderedDict()
+        self.stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    # ---------- in-memory tier ----------
+    def _memory_get(self, key: str) -> Optional[Tuple[str, dict]]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        created_at, model, answers = entry
+        if time.time() - created_at > self.ttl_seconds:
+            del self._memory[key]
+            self.stats["evictions"] += 1
+            return None
+        self._memory.move_to_end(key)
+        return model, answers
+
+    def _memory_put(self, key: str, created_at: float, model: str, answers: dict):
+        self._memory[key] = (created_at, model, answers)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    # ---------- persistent tier (blocking, run in a thread) ----------
+    def _db_get(self, keys: List[str]) -> Dict[str, Tuple[float, str, dict]]:
+        params = {f"k{i}": k for i, k in enumerate(keys)}
+        placeholders = ", ".join(f":{name}" for name in params)
+        now = time.time()
+        found = {}
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text(f"SELECT cache_key, model, answers, created_at FROM extraction_cache WHERE cache_key IN ({placeholders})"),
+                params,
+            ).fetchall()
+            for key, model, answers, created_at in rows:
+                if now - created_at > self.ttl_seconds:
+                    conn.execute(text("DELETE FROM extraction_cache WHERE cache_key = :k"), {"k": key})
+                    self.stats["evictions"] += 1
+                    continue
+                found[key] = (created_at, model, json.loads(answers))
+            if found:
+                conn.execute(
+                    text("UPDATE extraction_cache SET last_used_at = :now WHERE cache_key = :k"),
+                    [{"now": now, "k": k} for k in found],
+                )
+        return found
+
+    def _db_put(self, key: str, created_at: float, model: str, answers: dict, trim: bool):
+        with engine.begin() as conn:
+            conn.execute(
+                text("""
+                INSERT OR REPLACE INTO extraction_cache (cache_key, model, answers, created_at, last_used_at)
+                VALUES (:k, :model, :answers, :now, :now)
+                """),
+                {"k": key, "model": model, "answers": json.dumps(answers), "now": created_at},
+            )
+            if trim:
+                self._trim(conn, created_at)
+
+    def _trim(self, conn, now: float):
+        """Drops expired rows, then the least recently used ones beyond max_rows."""
+        expired = conn.execute(
+            text("DELETE FROM extraction_cache WHERE created_at < :cutoff"),
+            {"cutoff": now - self.ttl_seconds},
+        ).rowcount
+        excess = conn.execute(text("SELECT COUNT(*) FROM extraction_cache")).scalar() - self.max_rows
+        trimmed = 0
+        if excess > 0:
+            trimmed = conn.execute(
+                text("""
+                DELETE FROM extraction_cache WHERE cache_key IN (
+                    SELECT cache_key FROM extraction_cache ORDER BY last_used_at ASC LIMIT :excess
+                )
+                """),
+                {"excess": excess},
+            ).rowcount
+        self.stats["evictions"] += (expired or 0) + (trimmed or 0)
+
+    # ---------- public API ----------
+    async def get(self, digest: str, prompt: str, models: List[str]) -> Optional[Tuple[str, dict]]:
+        """
+        Return (model, answers) for the first model in `models` that has a
+        cached answer for this content + prompt, or None.
+        """
+        keys = [cache_key(digest, prompt, m) for m in models]
+
+        for key in keys:
+            hit = self._memory_get(key)
+            if hit:
+                self.stats["memory_hits"] += 1
+                return hit
+
+        try:
+            found = await asyncio.to_thread(self._db_get, keys)
+        except Exception as e:
+            logger.warning(f"Extraction cache read failed: {e}")
+            found = {}
+
+        for key in keys:
+            if key in found:
+                created_at, model, answers = found[key]
+                self._memory_put(key, created_at, model, answers)
+                self.stats["db_hits"] += 1
+                return model, answers
+
+        self.stats["misses"] += 1
+        return None
+
+    async def put(self, digest: str, prompt: str, model: str, answers: dict):
+        if not answers:
+            return
+        key = cache_key(digest, prompt, model)
+        created_at = time.time()
+        self._memory_put(key, created_at, model, answers)
+        self.stats["stores"] += 1
+        self._writes += 1
+        trim = (self._writes - 1) % self.trim_every == 0  # first write, then every trim_every
+        try:
+            await asyncio.to_thread(self._db_put, key, created_at, model, answers, trim)
+        except Exception as e:
+            logger.warning(f"Extraction cache write failed: {e}")
+
+    def snapshot(self) -> dict:
+        hits = self.stats["memory_hits"] + self.stats["db_hits"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "memory_entries": len(self._memory),
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+extraction_cache = ExtractionCache()
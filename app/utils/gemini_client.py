@@ -1,4 +1,3 @@
-from google import genai
 from google.genai import types
 from dotenv import load_dotenv
 import os
@@ -7,8 +6,7 @@ import tempfile
 
 load_dotenv()
 
-# Initialize Gemini client
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+from app.utils.provider_clients import provider_clients
 
 # Models
 PRIMARY_MODEL = "models/gemini-2.0-flash"
@@ -25,6 +23,9 @@ async def extract_mcq_answers(file) -> dict:
     }
     """
 
+    # Shared Gemini client (pooled connections), looked up per call so a restarted registry is picked up
+    client = provider_clients.gemini
+
     # Read uploaded file
     file_bytes = await file.read()
 
@@ -0,0 +1,201 @@
+"""
+Durable evaluation job queue stored in cbse.db.
+
+Jobs move queued -> running -> done | failed. A worker claims a job by
+taking a time-limited lease on it; if the worker dies, the lease expires
+and another worker (on any host sharing the database) picks the job up
+again, up to JOB_MAX_ATTEMPTS times.
+"""
+
+import os
+import json
+import time
+import uuid
+import socket
+import logging
+import ipaddress
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from sqlalchemy import text
+
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Comma-separated hosts that callbacks may go to; when empty, any host with only public addresses
+CALLBACK_ALLOWED_HOSTS = {h.strip().lower() for h in os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "").split(",") if h.strip()}
+
+
+def callback_url_error(url: str) -> Optional[str]:
+    """
+    Why a job callback may not go to this URL, or None if it may (blocking: resolves the host).
+    Hosts on JOB_CALLBACK_ALLOWED_HOSTS are trusted as configured; otherwise every address the
+    host resolves to must be public, so a callback cannot reach the server's own network.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return "callback_url must be an absolute http:// or https:// URL."
+    host = parts.hostname.lower()
+    if CALLBACK_ALLOWED_HOSTS:
+        return None if host in CALLBACK_ALLOWED_HOSTS else f"callback_url host '{host}' is not in JOB_CALLBACK_ALLOWED_HOSTS."
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        infos = socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError, ValueError):
+        return f"callback_url host '{host}' could not be resolved."
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])  # drop an IPv6 scope ID
+        if not address.is_global:
+            return f"callback_url host '{host}' resolves to a non-public address ({address})."
+    return None
+
+
+def enqueue_job(payload: dict, files: List[Tuple[str, int, str, str, bytes]], callback_url: Optional[str] = None) -> str:
+    """
+    payload: answer key inputs (type_answer_key_text / answer_key_id)
+    files: (role, position, filename, content_type, data) with role "script" or "key"
+    """
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with engine.begin() as conn:
+        conn.execute(
+            text("""
+            INSERT INTO evaluation_jobs (id, status, payload, callback_url, created_at, updated_at)
+            VALUES (:id, 'queued', :payload, :callback_url, :now, :now)
+            """),
+            {"id": job_id, "payload": json.dumps(payload), "callback_url": callback_url, "now": now},
+        )
+        if files:
+            conn.execute(
+                text("""
+                INSERT INTO evaluation_job_files (job_id, role, position, filename, content_type, data)
+                VALUES (:job_id, :role, :position, :filename, :content_type, :data)
+                """),
+                [
+                    {"job_id": job_id, "role": role, "position": pos, "filename": name, "content_type": ct, "data": data}
+                    for role, pos, name, ct, data in files
+                ],
+            )
+    return job_id
+
+
+def claim_job(owner: str, lease_seconds: int = LEASE_SECONDS) -> Optional[dict]:
+    """
+    Lease the oldest runnable job to `owner`. A job is runnable when it is
+    queued, or running with an expired lease and attempts left.
+    The conditional UPDATE makes the claim safe across processes/hosts.
+    """
+    now = time.time()
+    with engine.begin() as conn:
+        conn.execute(
+            text("""
+            UPDATE evaluation_jobs
+            SET status = 'failed', error = 'Gave up after repeated worker failures.', lease_owner = NULL, updated_at = :now
+            WHERE status = 'running' AND lease_expires_at < :now AND attempts >= :max_attempts
+            """),
+            {"now": now, "max_attempts": MAX_ATTEMPTS},
+        )
+        candidates = conn.execute(
+            text("""
+            SELECT id FROM evaluation_jobs
+            WHERE status = 'queued' OR (status = 'running' AND lease_expires_at < :now)
+            ORDER BY created_at
+            LIMIT 5
+            """),
+            {"now": now},
+        ).fetchall()
+
+    for (job_id,) in candidates:
+        with engine.begin() as conn:
+            claimed = conn.execute(
+                text("""
+                UPDATE evaluation_jobs
+                SET status = 'running', lease_owner = :owner, lease_expires_at = :expires,
+                    attempts = attempts + 1, updated_at = :now
+                WHERE id = :id AND (status = 'queued' OR (status = 'running' AND lease_expires_at < :now))
+                """),
+                {"id": job_id, "owner": owner, "expires": now + lease_seconds, "now": now},
+            ).rowcount
+            if not claimed:
+                continue  # another worker got there first
+
+            job = conn.execute(
+                text("SELECT id, payload, callback_url, attempts FROM evaluation_jobs WHERE id = :id"),
+                {"id": job_id},
+            ).mappings().one()
+            files = conn.execute(
+                text("""
+                SELECT role, filename, content_type, data FROM evaluation_job_files
+                WHERE job_id = :id ORDER BY role, position
+                """),
+                {"id": job_id},
+            ).mappings().all()
+
+        return {
+            "id": job["id"],
+            "payload": json.loads(job["payload"]),
+            "callback_url": job["callback_url"],
+            "attempts": job["attempts"],
+            "files": [dict(f) for f in files],
+        }
+    return None
+
+
+def extend_lease(job_id: str, owner: str, lease_seconds: int = LEASE_SECONDS) -> bool:
+    with engine.begin() as conn:
+        return bool(conn.execute(
+            text("""
+            UPDATE evaluation_jobs SET lease_expires_at = :expires, updated_at = :now
+            WHERE id = :id AND lease_owner = :owner AND status = 'running'
+            """),
+            {"id": job_id, "owner": owner, "expires": time.time() + lease_seconds, "now": time.time()},
+        ).rowcount)
+
+
+def finish_job(job_id: str, owner: str, result: Optional[dict] = None, error: Optional[str] = None) -> bool:
+    """Record the outcome if `owner` still holds the lease. Uploaded files are dropped."""
+    with engine.begin() as conn:
+        updated = conn.execute(
+            text("""
+            UPDATE evaluation_jobs
+            SET status = :status, result = :result, error = :error,
+                lease_owner = NULL, lease_expires_at = NULL, updated_at = :now
+            WHERE id = :id AND lease_owner = :owner AND status = 'running'
+            """),
+            {
+                "id": job_id,
+                "owner": owner,
+                "status": "failed" if error else "done",
+                "result": json.dumps(result) if result is not None else None,
+                "error": error,
+                "now": time.time(),
+            },
+        ).rowcount
+        if updated:
+            conn.execute(text("DELETE FROM evaluation_job_files WHERE job_id = :id"), {"id": job_id})
+    return bool(updated)
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    with engine.connect() as conn:
+        row = conn.execute(
+            text("""
+            SELECT id, status, result, error, attempts, callback_url, created_at, updated_at
+            FROM evaluation_jobs WHERE id = :id
+            """),
+            {"id": job_id},
+        ).mappings().first()
+    if not row:
+        return None
+    job = dict(row)
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+def queue_depth() -> dict:
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT status, COUNT(*) FROM evaluation_jobs GROUP BY status")).fetchall()
+    return {status: count for status, count in rows}
@@ -0,0 +1,50 @@
+"""
+Peak memory / wall time measurement for a block of code.
+
+    with PeakRSS() as usage:
+        run_pipeline()
+    usage.report()  # {"wall_time_s": ..., "peak_rss_mb": ..., "rss_delta_mb": ...}
+
+RSS is sampled on a background thread, so short spikes between samples
+can be missed; the default 5 ms interval is fine for page-sized work.
+"""
+
+import time
+import threading
+
+import psutil
+
+
+class PeakRSS:
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._proc = psutil.Process()
+        self._stop = threading.Event()
+        self._thread = None
+        self.start_rss = self.peak_rss = 0
+        self.wall_time = 0.0
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, self._proc.memory_info().rss)
+
+    def __enter__(self) -> "PeakRSS":
+        self.start_rss = self.peak_rss = self._proc.memory_info().rss
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall_time = time.perf_counter() - self._started
+        self._stop.set()
+        self._thread.join()
+        self.peak_rss = max(self.peak_rss, self._proc.memory_info().rss)
+        return False
+
+    def report(self) -> dict:
+        return {
+            "wall_time_s": round(self.wall_time, 3),
+            "peak_rss_mb": round(self.peak_rss / 2**20, 1),
+            "rss_delta_mb": round((self.peak_rss - self.start_rss) / 2**20, 1),
+        }
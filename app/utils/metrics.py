@@ -0,0 +1,177 @@
+"""
+Minimal Prometheus-style metrics registry.
+
+Counters and histograms are plain dicts keyed by label values behind one
+lock, so instrumenting a hot path costs a dict update and, for
+histograms, a bisect. State that already lives elsewhere (cache
+counters, circuit breakers, queue depth) is read by collector callbacks
+only when /metrics is scraped. Rendered in the text exposition format
+(version 0.0.4); no client library needed.
+
+    from app.utils.metrics import metrics
+    metrics.provider_calls.inc(provider="gemini", model=model, outcome="success")
+    with metrics.time_stage("scoring"):
+        ...
+"""
+
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from app.utils import tracing
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# A collector returns (name, type, help, [(labels dict, value), ...]) tuples
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}" for key, value in items]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[tuple, list] = {}  # key -> [per-bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        lines = []
+        names = self.label_names + ("le",)
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(names, key + (_number(bound),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(names, key + ('+Inf',))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+        self._collectors: List[Collector] = []
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn: Collector) -> Collector:
+        """Registers a callback read at scrape time (usable as a decorator)."""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines += [f"# HELP {metric.name} {metric.help}", f"# TYPE {metric.name} {metric.kind}", *metric.render()]
+        for collect in self._collectors:
+            try:
+                families = list(collect())
+            except Exception as e:
+                logger.warning(f"Metrics collector {getattr(collect, '__name__', collect)} failed: {e}")
+                continue
+            for name, kind, help, samples in families:
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class Metrics:
+    """The application's metrics, one instance per process."""
+
+    def __init__(self):
+        self.registry = Registry()
+        r = self.registry
+        self.requests = r.histogram("mcq_http_request_duration_seconds", "HTTP request latency.", ["method", "route", "status"])
+        self.stages = r.histogram("mcq_stage_duration_seconds", "Latency of pipeline stages.", ["pipeline", "stage"])
+        self.provider_calls = r.counter("mcq_provider_calls_total", "Extraction calls per tier and outcome.", ["provider", "model", "outcome"])
+        self.provider_latency = r.histogram("mcq_provider_call_duration_seconds", "Extraction call latency per tier (all outcomes).", ["provider", "model"])
+        self.provider_bytes = r.counter("mcq_provider_upload_bytes_total", "Payload bytes sent to providers.", ["provider"])
+        self.provider_tokens = r.counter("mcq_provider_tokens_total", "Tokens reported by the provider SDKs.", ["provider", "model", "kind"])
+        self.extractions = r.counter("mcq_extractions_total", "ai_extract_answers results by source.", ["source"])
+        self.reextractions = r.counter("mcq_reextracted_questions_total", "Questions missing from an extraction and asked for again, by outcome.", ["outcome"])
+        self.grades = r.counter("mcq_grades_total", "Graded submissions by engine (zero_score = nothing extracted).", ["engine"])
+        self.ocr_runs = r.counter("mcq_ocr_runs_total", "process_answer_ocr runs by outcome and PDF mode.", ["outcome", "mode"])
+
+    @contextmanager
+    def time_stage(self, stage: str, pipeline: str = "mcq"):
+        """Observes the stage histogram and records a span on the current request trace."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stages.observe(elapsed, pipeline=pipeline, stage=stage)
+            tracing.record(stage, elapsed)
+
+    def render(self) -> str:
+        return self.registry.render()
+
+
+metrics = Metrics()
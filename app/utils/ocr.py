@@ -5,21 +5,24 @@ Integrated Advanced OCR Pipeline
 import os
 import io
 import re
+import tempfile
 import json
+import threading
 from collections import defaultdict
 from PIL import Image
 import fitz  # PyMuPDF
-import cv2
-import numpy as np
-from ultralytics import YOLO
 from dotenv import load_dotenv
-from google import genai
-from google.genai.types import Part, Blob
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, RootModel
 from typing import List, Dict, Optional, Any, Tuple
 from dotenv import load_dotenv
+
+from app.utils.rasterize import render_pdf_sync
+from app.utils.memory import PeakRSS
+from app.utils.metrics import metrics
+from app.utils.provider_clients import provider_clients
+from app.utils.triage import PageScanResult, PageScanBatchResult, TRIAGE_ENABLED, triage_pdf
 load_dotenv()
 
 # ------------------------------------------------------------------
@@ -48,10 +51,16 @@ class LocalGeminiClient:
         self.api_key = os.getenv("GEMINI_API_KEY")
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY not found in environment.")
-        self.client = genai.Client(api_key=self.api_key)
         self.model_name = model_name
 
+    @property
+    def client(self):
+        # Looked up per call: the registry rebuilds its clients after aclose()/start()
+        return provider_clients.gemini
+
     def generate_structured_json(self, contents, schema, call_type_for_logging=""):
+        from google.genai.types import Part, Blob
+
         try:
             processed_contents = []
 
@@ -88,40 +97,62 @@ class LocalGeminiClient:
 
 
 # ------------------------------------------------------------------
-# INIT GEMINI
+# INIT GEMINI (on first use; assign GRADING_CLIENT_INSTANCE to override)
 # ------------------------------------------------------------------
-try:
-    try:
-        from centralised_llm.src.llms.gemini_genai_llm import GeminiGradingClient
-        GRADING_CLIENT_INSTANCE = GeminiGradingClient(
-            model_name="gemini-1.5-flash-latest"
-        )
-    except ImportError:
-        GRADING_CLIENT_INSTANCE = LocalGeminiClient()
+GRADING_CLIENT_INSTANCE = None
+_init_lock = threading.Lock()
+
+
+def get_grading_client():
+    global GRADING_CLIENT_INSTANCE
+    with _init_lock:
+        if GRADING_CLIENT_INSTANCE is None:
+            try:
+                try:
+                    from centralised_llm.src.llms.gemini_genai_llm import GeminiGradingClient
+                    GRADING_CLIENT_INSTANCE = GeminiGradingClient(
+                        model_name="gemini-1.5-flash-latest"
+                    )
+                except ImportError:
+                    GRADING_CLIENT_INSTANCE = LocalGeminiClient()
 
-    logger.info("✅ Gemini Client initialized.")
+                logger.info("✅ Gemini Client initialized.")
 
-except Exception as e:
-    logger.critical(f"🚨 FAILED TO INITIALIZE GEMINI CLIENT: {e}")
-    GRADING_CLIENT_INSTANCE = None
+            except Exception as e:
+                logger.critical(f"🚨 FAILED TO INITIALIZE GEMINI CLIENT: {e}")
+        return GRADING_CLIENT_INSTANCE
 
 # ==================================================================
-# YOLO
+# YOLO (loaded on first use, or at startup with OCR_PRELOAD_YOLO=1)
 # ==================================================================
 
-YOLO_MODEL_PATH = "grade/yolo/best2.pt"
+YOLO_MODEL_PATH = os.getenv("YOLO_MODEL_PATH", "grade/yolo/best2.pt")
 YOLO_MODEL = None
+_yolo_tried = False
+
+
+def get_yolo_model():
+    """The diagram detector, loaded and warmed once per process. None if unavailable."""
+    global YOLO_MODEL, _yolo_tried
+    with _init_lock:
+        if _yolo_tried:
+            return YOLO_MODEL
+        _yolo_tried = True
+        if not os.path.exists(YOLO_MODEL_PATH):
+            logger.warning("YOLO model not found. Diagram detection skipped.")
+            return None
+        try:
+            import numpy as np
+            from ultralytics import YOLO
 
-if os.path.exists(YOLO_MODEL_PATH):
-    try:
-        logger.info("--- Loading YOLO Model ---")
-        YOLO_MODEL = YOLO(YOLO_MODEL_PATH)
-        YOLO_MODEL.predict(source=np.zeros((640, 640, 3), dtype=np.uint8), verbose=False)
-        logger.info("--- YOLO ready ---")
-    except Exception as e:
-        logger.error(f"YOLO load error: {e}")
-else:
-    logger.warning("YOLO model not found. Diagram detection skipped.")
+            logger.info("--- Loading YOLO Model ---")
+            YOLO_MODEL = YOLO(YOLO_MODEL_PATH)
+            YOLO_MODEL.predict(source=np.zeros((640, 640, 3), dtype=np.uint8), verbose=False)
+            logger.info("--- YOLO ready ---")
+        except Exception as e:
+            logger.error(f"YOLO load error: {e}")
+            YOLO_MODEL = None
+        return YOLO_MODEL
 
 # ==================================================================
 # PROMPT LOADER
@@ -148,16 +179,6 @@ def load_prompt(filename: str, prompt_dir: str = "ai_prompts") -> str:
 # SCHEMAS
 # ==================================================================
 
-class PageScanResult(BaseModel):
-    page_index: int
-    page_number: int = 9999
-    has_diagram: bool = False
-
-
-class PageScanBatchResult(BaseModel):
-    results: List[PageScanResult]
-
-
 class EquationStep(BaseModel):
     step: int
     equation: str
@@ -174,21 +195,92 @@ class QuestionContent(BaseModel):
 class OutputModel(RootModel[Dict[str, QuestionContent]]):
     pass
 
+
+class DiagramSelection(RootModel[Dict[str, List[int]]]):
+    pass
+
 # ==================================================================
 # OCR HELPERS
 # ==================================================================
 
-def extract_images_from_pdf(pdf_path: str) -> List[Tuple[str, Image.Image]]:
-    images = []
-    doc = fitz.open(pdf_path)
+# How process_answer_ocr prepares the PDF it sends to Gemini:
+#   auto   - original bytes when acceptable, else stream
+#   direct - original bytes (images are wrapped into a PDF)
+#   stream - re-encode page by page, one rendered page in memory at a time
+#   legacy - render every page to PIL, then rebuild a PDF from all of them
+OCR_PDF_MODE = os.getenv("OCR_PDF_MODE", "auto")
+OCR_PAGE_DPI = int(os.getenv("OCR_PAGE_DPI", "300"))
+OCR_PAGE_JPEG_QUALITY = int(os.getenv("OCR_PAGE_JPEG_QUALITY", "85"))
+# Gemini takes inline PDFs up to ~20 MB and 1000 pages
+OCR_DIRECT_MAX_BYTES = int(os.getenv("OCR_DIRECT_MAX_BYTES", str(18 * 1024 * 1024)))
+OCR_DIRECT_MAX_PAGES = int(os.getenv("OCR_DIRECT_MAX_PAGES", "1000"))
+
+
+def read_as_pdf(file_path: str) -> bytes:
+    """The file as PDF bytes; images (PNG/JPG) are wrapped into a one-page PDF."""
+    doc = fitz.open(file_path)
+    try:
+        if doc.is_pdf:
+            with open(file_path, "rb") as f:
+                return f.read()
+        return doc.convert_to_pdf()
+    finally:
+        doc.close()
+
+
+def pdf_is_acceptable(pdf_bytes: bytes) -> bool:
+    """Can the original PDF be sent to Gemini as-is?"""
+    if len(pdf_bytes) > OCR_DIRECT_MAX_BYTES:
+        return False
+    try:
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    except Exception:
+        return False
+    try:
+        return not doc.needs_pass and 0 < doc.page_count <= OCR_DIRECT_MAX_PAGES
+    finally:
+        doc.close()
 
-    for i, page in enumerate(doc):
-        pix = page.get_pixmap(dpi=300)
-        img = Image.open(io.BytesIO(pix.tobytes("png")))
-        images.append((f"page_{i+1}", img))
 
-    doc.close()
-    return images
+def iter_page_jpegs(pdf_bytes: bytes, dpi: int = OCR_PAGE_DPI):
+    """Yields (page rect, JPEG bytes) one page at a time."""
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        for page in doc:
+            pix = page.get_pixmap(dpi=dpi, alpha=False)
+            jpeg = pix.tobytes("jpeg", jpg_quality=OCR_PAGE_JPEG_QUALITY)
+            del pix
+            # MuPDF keeps decoded page images in its store; drop them so pages don't accumulate
+            fitz.TOOLS.store_shrink(100)
+            yield page.rect, jpeg
+    finally:
+        doc.close()
+
+
+def stream_pdf_bytes(pdf_bytes: bytes, dpi: int = OCR_PAGE_DPI) -> Tuple[bytes, int]:
+    """Rebuilds the PDF from rendered pages without holding more than one raster at a time."""
+    out = fitz.open()
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            for rect, jpeg in iter_page_jpegs(pdf_bytes, dpi):
+                page = out.new_page(width=rect.width, height=rect.height)
+                page.insert_image(page.rect, stream=jpeg)
+            pages = out.page_count
+            # Saving to disk first lets the document be freed before the bytes are read back
+            path = os.path.join(tmp, "pages.pdf")
+            out.save(path)
+        finally:
+            out.close()
+        with open(path, "rb") as f:
+            return f.read(), pages
+
+
+def extract_images_from_pdf(pdf_path: str) -> List[Tuple[str, Image.Image]]:
+    pdf_bytes = read_as_pdf(pdf_path)
+
+    # Pages render in parallel on the shared pool; repeat runs hit the render cache
+    pages = render_pdf_sync(pdf_bytes, dpi=300)
+    return [(f"page_{i+1}", Image.open(io.BytesIO(png))) for i, png in enumerate(pages)]
 
 
 def images_to_pdf_bytes(images: List[Image.Image]) -> bytes:
@@ -202,7 +294,10 @@ def images_to_pdf_bytes(images: List[Image.Image]) -> bytes:
 # ==================================================================
 
 def gemini_json_from_pdf(pdf_bytes: bytes, output_path: str, user_id: int) -> str:
-    if not GRADING_CLIENT_INSTANCE:
+    from google.genai.types import Part, Blob
+
+    client = get_grading_client()
+    if not client:
         return json.dumps({"error": "Gemini not initialized"})
 
     prompt = load_prompt("ocr_extraction_prompt.yaml").format(
@@ -217,7 +312,7 @@ def gemini_json_from_pdf(pdf_bytes: bytes, output_path: str, user_id: int) -> st
         )
     )
 
-    response = GRADING_CLIENT_INSTANCE.generate_structured_json(
+    response = client.generate_structured_json(
         contents=[pdf_part, prompt],
         schema=OutputModel.model_json_schema(),
         call_type_for_logging="gemini_json_from_pdf"
@@ -230,15 +325,208 @@ def gemini_json_from_pdf(pdf_bytes: bytes, output_path: str, user_id: int) -> st
     return validated.model_dump_json(indent=2)
 
 # ==================================================================
-# MAIN OCR PIPELINE
+# DIAGRAM DETECTION
 # ==================================================================
 
-def process_answer_ocr(file_path, output_json_dir, output_images_dir, user_id):
+# YOLO runs on OCR_DIAGRAM_BATCH pages per inference call, and each batch
+# that has detections gets one select_diagram_boxes call with the
+# numbered overlays, so the LLM only maps boxes to questions.
+OCR_DIAGRAMS = os.getenv("OCR_DIAGRAMS", "1") == "1"
+OCR_DIAGRAM_BATCH = int(os.getenv("OCR_DIAGRAM_BATCH", "8"))
+OCR_DIAGRAM_DPI = int(os.getenv("OCR_DIAGRAM_DPI", "150"))
+OCR_DIAGRAM_CONFIDENCE = float(os.getenv("OCR_DIAGRAM_CONFIDENCE", "0.25"))
+# Only run YOLO on pages the local triage flagged as containing a drawing
+OCR_DIAGRAM_SCREEN = os.getenv("OCR_DIAGRAM_SCREEN", "1") == "1"
+BOX_COLOR = (0, 200, 0)  # BGR green, as the prompt describes
+
+
+def iter_page_batches(pdf_bytes: bytes, batch_size: int = OCR_DIAGRAM_BATCH, dpi: int = OCR_DIAGRAM_DPI, pages: Optional[set] = None):
+    """Yields lists of (page index, BGR array), batch_size pages at a time (only `pages` if given)."""
+    import numpy as np
+
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
     try:
+        batch = []
+        for i, page in enumerate(doc):
+            if pages is not None and i not in pages:
+                continue
+            pix = page.get_pixmap(dpi=dpi, alpha=False)
+            rgb = np.frombuffer(pix.samples, np.uint8).reshape(pix.height, pix.width, pix.n)
+            batch.append((i, np.ascontiguousarray(rgb[:, :, ::-1])))
+            del pix
+            fitz.TOOLS.store_shrink(100)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        doc.close()
+
+
+def detect_boxes(model, images: list) -> List[List[Tuple[List[int], float]]]:
+    """One batched YOLO call; per image, [(xyxy, confidence)]."""
+    results = model.predict(source=images, conf=OCR_DIAGRAM_CONFIDENCE, verbose=False)
+    boxes = []
+    for result in results:
+        xyxy = result.boxes.xyxy.cpu().numpy().astype(int).tolist()
+        conf = result.boxes.conf.cpu().numpy().tolist()
+        boxes.append(list(zip(xyxy, conf)))
+    return boxes
+
+
+def draw_overlay(image, boxes: List[Tuple[int, List[int]]]):
+    """Copy of the page with each box outlined and labelled with its number."""
+    import cv2
+
+    overlay = image.copy()
+    for number, (x1, y1, x2, y2) in boxes:
+        cv2.rectangle(overlay, (x1, y1), (x2, y2), BOX_COLOR, 3)
+        cv2.putText(overlay, str(number), (x1 + 6, max(y1 - 8, 24)), cv2.FONT_HERSHEY_SIMPLEX, 1.0, BOX_COLOR, 2)
+    return overlay
+
+
+def question_context(answers: Dict[str, Any]) -> str:
+    """Questions Gemini flagged as having a diagram (all questions if none were flagged)."""
+    flagged = [q for q, content in answers.items() if content.get("diagram")]
+    lines = []
+    for q in flagged or list(answers):
+        text = (answers[q].get("text") or "").strip().replace("\n", " ")
+        lines.append(f"- {q}: {text[:120]}")
+    return "\n".join(lines)
+
+
+def select_diagram_boxes(overlays: List[Image.Image], context: str) -> Dict[str, List[int]]:
+    client = get_grading_client()
+    if not client:
+        return {}
+    prompt = load_prompt("select_diagram_boxes_prompt.yaml").format(question_context=context)
+    response = client.generate_structured_json(
+        contents=[*overlays, prompt],
+        schema=DiagramSelection.model_json_schema(),
+        call_type_for_logging="select_diagram_boxes"
+    )
+    if response.error:
+        logger.warning(f"Diagram selection failed: {response.error}")
+        return {}
+    return DiagramSelection.model_validate_json(response.response).root
+
+
+def attach_diagrams(pdf_bytes: bytes, answers: Dict[str, Any], output_images_dir: str, user_id, pages: Optional[set] = None) -> dict:
+    """
+    Detects diagrams on every page (or only `pages`), saves overlays and
+    crops under output_images_dir, and replaces each question's diagram
+    placeholder with the crops the LLM assigned to it. Returns stage
+    statistics.
+    """
+    import cv2
+
+    stats = {"pages": 0, "batches": 0, "boxes": 0, "llm_calls": 0, "assigned": 0}
+    model = get_yolo_model() if OCR_DIAGRAMS else None
+    if model is None or not answers:
+        stats["skipped"] = True
+        return stats
+
+    os.makedirs(output_images_dir, exist_ok=True)
+    context = question_context(answers)
+    assigned: Dict[str, list] = defaultdict(list)
+
+    for batch in iter_page_batches(pdf_bytes, pages=pages):
+        stats["pages"] += len(batch)
+        stats["batches"] += 1
+        detections = detect_boxes(model, [image for _, image in batch])
+
+        # Box numbers run across the whole batch so one LLM call can refer to any of them
+        numbered, overlays = {}, []
+        for (page, image), boxes in zip(batch, detections):
+            if not boxes:
+                continue
+            page_boxes = []
+            for xyxy, conf in boxes:
+                number = len(numbered) + 1
+                x1, y1, x2, y2 = xyxy
+                crop_path = os.path.join(output_images_dir, f"{user_id}_page{page + 1}_box{number}.png")
+                cv2.imwrite(crop_path, image[max(y1, 0):y2, max(x1, 0):x2])
+                numbered[number] = {"page": page + 1, "box": number, "bbox": xyxy, "confidence": round(conf, 3), "path": crop_path}
+                page_boxes.append((number, xyxy))
+            overlay = draw_overlay(image, page_boxes)
+            cv2.imwrite(os.path.join(output_images_dir, f"{user_id}_page{page + 1}_boxes.jpg"), overlay)
+            overlays.append(Image.fromarray(overlay[:, :, ::-1]))
+
+        stats["boxes"] += len(numbered)
+        if not numbered:
+            continue
+        stats["llm_calls"] += 1
+        for q, box_ids in select_diagram_boxes(overlays, context).items():
+            if q in answers:
+                assigned[q].extend(numbered[b] for b in box_ids if b in numbered)
+
+    for q, crops in assigned.items():
+        if crops:
+            answers[q]["diagram"] = {"crops": crops}
+            stats["assigned"] += len(crops)
+    return stats
+
+# ==================================================================
+# MAIN OCR PIPELINE
+# ==================================================================
+
+def prepare_pdf(file_path: str, mode: str) -> Tuple[bytes, int, str]:
+    """Returns (PDF bytes for Gemini, pages, mode actually used)."""
+    if mode == "legacy":
         images = [img for _, img in extract_images_from_pdf(file_path)]
-        pdf_bytes = images_to_pdf_bytes(images)
+        return images_to_pdf_bytes(images), len(images), mode
+
+    pdf_bytes = read_as_pdf(file_path)
+    if mode == "direct" or (mode == "auto" and pdf_is_acceptable(pdf_bytes)):
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        pages = doc.page_count
+        doc.close()
+        return pdf_bytes, pages, "direct"
+
+    out, pages = stream_pdf_bytes(pdf_bytes)
+    return out, pages, "stream"
+
+
+def triage_pages(pdf_bytes: bytes) -> Tuple[bytes, Optional[dict], Optional[set]]:
+    """
+    Local blank / orientation / page-order triage. Returns the PDF to
+    send (rebuilt if pages changed), the report, and the pages worth
+    running diagram detection on (None = all).
+    """
+    if not TRIAGE_ENABLED:
+        return pdf_bytes, None, None
+    try:
+        pdf_bytes, report, kept = triage_pdf(pdf_bytes)
+    except Exception as e:
+        logger.warning(f"Page triage skipped: {e}")
+        return pdf_bytes, None, None
+    screened = {i for i, page in enumerate(kept) if page.has_diagram} if OCR_DIAGRAM_SCREEN else None
+    return pdf_bytes, report, screened
 
-        raw_json = gemini_json_from_pdf(pdf_bytes, output_images_dir, user_id)
+
+def process_answer_ocr(file_path, output_json_dir, output_images_dir, user_id, mode: Optional[str] = None):
+    used_mode = mode or OCR_PDF_MODE
+    try:
+        with PeakRSS() as usage:
+            with metrics.time_stage("prepare", pipeline="ocr"):
+                pdf_bytes, pages, used_mode = prepare_pdf(file_path, used_mode)
+            with metrics.time_stage("triage", pipeline="ocr"):
+                pdf_bytes, triage, screened = triage_pages(pdf_bytes)
+            if triage and not triage["kept"]:
+                metrics.ocr_runs.inc(outcome="blank", mode=used_mode)
+                return {"success": False, "error": "Every page appears to be blank.", "triage": triage}
+            if triage:
+                pages = triage["kept"]
+            with metrics.time_stage("gemini", pipeline="ocr"):
+                raw_json = gemini_json_from_pdf(pdf_bytes, output_images_dir, user_id)
+            answers = json.loads(raw_json)
+            diagrams = {"skipped": True}
+            if "error" not in answers:
+                with metrics.time_stage("diagrams", pipeline="ocr"):
+                    diagrams = attach_diagrams(pdf_bytes, answers, output_images_dir, user_id, pages=screened)
+                raw_json = json.dumps(answers, indent=2)
+        logger.info(f"OCR {file_path}: mode={used_mode}, {pages} pages, {len(pdf_bytes) / 2**20:.1f} MB sent, diagrams={diagrams}, {usage.report()}")
 
         os.makedirs(output_json_dir, exist_ok=True)
         json_path = os.path.join(output_json_dir, f"{user_id}_answers.json")
@@ -246,14 +534,20 @@ def process_answer_ocr(file_path, output_json_dir, output_images_dir, user_id):
         with open(json_path, "w", encoding="utf-8") as f:
             f.write(raw_json)
 
+        metrics.ocr_runs.inc(outcome="success" if "error" not in answers else "model_error", mode=used_mode)
         return {
             "success": True,
             "json_path": json_path,
-            "pages_processed": len(images)
+            "pages_processed": pages,
+            "mode": used_mode,
+            "diagrams": diagrams,
+            "triage": triage,
+            **usage.report()
         }
 
     except Exception as e:
         logger.error(f"OCR failed: {e}", exc_info=True)
+        metrics.ocr_runs.inc(outcome="error", mode=used_mode)
         return {"success": False, "error": str(e)}
 
 # ==================================================================
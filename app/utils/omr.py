@@ -0,0 +1,423 @@
+"""
+Local OMR engine for printed bubble / checkbox answer sheets.
+
+Finds the answer grid with classical CV, measures every bubble's fill
+ratio in one vectorized integral-image lookup and returns the same
+{"1": "A"} map as the AI extractors, plus a per-question confidence.
+Functions here are pure and picklable so they can run in the shared
+process pool (app.utils.pool).
+"""
+
+import os
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+# Opt-in: the grid detector can mistake a handwritten or typed sheet for a bubble grid and grade it locally
+OMR_ENABLED = os.getenv("OMR_ENABLED", "0") == "1"
+OMR_CONFIDENCE_THRESHOLD = float(os.getenv("OMR_CONFIDENCE_THRESHOLD", "0.6"))
+
+OPTIONS = "ABCDEF"
+MAX_EDGE = 1600           # px; sheets are downscaled to this long edge first
+PDF_DPI = 150
+FILL_MARKED = 0.45        # inner-area ink ratio at which a bubble counts as marked
+MIN_GRID_ROWS = 3
+
+
+# ==================================================================
+# DECODING
+# ==================================================================
+
+def _fit(gray: np.ndarray) -> np.ndarray:
+    scale = MAX_EDGE / max(gray.shape)
+    if scale < 1:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return gray
+
+
+def decode_gray(image_bytes: bytes) -> np.ndarray:
+    gray = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise ValueError("Unreadable image")
+    return _fit(gray)
+
+
+def pdf_pages_gray(pdf_bytes: bytes, dpi: int = PDF_DPI) -> List[np.ndarray]:
+    import fitz  # PyMuPDF
+
+    pages = []
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        for page in doc:
+            pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+            arr = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+            pages.append(_fit(arr.copy()))
+    finally:
+        doc.close()
+    return pages
+
+
+# ==================================================================
+# GRID DETECTION
+# ==================================================================
+
+def ink_mask(gray: np.ndarray) -> np.ndarray:
+    """Binary ink mask (1 = ink), robust to uneven phone lighting."""
+    block = max(31, (max(gray.shape) // 25) | 1)
+    blur = cv2.GaussianBlur(gray, (5, 5), 0)
+    binary = cv2.adaptiveThreshold(blur, 1, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, block, 10)
+    return binary
+
+
+def find_bubbles(ink: np.ndarray) -> np.ndarray:
+    """Candidate bubble boxes as an (N, 4) int array of x, y, w, h."""
+    h_img, w_img = ink.shape
+    min_side, max_side = max(8, w_img * 0.008), w_img * 0.08
+
+    contours, _ = cv2.findContours(ink, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    boxes = []
+    for c in contours:
+        x, y, w, h = cv2.boundingRect(c)
+        if not (min_side <= w <= max_side and min_side <= h <= max_side):
+            continue
+        if not 0.75 <= w / h <= 1.33:
+            continue
+        # circles cover ~0.785 of their box, squares ~1.0
+        if cv2.contourArea(c) < 0.6 * w * h:
+            continue
+        boxes.append((x, y, w, h))
+    if not boxes:
+        return np.empty((0, 4), dtype=int)
+
+    boxes = np.array(boxes, dtype=int)
+
+    # Drop inner contours of rings / duplicates: keep the largest box per centre
+    boxes = boxes[np.argsort(-(boxes[:, 2] * boxes[:, 3]))]
+    centres = boxes[:, :2] + boxes[:, 2:] / 2
+    keep = []
+    for i in range(len(boxes)):
+        if keep:
+            d = np.abs(centres[keep] - centres[i])
+            if np.any((d[:, 0] < boxes[keep, 2] / 2) & (d[:, 1] < boxes[keep, 3] / 2)):
+                continue
+        keep.append(i)
+    boxes = boxes[keep]
+
+    # Bubbles on a sheet share one size
+    side = np.median(boxes[:, 2:], axis=0)
+    ok = np.all(np.abs(boxes[:, 2:] - side) <= 0.35 * side, axis=1)
+    return boxes[ok]
+
+
+def _split(values: np.ndarray, gap: float) -> List[np.ndarray]:
+    """Indices of sorted `values` split wherever consecutive values differ by more than `gap`."""
+    order = np.argsort(values)
+    breaks = np.where(np.diff(values[order]) > gap)[0] + 1
+    return np.split(order, breaks)
+
+
+def build_grid(boxes: np.ndarray) -> Optional[List[np.ndarray]]:
+    """
+    Arrange bubbles into questions. Returns one index array (into `boxes`)
+    per question, ordered by question number (column-major blocks), or
+    None when no regular grid is present.
+    """
+    if len(boxes) < MIN_GRID_ROWS * 2:
+        return None
+
+    bw, bh = np.median(boxes[:, 2]), np.median(boxes[:, 3])
+    cx = boxes[:, 0] + boxes[:, 2] / 2
+    cy = boxes[:, 1] + boxes[:, 3] / 2
+
+    rows = _split(cy, 0.5 * bh)
+
+    # Option spacing = typical gap between horizontally adjacent bubbles
+    gaps = [np.diff(np.sort(cx[r])) for r in rows if len(r) > 1]
+    if not gaps:
+        return None
+    spacing = np.median(np.concatenate(gaps))
+    if spacing < bw:
+        return None
+
+    groups = []
+    for r in rows:
+        for g in _split(cx[r], 1.6 * spacing):
+            g = r[g]
+            if 2 <= len(g) <= len(OPTIONS):
+                d = np.diff(np.sort(cx[g]))
+                if d.std() <= 0.3 * d.mean():
+                    groups.append(g[np.argsort(cx[g])])
+    if not groups:
+        return None
+
+    sizes = np.array([len(g) for g in groups])
+    k = np.bincount(sizes).argmax()
+    groups = [g for g in groups if len(g) == k]
+    if len(groups) < MIN_GRID_ROWS:
+        return None
+
+    # Blocks of questions = clusters of group start positions; number down each block
+    x0 = np.array([cx[g[0]] for g in groups])
+    y0 = np.array([cy[g[0]] for g in groups])
+    ordered = []
+    for block in sorted(_split(x0, k * spacing / 2), key=lambda b: x0[b].mean()):
+        ordered.extend(block[np.argsort(y0[block])])
+    return [groups[i] for i in ordered]
+
+
+# ==================================================================
+# FILL MEASUREMENT
+# ==================================================================
+
+def fill_ratios(ink: np.ndarray, boxes: np.ndarray, inset: float = 0.2) -> np.ndarray:
+    """Ink fraction inside the inner part of every box, via one integral-image lookup."""
+    ii = cv2.integral(ink)
+    dx = (boxes[:, 2] * inset).astype(int)
+    dy = (boxes[:, 3] * inset).astype(int)
+    x0, y0 = boxes[:, 0] + dx, boxes[:, 1] + dy
+    x1, y1 = boxes[:, 0] + boxes[:, 2] - dx, boxes[:, 1] + boxes[:, 3] - dy
+    inked = ii[y1, x1] - ii[y0, x1] - ii[y1, x0] + ii[y0, x0]
+    area = np.maximum((x1 - x0) * (y1 - y0), 1)
+    return inked / area
+
+
+def score_questions(fills: np.ndarray, fill_marked: float = FILL_MARKED):
+    """
+    fills: (questions, options) fill ratios.
+    Returns (choice index or -1 for blank, confidence) arrays.
+    """
+    order = np.argsort(-fills, axis=1)
+    top = np.take_along_axis(fills, order[:, :1], axis=1)[:, 0]
+    second = np.take_along_axis(fills, order[:, 1:2], axis=1)[:, 0] if fills.shape[1] > 1 else np.zeros_like(top)
+
+    marked = top >= fill_marked
+    decision = np.clip(np.abs(top - fill_marked) / 0.25, 0, 1)
+    separation = np.clip((top - second) / 0.3, 0, 1)
+    confidence = np.where(marked, np.minimum(decision, separation), decision)
+    choice = np.where(marked, order[:, 0], -1)
+    return choice, confidence
+
+
+# ==================================================================
+# PUBLIC ENTRY POINTS (run in the process pool)
+# ==================================================================
+
+def read_sheet(gray: np.ndarray) -> Optional[dict]:
+    """OMR one page. None when the page has no recognizable bubble grid."""
+    ink = ink_mask(gray)
+    boxes = find_bubbles(ink)
+    questions = build_grid(boxes)
+    if not questions:
+        return None
+
+    grid = np.stack(questions)                       # (questions, options)
+    fills = fill_ratios(ink, boxes[grid.ravel()]).reshape(grid.shape)
+    choice, confidence = score_questions(fills)
+
+    answers, conf = {}, {}
+    for i, (c, p) in enumerate(zip(choice, confidence), start=1):
+        answers[str(i)] = OPTIONS[c] if c >= 0 else ""
+        conf[str(i)] = round(float(p), 3)
+    return {"answers": answers, "confidence": conf}
+
+
+def read_document(data: bytes, content_type: str) -> List[Optional[dict]]:
+    """OMR every page of an image or PDF upload."""
+    if content_type == "application/pdf":
+        pages = pdf_pages_gray(data)
+    else:
+        pages = [decode_gray(data)]
+    return [read_sheet(p) for p in pages]
+
+
+def merge_pages(pages: List[Optional[dict]], renumber: bool = True) -> Optional[dict]:
+    """
+    Join per-page results in upload order, continuing question numbers
+    across pages. None if any page had no grid (the AI should read it).
+    With renumber=False (template sheets, whose question labels are free
+    text such as "Q1") labels are kept as-is and a later page wins.
+    """
+    if not pages or any(p is None for p in pages):
+        return None
+    answers: Dict[str, str] = {}
+    confidence: Dict[str, float] = {}
+    offset = 0
+    for page in pages:
+        for q, a in page["answers"].items():
+            key = str(int(q) + offset) if renumber else str(q)
+            answers[key] = a
+            confidence[key] = page["confidence"][q]
+        offset += len(page["answers"])
+    return {"answers": answers, "confidence": confidence}
+
+
+# ==================================================================
+# TEMPLATE-REGISTERED SHEETS
+# ==================================================================
+# A template fixes the sheet layout: canvas size, four fiducials (corner
+# squares or ArUco markers, ordered TL, TR, BR, BL) and every bubble's
+# centre/radius in canvas pixels. Photos are warped onto the canvas with a
+# homography, so no grid detection is needed and every bubble's pixels
+# are known in advance.
+
+ARUCO_DICT = cv2.aruco.DICT_4X4_50 if hasattr(cv2, "aruco") else None
+
+_compiled_templates: Dict[int, dict] = {}
+
+
+def compile_template(template: dict) -> dict:
+    """
+    Precompute flat pixel indices of every bubble's inner disk on the
+    template canvas, so grading is one gather + one reduceat per sheet.
+    """
+    width, height = template["width"], template["height"]
+    bubbles = template["bubbles"]
+
+    questions: List[str] = []
+    for b in bubbles:
+        if b["question"] not in questions:
+            questions.append(b["question"])
+    q_index = {q: i for i, q in enumerate(questions)}
+    max_options = max(len(OPTIONS), max(OPTIONS.index(b["option"]) + 1 for b in bubbles))
+
+    indices, offsets, counts, cells = [], [], [], []
+    start = 0
+    for b in bubbles:
+        r = max(1.0, b["r"] * 0.7)
+        x0, x1 = int(max(0, b["x"] - r)), int(min(width - 1, b["x"] + r))
+        y0, y1 = int(max(0, b["y"] - r)), int(min(height - 1, b["y"] + r))
+        ys, xs = np.mgrid[y0:y1 + 1, x0:x1 + 1]
+        inside = (xs - b["x"]) ** 2 + (ys - b["y"]) ** 2 <= r * r
+        flat = (ys[inside] * width + xs[inside]).astype(np.int64)
+        indices.append(flat)
+        offsets.append(start)
+        counts.append(max(len(flat), 1))
+        cells.append(q_index[b["question"]] * max_options + OPTIONS.index(b["option"]))
+        start += len(flat)
+
+    return {
+        "width": width,
+        "height": height,
+        "markers": np.array(template["markers"], dtype=np.float32),
+        "aruco_ids": template.get("aruco_ids"),
+        "fill_threshold": template.get("fill_threshold", FILL_MARKED),
+        "questions": questions,
+        "max_options": max_options,
+        "indices": np.concatenate(indices),
+        "offsets": np.array(offsets, dtype=np.int64),
+        "counts": np.array(counts, dtype=np.float64),
+        "cells": np.array(cells, dtype=np.int64),
+    }
+
+
+def get_compiled_template(template_id: int, template: dict) -> dict:
+    """Per-process cache so pool workers compile each template once."""
+    compiled = _compiled_templates.get(template_id)
+    if compiled is None:
+        compiled = _compiled_templates[template_id] = compile_template(template)
+    return compiled
+
+
+DETECT_EDGE = 800  # fiducials are located on a downscaled copy, then scaled back
+
+_aruco_detector = None
+
+
+def _downscaled(gray: np.ndarray):
+    scale = min(1.0, DETECT_EDGE / max(gray.shape))
+    if scale < 1:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return gray, scale
+
+
+def _aruco_points(gray: np.ndarray, ids: List[int]) -> Optional[np.ndarray]:
+    global _aruco_detector
+    if ARUCO_DICT is None:
+        return None
+    if _aruco_detector is None:
+        _aruco_detector = cv2.aruco.ArucoDetector(cv2.aruco.getPredefinedDictionary(ARUCO_DICT))
+    small, scale = _downscaled(gray)
+    corners, found, _ = _aruco_detector.detectMarkers(small)
+    if found is None:
+        return None
+    centres = {int(i): c.reshape(4, 2).mean(axis=0) / scale for i, c in zip(found.ravel(), corners)}
+    if not all(i in centres for i in ids):
+        return None
+    return np.array([centres[i] for i in ids], dtype=np.float32)
+
+
+def _corner_square_points(gray: np.ndarray) -> Optional[np.ndarray]:
+    """Centres of the solid square fiducial nearest each image corner (TL, TR, BR, BL)."""
+    small, scale = _downscaled(gray)
+    h, w = small.shape
+    contours, _ = cv2.findContours(ink_mask(small), cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+    min_area, max_area = (w * h) * 0.0004, (w * h) * 0.02
+    centres = []
+    for c in contours:
+        area = cv2.contourArea(c)
+        if not min_area <= area <= max_area:
+            continue
+        x, y, bw, bh = cv2.boundingRect(c)
+        if not 0.6 <= bw / bh <= 1.6:
+            continue
+        # solid quadrilateral (perspective turns squares into general quads)
+        quad = cv2.approxPolyDP(c, 0.08 * cv2.arcLength(c, True), True)
+        if len(quad) != 4 or area < 0.9 * cv2.contourArea(cv2.convexHull(c)):
+            continue
+        centres.append((x + bw / 2, y + bh / 2))
+    if len(centres) < 4:
+        return None
+
+    centres = np.array(centres, dtype=np.float32)
+    corners = np.array([[0, 0], [w, 0], [w, h], [0, h]], dtype=np.float32)
+    picked = []
+    for corner in corners:
+        d = np.linalg.norm(centres - corner, axis=1)
+        i = int(d.argmin())
+        if d[i] > 0.35 * np.hypot(w, h):
+            return None
+        picked.append(centres[i])
+    points = np.array(picked, dtype=np.float32) / scale
+    return points if len({tuple(p) for p in points}) == 4 else None
+
+
+def align_to_template(gray: np.ndarray, compiled: dict) -> Optional[np.ndarray]:
+    """Warp a photo onto the template canvas. None if the fiducials are not found."""
+    if compiled["aruco_ids"]:
+        points = _aruco_points(gray, compiled["aruco_ids"])
+    else:
+        points = _corner_square_points(gray)
+    if points is None:
+        return None
+    homography, _ = cv2.findHomography(points, compiled["markers"])
+    if homography is None:
+        return None
+    return cv2.warpPerspective(gray, homography, (compiled["width"], compiled["height"]), borderValue=255)
+
+
+def read_template_sheet(gray: np.ndarray, compiled: dict) -> Optional[dict]:
+    warped = align_to_template(gray, compiled)
+    if warped is None:
+        return None
+
+    ink = ink_mask(warped).ravel()
+    fills = np.add.reduceat(ink[compiled["indices"]], compiled["offsets"]) / compiled["counts"]
+
+    n_q, n_o = len(compiled["questions"]), compiled["max_options"]
+    grid = np.full(n_q * n_o, -1.0)
+    grid[compiled["cells"]] = fills
+    choice, confidence = score_questions(grid.reshape(n_q, n_o), compiled["fill_threshold"])
+
+    answers, conf = {}, {}
+    for q, c, p in zip(compiled["questions"], choice, confidence):
+        answers[q] = OPTIONS[c] if c >= 0 else ""
+        conf[q] = round(float(p), 3)
+    return {"answers": answers, "confidence": conf}
+
+
+def read_document_with_template(data: bytes, content_type: str, template_id: int, template: dict) -> List[Optional[dict]]:
+    compiled = get_compiled_template(template_id, template)
+    pages = pdf_pages_gray(data) if content_type == "application/pdf" else [decode_gray(data)]
+    return [read_template_sheet(p, compiled) for p in pages]
@@ -0,0 +1,53 @@
+"""
+Registered OMR sheet templates: persistence in cbse.db plus an
+in-process cache of template definitions. The heavy precomputation
+(bubble masks) happens in app.utils.omr, once per pool worker.
+"""
+
+import json
+import asyncio
+from typing import Optional
+
+from app.database import SessionLocal
+from app.models import OMRTemplate
+
+_templates: dict = {}
+
+
+def _remember(template: OMRTemplate) -> dict:
+    record = {"id": template.id, "name": template.name, **json.loads(template.definition)}
+    _templates[template.id] = record
+    return record
+
+
+def create_template(definition: dict) -> dict:
+    definition = dict(definition)
+    name = definition.pop("name")
+    definition.pop("id", None)
+    db = SessionLocal()
+    try:
+        template = OMRTemplate(name=name, definition=json.dumps(definition))
+        db.add(template)
+        db.commit()
+        db.refresh(template)
+        return _remember(template)
+    finally:
+        db.close()
+
+
+def get_template(template_id: int) -> Optional[dict]:
+    if template_id in _templates:
+        return _templates[template_id]
+    db = SessionLocal()
+    try:
+        template = db.get(OMRTemplate, template_id)
+        return _remember(template) if template else None
+    finally:
+        db.close()
+
+
+async def load_template(template_id: int) -> Optional[dict]:
+    record = _templates.get(template_id)
+    if record is None:
+        record = await asyncio.to_thread(get_template, template_id)
+    return record
@@ -0,0 +1,39 @@
+"""
+Shared process pool for CPU-bound image work (OMR, rasterization).
+
+Work submitted here runs on other cores, so the event loop stays free
+and several sheets are processed in parallel.
+"""
+
+import os
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", str(os.cpu_count() or 2)))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=POOL_WORKERS)
+        logger.info(f"CPU process pool started with {POOL_WORKERS} workers.")
+    return _pool
+
+
+async def run_in_process(fn: Callable[..., Any], *args: Any) -> Any:
+    """Run a picklable top-level function in the shared pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), fn, *args)
+
+
+def shutdown_process_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
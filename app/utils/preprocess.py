@@ -0,0 +1,163 @@
+"""
+Image preprocessing before provider upload.
+
+Phone photos of answer sheets are 4-12 MP JPEGs, most of which is
+background, perspective and sensor noise the model does not need. Each
+photo is, in order:
+
+- perspective-corrected to the sheet boundary (largest convex
+  quadrilateral covering most of the frame), if one is found;
+- deskewed by the angle that maximizes the text-line projection profile;
+- downscaled to PREPROCESS_MAX_EDGE on its long edge;
+- optionally binarized (adaptive threshold);
+- recompressed as JPEG / WebP / PNG.
+
+The original bytes are kept whenever the result would not be smaller.
+PDFs are not touched. Functions here are pure and picklable so they can
+run in the shared process pool. `python -m benchmarks.preprocess_accuracy`
+measures extraction accuracy against payload size to pick the settings.
+"""
+
+import os
+import json
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+from pydantic import BaseModel
+
+# Off until benchmarks.preprocess_accuracy has been run against the real providers
+PREPROCESS_ENABLED = os.getenv("PREPROCESS_ENABLED", "0") == "1"
+
+FORMATS = {"jpeg": (".jpg", "image/jpeg"), "webp": (".webp", "image/webp"), "png": (".png", "image/png")}
+ANALYSIS_EDGE = 800       # px; boundary and skew are measured on a copy this size
+MIN_SHEET_AREA = 0.35     # share of the frame the sheet outline must cover
+MAX_SKEW = 5.0            # degrees searched either way
+SKEW_STEP = 0.5
+MIN_SKEW = 0.5            # smaller angles are left alone
+
+
+class PreprocessOptions(BaseModel):
+    max_edge: int = int(os.getenv("PREPROCESS_MAX_EDGE", "2000"))
+    fmt: str = os.getenv("PREPROCESS_FORMAT", "jpeg")
+    quality: int = int(os.getenv("PREPROCESS_QUALITY", "85"))
+    binarize: bool = os.getenv("PREPROCESS_BINARIZE", "0") == "1"
+    perspective: bool = os.getenv("PREPROCESS_PERSPECTIVE", "1") == "1"
+    deskew: bool = os.getenv("PREPROCESS_DESKEW", "1") == "1"
+
+
+def options_signature(options: Optional[PreprocessOptions] = None) -> str:
+    """What preprocessing does to a photo, for extraction cache keys ("off" when disabled)."""
+    if not PREPROCESS_ENABLED:
+        return "off"
+    return json.dumps((options or PreprocessOptions()).model_dump(), sort_keys=True)
+
+
+# ==================================================================
+# GEOMETRY
+# ==================================================================
+
+def _analysis_copy(gray: np.ndarray) -> Tuple[np.ndarray, float]:
+    scale = min(1.0, ANALYSIS_EDGE / max(gray.shape))
+    if scale < 1:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return gray, scale
+
+
+def find_sheet(gray: np.ndarray) -> Optional[np.ndarray]:
+    """Corners (tl, tr, br, bl) of the sheet in full-resolution coordinates, or None."""
+    small, scale = _analysis_copy(gray)
+    edges = cv2.Canny(cv2.GaussianBlur(small, (5, 5), 0), 50, 150)
+    edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    frame = small.shape[0] * small.shape[1]
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+        approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+        area = cv2.contourArea(approx)
+        if len(approx) == 4 and cv2.isContourConvex(approx) and MIN_SHEET_AREA * frame < area < 0.98 * frame:
+            pts = approx.reshape(4, 2).astype(np.float32) / scale
+            s, d = pts.sum(axis=1), np.diff(pts, axis=1).ravel()
+            return np.array([pts[s.argmin()], pts[d.argmin()], pts[s.argmax()], pts[d.argmax()]], np.float32)
+    return None
+
+
+def warp_to_sheet(image: np.ndarray, corners: np.ndarray) -> np.ndarray:
+    tl, tr, br, bl = corners
+    width = int(max(np.linalg.norm(tr - tl), np.linalg.norm(br - bl)))
+    height = int(max(np.linalg.norm(bl - tl), np.linalg.norm(br - tr)))
+    target = np.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], np.float32)
+    return cv2.warpPerspective(image, cv2.getPerspectiveTransform(corners, target), (width, height))
+
+
+def skew_angle(gray: np.ndarray) -> float:
+    """Rotation (degrees) that makes text lines horizontal; 0 when unsure."""
+    small, _ = _analysis_copy(gray)
+    ink = cv2.adaptiveThreshold(small, 1, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 31, 15)
+    if ink.mean() < 0.002:
+        return 0.0
+    h, w = ink.shape
+    center = (w / 2, h / 2)
+    best, best_score = 0.0, -1.0
+    for angle in np.arange(-MAX_SKEW, MAX_SKEW + SKEW_STEP / 2, SKEW_STEP):
+        rotated = cv2.warpAffine(ink, cv2.getRotationMatrix2D(center, float(angle), 1.0), (w, h), flags=cv2.INTER_NEAREST)
+        score = float(np.var(rotated.sum(axis=1, dtype=np.float64)))
+        if score > best_score:
+            best, best_score = float(angle), score
+    return best if abs(best) >= MIN_SKEW else 0.0
+
+
+def rotate(image: np.ndarray, angle: float) -> np.ndarray:
+    h, w = image.shape[:2]
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(image, matrix, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+# ==================================================================
+# PIPELINE
+# ==================================================================
+
+def preprocess_image(data: bytes, content_type: str, options: Optional[PreprocessOptions] = None) -> Tuple[bytes, str, dict]:
+    """Returns (image bytes, content type, info). Runs in the process pool."""
+    options = options or PreprocessOptions()
+    if options.fmt not in FORMATS:
+        raise ValueError(f"Unsupported preprocess format '{options.fmt}'. Use one of {sorted(FORMATS)}.")
+
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Unreadable image")
+    info = {"original_bytes": len(data), "original_size": [image.shape[1], image.shape[0]], "warped": False, "skew": 0.0}
+
+    if options.perspective:
+        corners = find_sheet(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+        if corners is not None:
+            image = warp_to_sheet(image, corners)
+            info["warped"] = True
+
+    if options.deskew:
+        angle = skew_angle(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+        if angle:
+            image = rotate(image, angle)
+            info["skew"] = angle
+
+    scale = options.max_edge / max(image.shape[:2])
+    if scale < 1:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    if options.binarize:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        block = max(31, (max(gray.shape) // 40) | 1)
+        image = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, block, 15)
+
+    ext, out_type = FORMATS[options.fmt]
+    params = {"jpeg": [cv2.IMWRITE_JPEG_QUALITY, options.quality], "webp": [cv2.IMWRITE_WEBP_QUALITY, options.quality]}.get(options.fmt, [])
+    ok, encoded = cv2.imencode(ext, image, params)
+    if not ok:
+        raise ValueError(f"Could not encode {options.fmt}")
+
+    info["size"] = [image.shape[1], image.shape[0]]
+    if len(encoded) >= len(data):
+        info["bytes"] = len(data)
+        info["kept_original"] = True
+        return data, content_type, info
+    info["bytes"] = len(encoded)
+    return encoded.tobytes(), out_type, info
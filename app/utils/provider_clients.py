@@ -0,0 +1,158 @@
+"""
+One set of AI provider clients per process, with pooled keep-alive
+connections.
+
+The registry is started and closed by the FastAPI lifespan (and by the
+standalone worker). Each provider gets its own httpx.AsyncClient with
+a bounded keep-alive pool, so fallback calls reuse warm TLS connections
+instead of building a new client, and a new handshake, per request.
+With PROVIDER_WARMUP=1, start() also opens a few connections to every
+configured provider so the first requests skip the handshake too.
+
+SDKs are imported and clients created lazily on first use (the startup
+warm-up does it in the background), so code paths that run without
+the lifespan (scripts, ASGI tests) still work. Tests and benchmarks can
+assign a stand-in, e.g. `provider_clients.gemini = FakeGemini()`.
+"""
+
+import os
+import asyncio
+import logging
+from typing import List, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_MAX_CONNECTIONS = int(os.getenv("PROVIDER_MAX_CONNECTIONS", "32"))
+PROVIDER_KEEPALIVE_CONNECTIONS = int(os.getenv("PROVIDER_KEEPALIVE_CONNECTIONS", "16"))
+PROVIDER_KEEPALIVE_SECONDS = float(os.getenv("PROVIDER_KEEPALIVE_SECONDS", "60"))
+PROVIDER_TIMEOUT_SECONDS = float(os.getenv("PROVIDER_TIMEOUT_SECONDS", "120"))
+PROVIDER_WARMUP = os.getenv("PROVIDER_WARMUP", "0") == "1"
+PROVIDER_WARMUP_CONNECTIONS = int(os.getenv("PROVIDER_WARMUP_CONNECTIONS", "2"))
+
+# Optional endpoint overrides (self-hosted proxies, the offline mock server)
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")
+COHERE_BASE_URL = os.getenv("COHERE_BASE_URL")
+AZURE_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
+
+
+def _pooled_http() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=PROVIDER_TIMEOUT_SECONDS,
+        limits=httpx.Limits(
+            max_connections=PROVIDER_MAX_CONNECTIONS,
+            max_keepalive_connections=PROVIDER_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=PROVIDER_KEEPALIVE_SECONDS,
+        ),
+    )
+
+
+class ProviderClients:
+    def __init__(self):
+        self._gemini = None
+        self._azure = None
+        self._cohere = None
+        self._http: dict = {}
+
+    def _http_for(self, provider: str) -> httpx.AsyncClient:
+        if provider not in self._http:
+            self._http[provider] = _pooled_http()
+        return self._http[provider]
+
+    # ---------- Gemini ----------
+    @property
+    def gemini(self):
+        if self._gemini is None:
+            from google import genai
+            from google.genai import types
+
+            self._gemini = genai.Client(
+                api_key=os.getenv("GEMINI_API_KEY"),
+                http_options=types.HttpOptions(base_url=GEMINI_BASE_URL, httpx_async_client=self._http_for("gemini")),
+            )
+        return self._gemini
+
+    @gemini.setter
+    def gemini(self, client):
+        self._gemini = client
+
+    # ---------- Azure OpenAI ----------
+    @property
+    def azure_configured(self) -> bool:
+        return bool(os.getenv("AZURE_OPENAI_KEY") and os.getenv("AZURE_OPENAI_ENDPOINT") and os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"))
+
+    @property
+    def azure(self):
+        if self._azure is None and self.azure_configured:
+            from openai import AsyncAzureOpenAI
+            self._azure = AsyncAzureOpenAI(
+                api_key=os.getenv("AZURE_OPENAI_KEY"),
+                api_version=AZURE_API_VERSION,
+                azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+                http_client=self._http_for("azure"),
+            )
+        return self._azure
+
+    @azure.setter
+    def azure(self, client):
+        self._azure = client
+
+    # ---------- Cohere ----------
+    @property
+    def cohere(self):
+        if self._cohere is None and os.getenv("COHERE_API_KEY"):
+            import cohere
+
+            self._cohere = cohere.AsyncClient(
+                os.getenv("COHERE_API_KEY"),
+                base_url=COHERE_BASE_URL,
+                httpx_client=self._http_for("cohere"),
+            )
+        return self._cohere
+
+    @cohere.setter
+    def cohere(self, client):
+        self._cohere = client
+
+    # ---------- Lifecycle ----------
+    def _warmup_urls(self) -> List[tuple]:
+        urls = [("gemini", GEMINI_BASE_URL or "https://generativelanguage.googleapis.com/")]
+        if self.azure_configured:
+            urls.append(("azure", os.getenv("AZURE_OPENAI_ENDPOINT")))
+        if os.getenv("COHERE_API_KEY"):
+            urls.append(("cohere", COHERE_BASE_URL or "https://api.cohere.com/"))
+        return urls
+
+    async def _warm(self, provider: str, url: str):
+        http = self._http_for(provider)
+
+        async def one():
+            try:
+                await http.head(url, timeout=5.0)
+            except Exception as e:
+                logger.debug(f"Warm-up of {provider} ({url}) failed: {e}")
+
+        await asyncio.gather(*(one() for _ in range(PROVIDER_WARMUP_CONNECTIONS)))
+
+    async def start(self, warmup: bool = PROVIDER_WARMUP):
+        # Build every configured client up front so request handlers never pay for it
+        _ = self.gemini, self.azure, self.cohere
+        if warmup:
+            await asyncio.gather(*(self._warm(p, url) for p, url in self._warmup_urls()))
+            logger.info(f"Provider connections warmed: {', '.join(p for p, _ in self._warmup_urls())}")
+
+    async def aclose(self):
+        for provider, http in self._http.items():
+            try:
+                await http.aclose()
+            except Exception as e:
+                logger.warning(f"Closing {provider} HTTP pool failed: {e}")
+        self._http.clear()
+        self._gemini = self._azure = self._cohere = None
+
+
+provider_clients = ProviderClients()
@@ -0,0 +1,213 @@
+"""
+Health-aware ordering of the AI extraction fallback chain.
+
+Every tier (a Gemini model, the Azure deployment, the Cohere model) keeps
+an EWMA of its latency and success rate. Repeated 404/429/5xx or
+transport errors open a circuit breaker: the tier is skipped until its
+cooldown expires, then a single half-open probe decides whether it
+closes again or stays open with a doubled cooldown. A 404 (retired
+model) opens the breaker at once with the longest cooldown.
+
+Provider groups keep their configured order (Gemini, then Azure, then
+Cohere). Inside a group, tiers that failed within the last cooldown
+period go last, most reliable first. The others keep their configured
+slots, except that tiers with a measured latency are re-sorted among
+their own slots, fastest first. A failure therefore only demotes a tier
+for a while, and a tier without measurements is still tried in its
+configured place.
+
+The router also keeps the recent latency window used to pick hedge
+delays (p95 of the primary tier) and the hedging counters.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+EWMA_ALPHA = float(os.getenv("PROVIDER_EWMA_ALPHA", "0.3"))
+BREAKER_FAILURES = int(os.getenv("PROVIDER_BREAKER_FAILURES", "3"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("PROVIDER_BREAKER_COOLDOWN_SECONDS", "30"))
+BREAKER_MAX_COOLDOWN_SECONDS = float(os.getenv("PROVIDER_BREAKER_MAX_COOLDOWN_SECONDS", "600"))
+LATENCY_WINDOW = int(os.getenv("PROVIDER_LATENCY_WINDOW", "200"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+def error_status(exc: BaseException) -> Optional[int]:
+    """HTTP status carried by a provider SDK error (genai .code, openai/cohere .status_code)."""
+    for attr in ("code", "status_code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def is_transport_error(exc: BaseException) -> bool:
+    while exc is not None:
+        if isinstance(exc, (asyncio.TimeoutError, httpx.TransportError, ConnectionError)):
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+def trips_breaker(exc: BaseException) -> bool:
+    status = error_status(exc)
+    if status is not None:
+        return status in (404, 429) or status >= 500
+    return is_transport_error(exc)
+
+
+class TierHealth:
+    def __init__(self, name: str, group: str):
+        self.name = name
+        self.group = group
+        self.latency: Optional[float] = None
+        self.samples = deque(maxlen=LATENCY_WINDOW)
+        self.success_rate = 1.0
+        self.calls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.cooldown = BREAKER_COOLDOWN_SECONDS
+        self.open_until = 0.0
+        self.probing = False
+        self.last_failure_at = 0.0
+        self.last_error: Optional[str] = None
+
+    def _observe(self, ok: bool, latency: float):
+        self.calls += 1
+        self.success_rate = EWMA_ALPHA * (1.0 if ok else 0.0) + (1 - EWMA_ALPHA) * self.success_rate
+        # Only successful calls say how long an answer takes; fast failures would look attractive
+        if ok:
+            self.latency = latency if self.latency is None else EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.latency
+            self.samples.append(latency)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def recently_failed(self, now: float) -> bool:
+        return bool(self.consecutive_failures) and now - self.last_failure_at < BREAKER_COOLDOWN_SECONDS
+
+    def snapshot(self, now: float) -> dict:
+        return {
+            "group": self.group,
+            "state": self.state,
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "p95_ms": round(self.percentile(0.95) * 1000, 1) if self.samples else None,
+            "success_rate": round(self.success_rate, 3),
+            "calls": self.calls,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in_s": round(max(0.0, self.open_until - now), 1) if self.state == OPEN else 0.0,
+            "last_error": self.last_error,
+        }
+
+
+class ProviderRouter:
+    def __init__(self):
+        self.tiers: Dict[str, TierHealth] = {}
+        self.hedging = {"requests": 0, "hedges_fired": 0, "hedges_won": 0}
+
+    def _tier(self, name: str, group: str) -> TierHealth:
+        if name not in self.tiers:
+            self.tiers[name] = TierHealth(name, group)
+        return self.tiers[name]
+
+    def _available(self, tier: TierHealth, now: float) -> bool:
+        if tier.state == CLOSED:
+            return True
+        if tier.state == OPEN and now >= tier.open_until:
+            tier.state = HALF_OPEN
+        # Half-open: exactly one request probes the tier at a time
+        return tier.state == HALF_OPEN and not tier.probing
+
+    def order(self, candidates: List[tuple]) -> List[str]:
+        """
+        candidates: (tier name, group) in configured fallback order.
+        Returns the tiers to try, healthiest first within each group,
+        with open circuits left out.
+        """
+        now = time.monotonic()
+        groups: Dict[str, List[TierHealth]] = {}
+        for name, group in candidates:
+            groups.setdefault(group, []).append(self._tier(name, group))
+
+        ordered = []
+        for tiers in groups.values():
+            fresh = [t for t in tiers if not t.recently_failed(now)]
+            fastest = iter(sorted((t for t in fresh if t.latency is not None), key=lambda t: t.latency))
+            ranked = [next(fastest) if t.latency is not None else t for t in fresh]
+            ranked += sorted((t for t in tiers if t.recently_failed(now)), key=lambda t: -t.success_rate)
+            for tier in ranked:
+                if self._available(tier, now):
+                    if tier.state == HALF_OPEN:
+                        tier.probing = True
+                    ordered.append(tier.name)
+        return ordered
+
+    def p95(self, name: str) -> Optional[float]:
+        tier = self.tiers.get(name)
+        return tier.percentile(0.95) if tier else None
+
+    def release(self, name: str):
+        """A tier returned by order() was not called after all (an earlier tier answered)."""
+        tier = self.tiers.get(name)
+        if tier and tier.state == HALF_OPEN:
+            tier.probing = False
+
+    def record_success(self, name: str, latency: float):
+        tier = self.tiers[name]
+        tier._observe(True, latency)
+        tier.consecutive_failures = 0
+        if tier.state != CLOSED:
+            logger.info(f"Provider tier {name} recovered; circuit closed.")
+        tier.state, tier.probing, tier.cooldown = CLOSED, False, BREAKER_COOLDOWN_SECONDS
+
+    def record_failure(self, name: str, exc: BaseException, latency: float):
+        tier = self.tiers[name]
+        tier._observe(False, latency)
+        tier.failures += 1
+        tier.consecutive_failures += 1
+        tier.last_failure_at = time.monotonic()
+        tier.last_error = f"{type(exc).__name__}: {exc}"[:300]
+        if not trips_breaker(exc):
+            tier.probing = False
+            return
+
+        now = tier.last_failure_at
+        if tier.state == HALF_OPEN:
+            tier.cooldown = min(tier.cooldown * 2, BREAKER_MAX_COOLDOWN_SECONDS)
+        elif error_status(exc) == 404:
+            tier.cooldown = BREAKER_MAX_COOLDOWN_SECONDS
+        elif tier.consecutive_failures < BREAKER_FAILURES:
+            return
+
+        tier.state, tier.probing, tier.open_until = OPEN, False, now + tier.cooldown
+        logger.warning(f"Provider tier {name} circuit open for {tier.cooldown:g}s ({tier.last_error})")
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        fired = self.hedging["hedges_fired"]
+        return {
+            "tiers": {name: tier.snapshot(now) for name, tier in self.tiers.items()},
+            "hedging": {
+                **self.hedging,
+                "fire_rate": round(fired / self.hedging["requests"], 4) if self.hedging["requests"] else 0.0,
+                "win_rate": round(self.hedging["hedges_won"] / fired, 4) if fired else 0.0,
+            },
+        }
+
+
+provider_router = ProviderRouter()
@@ -0,0 +1,180 @@
+"""
+PDF page rasterization on the shared process pool, with a render cache.
+
+Pages are split into one contiguous run per pool worker, so a multi-page
+PDF renders on every core instead of page by page on the event loop.
+When several workers render the same document it is written to one
+temporary file they all open, instead of pickling the whole PDF to each.
+Rendered pages are kept in an in-process LRU (bounded by total bytes)
+keyed on sha256(document) + page + DPI + colorspace + format, so a
+fallback retry or a repeated upload never renders the same page twice.
+"""
+
+import os
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from app.utils.pool import get_process_pool, POOL_WORKERS, run_in_process
+
+logger = logging.getLogger(__name__)
+
+RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+FORMATS = ("png", "jpeg")
+
+RenderKey = Tuple[str, int, int, bool, str]
+
+
+# --------------------------------------------------
+# Worker side (runs in the process pool)
+# --------------------------------------------------
+def page_count(pdf_bytes) -> int:
+    import fitz  # PyMuPDF
+
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        return doc.page_count
+    finally:
+        doc.close()
+
+
+def render_pages(source, pages: List[int], dpi: int, grayscale: bool, fmt: str) -> List[bytes]:
+    """source is the PDF bytes or the path of a temporary copy (see _write_temp)."""
+    import fitz  # PyMuPDF
+
+    doc = fitz.open(source, filetype="pdf") if isinstance(source, str) else fitz.open(stream=source, filetype="pdf")
+    try:
+        out = []
+        for i in pages:
+            pix = doc[i].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY if grayscale else fitz.csRGB, alpha=False)
+            out.append(pix.tobytes("jpeg", jpg_quality=90) if fmt == "jpeg" else pix.tobytes("png"))
+        return out
+    finally:
+        doc.close()
+
+
+def _runs(pages: List[int], parts: int) -> List[List[int]]:
+    """Split pages into at most `parts` contiguous runs of similar length."""
+    parts = max(1, min(parts, len(pages)))
+    size, extra = divmod(len(pages), parts)
+    runs, start = [], 0
+    for i in range(parts):
+        end = start + size + (i < extra)
+        runs.append(pages[start:end])
+        start = end
+    return runs
+
+
+# --------------------------------------------------
+# Cache
+# --------------------------------------------------
+class RenderCache:
+    def __init__(self, max_bytes: int = RENDER_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._pages: "OrderedDict[RenderKey, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key: RenderKey) -> Optional[bytes]:
+        with self._lock:
+            data = self._pages.get(key)
+            if data is None:
+                self.stats["misses"] += 1
+                return None
+            self._pages.move_to_end(key)
+            self.stats["hits"] += 1
+            return data
+
+    def put(self, key: RenderKey, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._pages.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old)
+            self._pages[key] = data
+            self.bytes += len(data)
+            while self.bytes > self.max_bytes:
+                _, evicted = self._pages.popitem(last=False)
+                self.bytes -= len(evicted)
+                self.stats["evictions"] += 1
+
+    def snapshot(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        with self._lock:
+            return {
+                **self.stats,
+                "pages": len(self._pages),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            }
+
+
+render_cache = RenderCache()
+
+
+# --------------------------------------------------
+# Public API
+# --------------------------------------------------
+def _plan(pdf_bytes: bytes, dpi: int, grayscale: bool, fmt: str) -> Tuple[List[RenderKey], Dict[int, bytes]]:
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported render format '{fmt}'. Use one of {FORMATS}.")
+    digest = hashlib.sha256(pdf_bytes).hexdigest()
+    keys = [(digest, i, dpi, grayscale, fmt) for i in range(page_count(pdf_bytes))]
+    cached = {}
+    for key in keys:
+        data = render_cache.get(key)
+        if data is not None:
+            cached[key[1]] = data
+    return keys, cached
+
+
+def _collect(keys: List[RenderKey], cached: Dict[int, bytes], runs: List[List[int]], rendered: List[List[bytes]]) -> List[bytes]:
+    for run, images in zip(runs, rendered):
+        for i, data in zip(run, images):
+            render_cache.put(keys[i], data)
+            cached[i] = data
+    return [cached[i] for i in range(len(keys))]
+
+
+def _write_temp(pdf_bytes) -> str:
+    """One copy of the PDF on disk for several workers to open, instead of one pickled copy each."""
+    with tempfile.NamedTemporaryFile(prefix="render-", suffix=".pdf", delete=False) as f:
+        f.write(pdf_bytes)
+        return f.name
+
+
+async def render_pdf(pdf_bytes: bytes, dpi: int = 150, grayscale: bool = False, fmt: str = "png") -> List[bytes]:
+    """Every page of the PDF as encoded images, rendered off the event loop."""
+    keys, cached = await asyncio.to_thread(_plan, pdf_bytes, dpi, grayscale, fmt)
+    missing = [i for i in range(len(keys)) if i not in cached]
+    runs = _runs(missing, POOL_WORKERS) if missing else []
+    source = await asyncio.to_thread(_write_temp, pdf_bytes) if len(runs) > 1 else pdf_bytes
+    try:
+        rendered = await asyncio.gather(*(run_in_process(render_pages, source, run, dpi, grayscale, fmt) for run in runs))
+    finally:
+        if source is not pdf_bytes:
+            os.unlink(source)
+    return _collect(keys, cached, runs, rendered)
+
+
+def render_pdf_sync(pdf_bytes: bytes, dpi: int = 150, grayscale: bool = False, fmt: str = "png") -> List[bytes]:
+    """Blocking variant of render_pdf for synchronous callers (still parallel across the pool)."""
+    keys, cached = _plan(pdf_bytes, dpi, grayscale, fmt)
+    missing = [i for i in range(len(keys)) if i not in cached]
+    runs = _runs(missing, POOL_WORKERS) if missing else []
+    pool = get_process_pool()
+    source = _write_temp(pdf_bytes) if len(runs) > 1 else pdf_bytes
+    try:
+        futures = [pool.submit(render_pages, source, run, dpi, grayscale, fmt) for run in runs]
+        rendered = [f.result() for f in futures]
+    finally:
+        if source is not pdf_bytes:
+            os.unlink(source)
+    return _collect(keys, cached, runs, rendered)
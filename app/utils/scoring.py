@@ -0,0 +1,189 @@
+"""
+Vectorized MCQ scoring and item analysis.
+
+Answers are encoded once into a students x questions matrix of option
+codes (0 = unanswered); scoring a whole class is then a handful of
+NumPy array operations instead of a Python loop per student and
+question. Marks are configurable per correct / wrong / unanswered
+answer (negative marking) and per question.
+
+Item analysis, per question:
+
+- difficulty: share of students who answered correctly (p);
+- discrimination: p in the top 27% of the class minus p in the bottom
+  27%, ranked by number correct (negative = the key or the question
+  needs review);
+- distractors: how many students chose each wrong option, and how many
+  left it blank;
+
+and for the test, KR-20 reliability over the dichotomous item scores.
+"""
+
+import os
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+from pydantic import BaseModel
+
+BLANK = 0
+DISCRIMINATION_GROUP = 0.27   # share of the class in each of the upper / lower groups
+REVIEW_DISCRIMINATION = 0.0   # items at or below this are flagged for review
+
+
+class Marking(BaseModel):
+    correct: float = float(os.getenv("MCQ_MARKS_CORRECT", "1"))
+    wrong: float = float(os.getenv("MCQ_MARKS_WRONG", "0"))            # e.g. -0.25 for negative marking
+    unanswered: float = float(os.getenv("MCQ_MARKS_UNANSWERED", "0"))
+    question_marks: Dict[str, float] = {}                                # marks for a correct answer, per question
+
+
+class AnswerMatrix(NamedTuple):
+    questions: List[str]
+    students: List[str]
+    options: List[str]      # option code -> answer text; options[0] is "" (unanswered)
+    key: np.ndarray         # (questions,) option codes of the correct answers
+    answers: np.ndarray     # (students, questions) option codes given
+
+
+def _clean(value) -> str:
+    return "" if value is None else str(value).strip().upper()
+
+
+def _number(value) -> float:
+    value = float(value)
+    return int(value) if value.is_integer() else round(value, 4)
+
+
+# ==================================================================
+# ENCODING
+# ==================================================================
+
+def encode_answers(answer_key: Dict[str, str], students: Dict[str, dict]) -> AnswerMatrix:
+    """Option-code matrix for {student_id: {question: answer}}; answers to unknown questions are ignored."""
+    questions = [str(q) for q in answer_key]
+    column = {q: j for j, q in enumerate(questions)}
+    codes = {"": BLANK}
+    seen = {}  # raw answer -> code, so each distinct spelling is cleaned once
+
+    def code(value) -> int:
+        if not isinstance(value, str):
+            value = _clean(value)  # None, numbers, or a list / dict from a malformed extraction
+        c = seen.get(value)
+        if c is None:
+            c = seen[value] = codes.setdefault(_clean(value), len(codes))
+        return c
+
+    key = np.array([code(answer_key[q]) for q in answer_key], dtype=np.int32)
+    empty = [BLANK] * len(questions)
+    rows = []
+    for given in students.values():
+        row = empty.copy()
+        for q, value in given.items():
+            j = column.get(q)
+            if j is None:
+                j = column.get(str(q))
+            if j is not None:
+                row[j] = code(value)
+        rows.append(row)
+    answers = np.array(rows, dtype=np.int32).reshape(len(rows), len(questions))
+    return AnswerMatrix(questions, [str(s) for s in students], list(codes), key, answers)
+
+
+# ==================================================================
+# SCORING
+# ==================================================================
+
+def score_matrix(matrix: AnswerMatrix, marking: Optional[Marking] = None) -> dict:
+    """Boolean outcome matrices and per-student counts / marks, all as arrays."""
+    marking = marking or Marking()
+    blank = matrix.answers == BLANK
+    correct = (matrix.answers == matrix.key) & ~blank
+    wrong = ~correct & ~blank
+    full_marks = np.array([marking.question_marks.get(q, marking.correct) for q in matrix.questions], dtype=np.float64)
+    marks = correct @ full_marks + wrong.sum(axis=1) * marking.wrong + blank.sum(axis=1) * marking.unanswered
+    return {
+        "correct": correct,
+        "wrong": wrong,
+        "blank": blank,
+        "correct_count": correct.sum(axis=1),
+        "wrong_count": wrong.sum(axis=1),
+        "blank_count": blank.sum(axis=1),
+        "marks": marks,
+        "max_marks": float(full_marks.sum()),
+    }
+
+
+def kr20(correct: np.ndarray) -> Optional[float]:
+    """Kuder-Richardson 20 for a students x items 0/1 matrix; None when undefined."""
+    students, items = correct.shape
+    if students < 2 or items < 2:
+        return None
+    p = correct.mean(axis=0)
+    variance = correct.sum(axis=1).var()
+    if variance == 0:
+        return None
+    return float(items / (items - 1) * (1 - (p * (1 - p)).sum() / variance))
+
+
+def item_analysis(matrix: AnswerMatrix, correct: np.ndarray) -> dict:
+    students, items = correct.shape
+    difficulty = correct.mean(axis=0) if students else np.zeros(items)
+
+    discrimination = np.full(items, np.nan)
+    if students >= 2:
+        order = np.argsort(correct.sum(axis=1), kind="stable")
+        group = max(1, int(round(students * DISCRIMINATION_GROUP)))
+        discrimination = correct[order[-group:]].mean(axis=0) - correct[order[:group]].mean(axis=0)
+
+    # Option counts per question in one bincount: question j, option c -> j * len(options) + c
+    width = len(matrix.options)
+    counts = np.bincount(
+        (matrix.answers + np.arange(items) * width).ravel(), minlength=items * width
+    ).reshape(items, width)
+
+    questions = []
+    for j, q in enumerate(matrix.questions):
+        key_code = matrix.key[j]
+        d = None if np.isnan(discrimination[j]) else round(float(discrimination[j]), 4)
+        questions.append({
+            "question": q,
+            "correct_answer": matrix.options[key_code],
+            "difficulty": round(float(difficulty[j]), 4),
+            "discrimination": d,
+            "correct": int(counts[j, key_code]),
+            "unanswered": int(counts[j, BLANK]),
+            "distractors": {matrix.options[c]: int(n) for c, n in enumerate(counts[j]) if n and c not in (BLANK, key_code)},
+            "review": d is not None and d <= REVIEW_DISCRIMINATION,
+        })
+    reliability = kr20(correct)
+    if reliability is not None:
+        # Rounding a tiny negative KR-20 gives -0.0, which JSON would report as "-0.0"
+        reliability = round(reliability, 4) or 0.0
+    return {"kr20": reliability, "questions": questions}
+
+
+def score_class(answer_key: Dict[str, str], students: Dict[str, dict], marking: Optional[Marking] = None) -> dict:
+    """Scores every student and runs item analysis on the class."""
+    matrix = encode_answers(answer_key, students)
+    scored = score_matrix(matrix, marking)
+    marks = scored["marks"]
+    results = [
+        {
+            "student_id": student,
+            "correct": int(scored["correct_count"][i]),
+            "wrong": int(scored["wrong_count"][i]),
+            "unanswered": int(scored["blank_count"][i]),
+            "score": _number(marks[i]),
+        }
+        for i, student in enumerate(matrix.students)
+    ]
+    summary = {"students": len(results), "total_questions": len(matrix.questions), "max_score": _number(scored["max_marks"])}
+    if results:
+        summary.update(
+            mean=round(float(marks.mean()), 4),
+            median=_number(np.median(marks)),
+            std=round(float(marks.std()), 4),
+            min=_number(marks.min()),
+            max=_number(marks.max()),
+        )
+    return {"summary": summary, "students": results, "item_analysis": item_analysis(matrix, scored["correct"])}
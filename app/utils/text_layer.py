@@ -0,0 +1,58 @@
+"""
+Deterministic answer extraction from the PDF text layer.
+
+Typed or digitally filled answer sheets carry the answers in the PDF's
+text layer, so they can be read with a regular expression instead of a
+1-5 s model call. Only lines that consist entirely of question/answer
+pairs are read, in the same shapes normalize_answer_key accepts:
+
+    1. B            Q2) (c)          3 - iv
+    Answer: 4 A     1 A, 2 B, 3 C    Q.5: D
+
+so a question line such as "1. A cell is ..." never counts as an answer.
+A question given two different answers is treated as unreadable. The
+caller accepts the result only when it covers every question it needs;
+anything less goes to the model tiers unchanged.
+"""
+
+import os
+import re
+from typing import Dict, Iterable
+
+TEXT_LAYER_ENABLED = os.getenv("TEXT_LAYER_ENABLED", "1") == "1"
+
+ROMAN = {"I": "A", "II": "B", "III": "C", "IV": "D"}
+
+_PAIR = r"(?:Q(?:UESTION)?\s*\.?\s*)?(\d{1,3})\s*[\)\].:\-]?\s*[\(\[]?(IV|III|II|I|[A-D])[\)\]]?"
+PAIR = re.compile(_PAIR)
+LINE = re.compile(rf"\s*(?:ANS(?:WERS?)?\s*[:\-.]?\s*)?{_PAIR}(?:[\s,;|]+{_PAIR})*[\s,;|.]*")
+
+
+def parse_answers(text: str) -> Dict[str, str]:
+    """{question: "A".."D"} from answer-only lines; conflicting questions are dropped."""
+    answers, conflicts = {}, set()
+    for line in text.upper().splitlines():
+        if not LINE.fullmatch(line):
+            continue
+        for q, a in PAIR.findall(line):
+            q, a = str(int(q)), ROMAN.get(a, a)
+            if answers.setdefault(q, a) != a:
+                conflicts.add(q)
+    for q in conflicts:
+        del answers[q]
+    return answers
+
+
+def read_answers(pdf_bytes) -> Dict[str, str]:
+    """Parses the text layer of one PDF (blocking; run in a worker thread)."""
+    import fitz  # PyMuPDF
+
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        return parse_answers("\n".join(page.get_text() for page in doc))
+    finally:
+        doc.close()
+
+
+def covers(answers: Dict[str, str], questions: Iterable[str]) -> bool:
+    return all(str(q) in answers for q in questions)
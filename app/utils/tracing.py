@@ -0,0 +1,119 @@
+"""
+Per-request span tracing.
+
+The HTTP middleware (and the job worker, per job) opens a Trace and
+stores it in a context variable, so every coroutine and task spawned
+while handling the request records into it without passing it around.
+Stages timed with `metrics.time_stage` become spans automatically;
+provider attempts are recorded with their tier, outcome and hedge flag.
+
+When the request finishes, the spans are returned as a `Server-Timing`
+header (visible in browser dev tools) and written as one JSON log line
+on the `app.trace` logger, both tagged with the request ID (taken from
+an incoming `X-Request-ID` header, or generated):
+
+    {"request_id": "3f2a...", "method": "POST", "route": "/mcq/evaluate",
+     "status": 200, "ms": 2412.7, "spans": [{"name": "extraction", "at_ms": 41.0, "ms": 2310.4}, ...]}
+
+Outside a trace, recording is a no-op.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") == "1"
+TRACE_LOG_MIN_MS = float(os.getenv("TRACE_LOG_MIN_MS", "0"))  # only log requests at least this slow
+MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "64"))            # per request; chunked runs can record many
+
+trace_logger = logging.getLogger("app.trace")
+
+_TOKEN = re.compile(r"[^A-Za-z0-9_.!#$%&'*+^`|~-]")
+
+
+class Trace:
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.spans: List[dict] = []
+        self.dropped = 0
+
+    def add(self, name: str, duration: float, **attrs):
+        if len(self.spans) >= MAX_SPANS:
+            self.dropped += 1
+            return
+        at = time.perf_counter() - duration - self.started
+        self.spans.append({"name": name, "at_ms": round(at * 1000, 1), "ms": round(duration * 1000, 1), **attrs})
+
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self.started) * 1000, 1)
+
+    def server_timing(self) -> str:
+        """Spans in start order, then the total, as a Server-Timing header value."""
+        entries = []
+        for span in sorted(self.spans, key=lambda s: s["at_ms"]):
+            attrs = " ".join(f"{k}={v}" for k, v in span.items() if k not in ("name", "at_ms", "ms"))
+            entry = f"{_TOKEN.sub('_', span['name'])};dur={span['ms']}"
+            if attrs:
+                entry += ';desc="' + attrs.replace("\\", "/").replace('"', "'") + '"'
+            entries.append(entry)
+        entries.append(f"total;dur={self.elapsed_ms()}")
+        return ", ".join(entries)
+
+    def log(self, **fields):
+        ms = self.elapsed_ms()
+        if ms < TRACE_LOG_MIN_MS:
+            return
+        record = {"request_id": self.request_id, **fields, "ms": ms, "spans": self.spans}
+        if self.dropped:
+            record["dropped_spans"] = self.dropped
+        trace_logger.info(json.dumps(record, default=str))
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+def current() -> Optional[Trace]:
+    return _current.get()
+
+
+def new_request_id(incoming: Optional[str] = None) -> str:
+    """Keeps a sane caller-supplied ID so logs can be joined across services."""
+    if incoming and len(incoming) <= 128 and not _TOKEN.search(incoming):
+        return incoming
+    return uuid.uuid4().hex
+
+
+@contextmanager
+def traced(request_id: str):
+    """Makes a new Trace current for the enclosed code (and tasks it creates)."""
+    if not TRACING_ENABLED:
+        yield None
+        return
+    trace = Trace(request_id)
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+def record(name: str, duration: float, **attrs):
+    trace = _current.get()
+    if trace is not None:
+        trace.add(name, duration, **attrs)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started, **attrs)
@@ -0,0 +1,223 @@
+"""
+Local page triage, run before any LLM call.
+
+Each page is rendered small and screened with NumPy/OpenCV only:
+
+- blank pages (ink density below TRIAGE_BLANK_INK) are dropped;
+- upside-down scans are detected from the text-line profile (Latin text
+  has more ink above its x-height band than below it) and rotated;
+- printed page numbers are read from the PDF text layer in the header /
+  footer band, and pages are put back in that order when every kept
+  page has a distinct one;
+- pages with a large connected drawing are flagged `has_diagram`.
+
+Only when something changes is a new PDF built, so untouched uploads
+keep their bytes (and their extraction cache entries). Functions here
+are pure and picklable so they can run in the shared process pool.
+"""
+
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from pydantic import BaseModel
+
+# Opt-in: rendering and scanning every page costs more local CPU than it saves until measured otherwise
+TRIAGE_ENABLED = os.getenv("TRIAGE_ENABLED", "0") == "1"
+TRIAGE_DPI = int(os.getenv("TRIAGE_DPI", "60"))
+TRIAGE_BLANK_INK = float(os.getenv("TRIAGE_BLANK_INK", "0.002"))
+TRIAGE_FLIP_RATIO = float(os.getenv("TRIAGE_FLIP_RATIO", "1.25"))
+
+INK_CONTRAST = 60         # grey levels below the paper colour that count as ink
+MARGIN = 0.04             # page border ignored (scanner edges, punch holes)
+MIN_TEXT_LINES = 3        # orientation is left alone on pages with fewer lines
+DIAGRAM_SPAN = 0.12       # a drawing spans at least this share of the page width and height
+NUMBER_BAND = 0.1         # header/footer share of the page searched for a page number
+UNKNOWN_PAGE = 9999
+
+PAGE_NUMBER = re.compile(r"^\s*(?:page|pg\.?|p\.)?\s*[-–(]?\s*(\d{1,3})\s*[-–)]?\s*(?:(?:/|of)\s*\d{1,3})?\s*$", re.I)
+
+
+class PageScanResult(BaseModel):
+    page_index: int
+    page_number: int = UNKNOWN_PAGE
+    has_diagram: bool = False
+    source: int = 0           # index of the uploaded file
+    source_page: int = 0      # page inside that file
+    blank: bool = False
+    upside_down: bool = False
+    ink: float = 0.0
+
+
+class PageScanBatchResult(BaseModel):
+    results: List[PageScanResult]
+
+
+# ==================================================================
+# PAGE SCREENING
+# ==================================================================
+
+def ink_mask(gray: np.ndarray) -> np.ndarray:
+    """1 where the pixel is clearly darker than the paper, with the border trimmed."""
+    h, w = gray.shape
+    my, mx = int(h * MARGIN), int(w * MARGIN)
+    inner = gray[my:h - my, mx:w - mx]
+    paper = np.median(inner)
+    return (inner < paper - INK_CONTRAST).astype(np.uint8)
+
+
+def is_upside_down(ink: np.ndarray) -> Optional[bool]:
+    """
+    Compares ink above and below the x-height band of every text line.
+    None when the page has too few lines to tell.
+    """
+    rows = ink.sum(axis=1).astype(np.float64)
+    on = rows > max(2.0, 0.02 * ink.shape[1])
+    edges = np.flatnonzero(np.diff(np.r_[0, on.astype(np.int8), 0]))
+    above = below = 0.0
+    lines = 0
+    for start, end in zip(edges[::2], edges[1::2]):
+        profile = rows[start:end]
+        if len(profile) < 4:
+            continue
+        core = np.flatnonzero(profile >= 0.5 * profile.max())
+        top, bottom = core[0], core[-1]
+        above += profile[:top].sum()
+        below += profile[bottom + 1:].sum()
+        lines += 1
+    if lines < MIN_TEXT_LINES or above + below == 0:
+        return None
+    if below > above * TRIAGE_FLIP_RATIO:
+        return True
+    if above > below * TRIAGE_FLIP_RATIO:
+        return False
+    return None
+
+
+def has_drawing(ink: np.ndarray) -> bool:
+    """A connected stroke group spanning a large part of the page (figure, graph, table)."""
+    closed = cv2.morphologyEx(ink, cv2.MORPH_CLOSE, np.ones((3, 3), np.uint8))
+    _, _, stats, _ = cv2.connectedComponentsWithStats(closed, connectivity=8)
+    h, w = ink.shape
+    spans = (stats[1:, cv2.CC_STAT_WIDTH] >= DIAGRAM_SPAN * w) & (stats[1:, cv2.CC_STAT_HEIGHT] >= DIAGRAM_SPAN * h)
+    return bool(spans.any())
+
+
+def printed_page_number(page) -> Optional[int]:
+    """Page number from the text layer of a PyMuPDF page (header/footer band only)."""
+    height = page.rect.height
+    for x0, y0, x1, y1, text, *_ in page.get_text("blocks"):
+        if y1 > height * NUMBER_BAND and y0 < height * (1 - NUMBER_BAND):
+            continue
+        match = PAGE_NUMBER.match(text.strip())
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def scan_gray(gray: np.ndarray) -> dict:
+    ink = ink_mask(gray)
+    density = float(ink.mean()) if ink.size else 0.0
+    if density < TRIAGE_BLANK_INK:
+        return {"blank": True, "ink": round(density, 5)}
+    return {
+        "blank": False,
+        "ink": round(density, 5),
+        "upside_down": bool(is_upside_down(ink)),
+        "has_diagram": has_drawing(ink),
+    }
+
+
+def scan_document(data: bytes, content_type: str, source: int = 0) -> List[dict]:
+    """Triage every page of one upload (runs in the process pool)."""
+    if content_type == "application/pdf":
+        import fitz  # PyMuPDF
+
+        results = []
+        doc = fitz.open(stream=data, filetype="pdf")
+        try:
+            for i, page in enumerate(doc):
+                pix = page.get_pixmap(dpi=TRIAGE_DPI, colorspace=fitz.csGRAY)
+                gray = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+                number = printed_page_number(page)
+                results.append({**scan_gray(gray), "source": source, "source_page": i,
+                                "page_number": number if number is not None else UNKNOWN_PAGE})
+        finally:
+            doc.close()
+        return results
+
+    gray = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise ValueError("Unreadable image")
+    # Roughly TRIAGE_DPI for an A4 photo
+    scale = (8.27 * TRIAGE_DPI) / min(gray.shape)
+    if scale < 1:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return [{**scan_gray(gray), "source": source, "source_page": 0}]
+
+
+# ==================================================================
+# PLAN + REBUILD
+# ==================================================================
+
+def plan_pages(scans: List[List[dict]]) -> Tuple[List[PageScanResult], dict]:
+    """
+    Flattens per-file scans into PageScanResults in the order they should
+    be sent, blank pages left out, plus a report for the API response.
+    """
+    pages = [PageScanResult(page_index=i, **scan) for i, scan in enumerate(s for doc in scans for s in doc)]
+    kept = [p for p in pages if not p.blank]
+    numbers = [p.page_number for p in kept]
+    reordered = False
+    if kept and UNKNOWN_PAGE not in numbers and len(set(numbers)) == len(numbers) and numbers != sorted(numbers):
+        kept.sort(key=lambda p: p.page_number)
+        reordered = True
+
+    report = {
+        "pages": len(pages),
+        "kept": len(kept),
+        "blank_pages": [p.page_index for p in pages if p.blank],
+        "rotated_pages": [p.page_index for p in kept if p.upside_down],
+        "reordered": reordered,
+        "diagram_pages": [p.page_index for p in kept if p.has_diagram],
+    }
+    report["changed"] = bool(report["blank_pages"] or report["rotated_pages"] or reordered)
+    return kept, report
+
+
+def rebuild_pdf(files: List[Tuple[bytes, str]], pages: List[PageScanResult]) -> bytes:
+    """One PDF with the kept pages, in order, upside-down ones turned the right way up."""
+    import fitz  # PyMuPDF
+
+    out = fitz.open()
+    sources: Dict[int, "fitz.Document"] = {}
+    try:
+        for p in pages:
+            data, content_type = files[p.source]
+            rotate = 180 if p.upside_down else 0
+            if content_type == "application/pdf":
+                if p.source not in sources:
+                    sources[p.source] = fitz.open(stream=data, filetype="pdf")
+                out.insert_pdf(sources[p.source], from_page=p.source_page, to_page=p.source_page)
+                page = out[-1]
+                page.set_rotation((page.rotation + rotate) % 360)
+            else:
+                pix = fitz.Pixmap(data)
+                page = out.new_page(width=pix.width, height=pix.height)
+                page.insert_image(page.rect, stream=data, rotate=rotate)
+        # no_new_id keeps the bytes (and so the extraction cache key) stable across runs
+        return out.tobytes(garbage=3, deflate=True, no_new_id=True)
+    finally:
+        for doc in sources.values():
+            doc.close()
+        out.close()
+
+
+def triage_pdf(pdf_bytes: bytes) -> Tuple[bytes, dict, List[PageScanResult]]:
+    """Synchronous triage of one PDF (OCR pipeline): (bytes to send, report, kept pages)."""
+    kept, report = plan_pages([scan_document(pdf_bytes, "application/pdf")])
+    if report["changed"] and kept:
+        pdf_bytes = rebuild_pdf([(pdf_bytes, "application/pdf")], kept)
+    return pdf_bytes, report, kept
@@ -0,0 +1,112 @@
+"""
+Single-read upload buffers.
+
+Starlette spools multipart uploads into a SpooledTemporaryFile (memory up
+to 1 MB, then a temp file). UploadBuffer exposes that spool as one
+memoryview without copying it: the in-memory BytesIO buffer directly, or
+a read-only mmap of the temp file. Validation, hashing, PDF parsing and
+base64 payloads all work on that view; a `bytes` copy is made at most
+once, and only for consumers that insist on bytes (inline Gemini parts,
+the process pool). Large files are streamed to the Gemini Files API in
+chunks instead.
+"""
+
+import io
+import os
+import mmap
+from typing import List, Optional
+
+from fastapi import UploadFile
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class UploadBuffer:
+    def __init__(self, filename: Optional[str], content_type: Optional[str], view: memoryview, _mmap: Optional[mmap.mmap] = None):
+        self.filename = filename
+        self.content_type = content_type
+        self.view = view
+        self._mmap = _mmap
+        self._bytes: Optional[bytes] = None
+
+    @property
+    def size(self) -> int:
+        return self.view.nbytes
+
+    def bytes(self) -> bytes:
+        """The upload as bytes, copied on first use and shared afterwards."""
+        if self._bytes is None:
+            self._bytes = self.view.tobytes()
+        return self._bytes
+
+    def stream(self) -> io.RawIOBase:
+        """A seekable file object over the view, for chunked uploads."""
+        return _ViewReader(self.view)
+
+    def close(self):
+        self.view.release()
+        if self._mmap is not None:
+            self._mmap.close()
+
+    @classmethod
+    async def from_upload(cls, upload: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> "UploadBuffer":
+        if upload.size is not None and upload.size > max_bytes:
+            raise UploadTooLarge(upload.filename)
+
+        spool = upload.file
+        inner = getattr(spool, "_file", spool)  # SpooledTemporaryFile wraps BytesIO or a real file
+
+        if isinstance(inner, io.BytesIO):
+            view = inner.getbuffer()
+            buf = cls(upload.filename, upload.content_type, view)
+        elif hasattr(inner, "fileno"):
+            inner.flush()
+            if os.fstat(inner.fileno()).st_size == 0:
+                buf = cls(upload.filename, upload.content_type, memoryview(b""))
+            else:
+                mapped = mmap.mmap(inner.fileno(), 0, access=mmap.ACCESS_READ)
+                buf = cls(upload.filename, upload.content_type, memoryview(mapped), mapped)
+        else:
+            await upload.seek(0)
+            buf = cls(upload.filename, upload.content_type, memoryview(await upload.read()))
+
+        if buf.size > max_bytes:
+            buf.close()
+            raise UploadTooLarge(upload.filename)
+        return buf
+
+
+class _ViewReader(io.RawIOBase):
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: self._view.nbytes}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def readinto(self, b) -> int:
+        chunk = self._view[self._pos:self._pos + len(b)]
+        n = chunk.nbytes
+        b[:n] = chunk
+        chunk.release()
+        self._pos += n
+        return n
+
+
+async def read_uploads(uploads: List[UploadFile]) -> List[UploadBuffer]:
+    return [await UploadBuffer.from_upload(u) for u in uploads]
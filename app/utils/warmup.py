@@ -0,0 +1,94 @@
+"""
+Background warm-up of heavy dependencies, behind the /ready endpoint.
+
+The API starts serving as soon as the routers are mounted; the provider
+SDKs, PyMuPDF and the OpenCV/NumPy OMR stack are imported on a thread
+right after startup, the provider clients are built, and the CPU pool
+is spun up. /ready answers 503 until that has finished, so a load
+balancer only routes traffic once the first request will not pay for
+it. Nothing depends on the warm-up: a request that arrives earlier just
+imports what it needs on first use.
+
+    STARTUP_WARMUP=0       skip it (scripts, tests)
+    STARTUP_WARM_POOL=0    leave the process pool to start on first use
+    OCR_PRELOAD_YOLO=1     also load the YOLO diagram model
+"""
+
+import os
+import time
+import asyncio
+import logging
+import inspect
+import importlib
+from typing import Optional
+
+from app.utils.pool import get_process_pool, POOL_WORKERS, run_in_process
+from app.utils.provider_clients import provider_clients
+
+logger = logging.getLogger(__name__)
+
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1") == "1"
+STARTUP_WARM_POOL = os.getenv("STARTUP_WARM_POOL", "1") == "1"
+OCR_PRELOAD_YOLO = os.getenv("OCR_PRELOAD_YOLO", "0") == "1"
+
+# Imported in this order; a module that is not installed is reported, not fatal
+HEAVY_MODULES = [
+    "google.genai.types",
+    "fitz",
+    "numpy",
+    "cv2",
+    "app.utils.omr",
+    "app.utils.scoring",
+    "openai",
+    "cohere",
+]
+
+state = {"ready": False, "started_at": None, "ready_in_s": None, "steps": {}, "errors": {}}
+
+
+def _preload_worker() -> int:
+    """Runs in each pool worker so the first OMR job finds OpenCV imported."""
+    importlib.import_module("app.utils.omr")
+    return os.getpid()
+
+
+async def _step(name: str, fn, *args):
+    started = time.perf_counter()
+    try:
+        result = fn(*args)
+        if inspect.isawaitable(result):
+            await result
+        state["steps"][name] = round(time.perf_counter() - started, 3)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        state["errors"][name] = f"{type(e).__name__}: {e}"[:300]
+        logger.warning(f"Warm-up step {name} failed: {e}")
+
+
+async def warm_up():
+    state["started_at"] = time.time()
+    started = time.perf_counter()
+
+    for module in HEAVY_MODULES:
+        await _step(f"import:{module}", asyncio.to_thread, importlib.import_module, module)
+    await _step("provider_clients", provider_clients.start)
+    if STARTUP_WARM_POOL:
+        get_process_pool()
+        await _step("process_pool", lambda: asyncio.gather(*(run_in_process(_preload_worker) for _ in range(POOL_WORKERS))))
+    if OCR_PRELOAD_YOLO:
+        from app.utils import ocr
+
+        await _step("yolo", asyncio.to_thread, ocr.get_yolo_model)
+
+    state["ready"] = True
+    state["ready_in_s"] = round(time.perf_counter() - started, 3)
+    logger.info(f"Warm-up finished in {state['ready_in_s']}s ({len(state['errors'])} step(s) failed).")
+
+
+def start_warm_up() -> Optional[asyncio.Task]:
+    """Schedule the warm-up on the running loop (or mark ready at once when disabled)."""
+    if not STARTUP_WARMUP:
+        state["ready"] = True
+        return None
+    return asyncio.create_task(warm_up())
@@ -0,0 +1,197 @@
+"""
+Standalone evaluation worker.
+
+Pulls jobs from the shared evaluation_jobs table, grades them with the
+same code path as /mcq/evaluate and posts the result to the job's
+callback URL if one was given. Run as many copies as you like, on any
+host that can reach the database:
+
+    python -m app.worker --processes 4 --concurrency 2
+"""
+
+import os
+import io
+import socket
+import asyncio
+import logging
+import argparse
+import multiprocessing
+from typing import List, Optional
+
+import httpx
+from starlette.datastructures import Headers, UploadFile
+
+from app.routers.mcq import resolve_answer_key, resolve_omr_template, resolve_marking, grade_student, save_evaluation
+from app.utils import job_queue, tracing
+from app.utils.evaluation_store import evaluation_store
+from app.utils.provider_clients import provider_clients
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+CALLBACK_TIMEOUT = float(os.getenv("JOB_CALLBACK_TIMEOUT", "10"))
+DB_RETRY_MAX_DELAY = float(os.getenv("JOB_DB_RETRY_MAX_DELAY", "30"))
+FINISH_ATTEMPTS = 5  # after that the lease runs out and another worker re-runs the job
+
+
+def _as_upload(record: dict) -> UploadFile:
+    return UploadFile(
+        file=io.BytesIO(record["data"]),
+        filename=record["filename"],
+        headers=Headers({"content-type": record["content_type"]}),
+    )
+
+
+async def run_job(job: dict) -> dict:
+    payload = job["payload"]
+    scripts = [_as_upload(f) for f in job["files"] if f["role"] == "script"]
+    key_files = [_as_upload(f) for f in job["files"] if f["role"] == "key"]
+
+    answer_map, error = await resolve_answer_key(
+        payload.get("type_answer_key_text"),
+        key_files[0] if key_files else None,
+        payload.get("answer_key_id"),
+    )
+    if error:
+        return {"error": error}
+
+    omr_template, error = await resolve_omr_template(payload.get("omr_template_id"))
+    if error:
+        return {"error": error}
+    marking = resolve_marking(payload.get("marks_correct"), payload.get("marks_wrong"), payload.get("marks_unanswered"))
+    result = await grade_student(answer_map, scripts, omr_template, marking)
+    return save_evaluation(result, answer_map, payload.get("exam_id"), payload.get("student_id"))
+
+
+def _backoff(failures: int) -> float:
+    return min(POLL_INTERVAL * 2 ** (failures - 1), DB_RETRY_MAX_DELAY)
+
+
+async def _keep_lease(job_id: str, owner: str):
+    while True:
+        await asyncio.sleep(job_queue.LEASE_SECONDS / 3)
+        try:
+            extended = await asyncio.to_thread(job_queue.extend_lease, job_id, owner)
+        except Exception as e:
+            logger.warning(f"Extending the lease on job {job_id} failed: {e}")
+            continue  # the next beat still falls inside the lease
+        if not extended:
+            logger.warning(f"Lost lease on job {job_id}")
+            return
+
+
+async def _finish(job: dict, owner: str, result: Optional[dict], error: Optional[str]) -> bool:
+    for attempt in range(1, FINISH_ATTEMPTS + 1):
+        try:
+            return await asyncio.to_thread(job_queue.finish_job, job["id"], owner, result, error)
+        except Exception as e:
+            logger.warning(f"[{owner}] saving job {job['id']} failed (attempt {attempt}/{FINISH_ATTEMPTS}): {e}")
+            if attempt < FINISH_ATTEMPTS:
+                await asyncio.sleep(_backoff(attempt))
+    logger.error(f"[{owner}] job {job['id']} could not be saved; it will be retried when its lease expires")
+    return False
+
+
+async def _send_callback(http: httpx.AsyncClient, job: dict, result: Optional[dict], error: Optional[str]):
+    # Checked again at send time: the host's DNS may have changed since the job was submitted
+    callback_error = await asyncio.to_thread(job_queue.callback_url_error, job["callback_url"])
+    if callback_error:
+        logger.warning(f"Callback for job {job['id']} not sent: {callback_error}")
+        return
+    try:
+        await http.post(job["callback_url"], json={
+            "job_id": job["id"],
+            "status": "failed" if error else "done",
+            "result": result,
+            "error": error,
+        })
+    except Exception as e:
+        logger.warning(f"Callback for job {job['id']} failed: {e}")
+
+
+async def worker_loop(owner: str, stop: asyncio.Event, http: httpx.AsyncClient):
+    failures = 0
+    while not stop.is_set():
+        # A locked or unreachable database is waited out, not allowed to stop the worker
+        try:
+            job = await asyncio.to_thread(job_queue.claim_job, owner)
+            failures = 0
+        except Exception as e:
+            failures += 1
+            logger.warning(f"[{owner}] claiming a job failed: {e}; retrying in {_backoff(failures):.1f}s")
+            job = None
+        if not job:
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=_backoff(failures) if failures else POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        logger.info(f"[{owner}] running job {job['id']} (attempt {job['attempts']})")
+        heartbeat = asyncio.create_task(_keep_lease(job["id"], owner))
+        result, error = None, None
+        with tracing.traced(job["id"]) as trace:
+            try:
+                result = await run_job(job)
+                if "error" in result and not result.get("details"):
+                    error = result["error"]
+            except Exception as e:
+                logger.error(f"[{owner}] job {job['id']} crashed: {e}", exc_info=True)
+                error = f"Evaluation failed: {e}"
+            finally:
+                heartbeat.cancel()
+                if trace:
+                    trace.log(job_attempt=job["attempts"], status="failed" if error else "done")
+
+        if await _finish(job, owner, result, error):
+            if job["callback_url"]:
+                await _send_callback(http, job, result, error)
+
+
+async def run_workers(concurrency: int = 1, stop: Optional[asyncio.Event] = None):
+    stop = stop or asyncio.Event()
+    base = f"{socket.gethostname()}:{os.getpid()}"
+    async with httpx.AsyncClient(timeout=CALLBACK_TIMEOUT) as http:
+        await asyncio.gather(*(worker_loop(f"{base}:{i}", stop, http) for i in range(concurrency)))
+
+
+async def _serve(concurrency: int):
+    await provider_clients.start()
+    try:
+        await run_workers(concurrency)
+    finally:
+        await evaluation_store.close()
+        await provider_clients.aclose()
+
+
+def _process_main(concurrency: int):
+    try:
+        asyncio.run(_serve(concurrency))
+    except KeyboardInterrupt:
+        pass
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Run MCQ evaluation job workers.")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes to start on this host.")
+    parser.add_argument("--concurrency", type=int, default=2, help="Jobs each process runs at the same time.")
+    args = parser.parse_args(argv)
+
+    if args.processes <= 1:
+        _process_main(args.concurrency)
+        return
+
+    procs = [multiprocessing.Process(target=_process_main, args=(args.concurrency,)) for _ in range(args.processes)]
+    for p in procs:
+        p.start()
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Load test: N concurrent /mcq/evaluate requests against a slow fake Gemini.
+
+The Gemini client is swapped for a stand-in that takes --delay seconds to
+answer, and the app is driven in-process over ASGI. With non-blocking
+provider calls, N requests should finish in roughly the time of one.
+Pass --blocking to reproduce the old behaviour (a synchronous call inside
+the request coroutine) for comparison.
+
+Usage:
+    python -m benchmarks.concurrent_evaluate -n 8 --delay 1.0
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("EXTRACTION_CACHE_ENABLED", "0")
+os.environ.setdefault("OMR_ENABLED", "0")  # local OMR is CPU-bound; this measures provider concurrency
+os.environ.setdefault("EVAL_STORE_ENABLED", "0")  # keep benchmark results out of cbse.db
+
+import httpx
+
+from app.main import app
+from app.routers import mcq
+from app.utils.provider_clients import provider_clients
+
+SAMPLE_SHEET = next(Path("uploaded_sheets").glob("*.png"), None)
+ANSWERS = {"answers": {"1": "A", "2": "B", "3": "C"}}
+
+
+class FakeModels:
+    def __init__(self, delay: float, blocking: bool):
+        self.delay = delay
+        self.blocking = blocking
+
+    async def generate_content(self, **kwargs):
+        if self.blocking:
+            time.sleep(self.delay)
+        else:
+            await asyncio.sleep(self.delay)
+        return SimpleNamespace(text=json.dumps(ANSWERS))
+
+
+def install_fake_gemini(delay: float, blocking: bool):
+    provider_clients.gemini = SimpleNamespace(aio=SimpleNamespace(models=FakeModels(delay, blocking)))
+
+
+async def one_request(http: httpx.AsyncClient, sheet: bytes) -> dict:
+    resp = await http.post(
+        "/mcq/evaluate",
+        files={"student_answer_scripts": ("sheet.png", sheet, "image/png")},
+        data={"type_answer_key_text": "1 A, 2 B, 3 C"},
+    )
+    resp.raise_for_status()
+    return resp.json()
+
+
+async def run(n: int, sheet: bytes) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one_request(http, sheet) for _ in range(n)))
+        elapsed = time.perf_counter() - start
+
+    bad = [r for r in results if r.get("score") != 3]
+    if bad:
+        raise SystemExit(f"Unexpected responses: {bad[:1]}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--requests", type=int, default=8)
+    parser.add_argument("--delay", type=float, default=1.0, help="Simulated provider latency in seconds.")
+    parser.add_argument("--blocking", action="store_true", help="Simulate a synchronous provider call.")
+    args = parser.parse_args()
+
+    if SAMPLE_SHEET is None:
+        sys.exit("No sample sheet found in uploaded_sheets/.")
+    sheet = SAMPLE_SHEET.read_bytes()
+
+    install_fake_gemini(args.delay, args.blocking)
+    single = asyncio.run(run(1, sheet))
+    many = asyncio.run(run(args.requests, sheet))
+
+    limit = mcq.PROVIDER_CONCURRENCY["gemini"]
+    print(f"provider delay      : {args.delay:.2f}s ({'blocking' if args.blocking else 'async'})")
+    print(f"gemini concurrency  : {limit}")
+    print(f"1 request           : {single:.2f}s")
+    print(f"{args.requests} concurrent requests: {many:.2f}s  ({many / single:.1f}x a single request)")
+
+    if not args.blocking and args.requests <= limit and many > single * 2:
+        sys.exit("FAIL: concurrent requests were serialized.")
+
+
+if __name__ == "__main__":
+    main()
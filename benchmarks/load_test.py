@@ -0,0 +1,263 @@
+"""
+Offline load test for /mcq/evaluate.
+
+Starts the mock provider server (benchmarks.mock_llm) and the API under
+uvicorn, both as local subprocesses, with every provider pointed at the
+mock. Then it posts the sheets in --dir (round robin) from --concurrency
+clients until --requests have completed. It reports:
+
+- throughput and p50/p95/p99 latency;
+- HTTP and grading errors;
+- which fallback tier produced each result (read from the Server-Timing
+  header), and how many provider attempts each request needed;
+- the calls the mock saw per tier.
+
+Latency and error options are passed through to the mock, so fallback
+and hedging behaviour can be measured without network access or keys.
+Use --url to load an already running API instead (then only the mock is
+started, and that API must already point at it).
+
+Usage:
+    python -m benchmarks.load_test -n 200 -c 16
+    python -m benchmarks.load_test --latency gemini=lognormal:1.2:0.5 --error-rate gemini-2.0-flash-exp=0.3:429
+    python -m benchmarks.load_test --app-env HEDGE_ENABLED=1 --app-env EXTRACTION_CHUNK_PAGES=4
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import httpx
+
+from benchmarks.mock_llm import DEFAULT_ANSWERS
+
+CONTENT_TYPES = {".pdf": "application/pdf", ".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg"}
+EXTRACTION_SPAN = re.compile(r'(?:^|,\s*)extraction;dur=[\d.]+;desc="([^"]*)"')
+ATTEMPT_SPAN = re.compile(r'(?:^|,\s*)attempt;dur=[\d.]+;desc="[^"]*outcome=(\w+)')
+
+
+def load_uploads(folder: str) -> List[Tuple[str, bytes, str]]:
+    uploads = []
+    for path in sorted(Path(folder).iterdir()):
+        content_type = CONTENT_TYPES.get(path.suffix.lower())
+        if content_type:
+            uploads.append((path.name, path.read_bytes(), content_type))
+    return uploads
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0-100)."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(1, min(len(ordered), round(q / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+
+def winning_tier(server_timing: str, body: dict) -> str:
+    match = EXTRACTION_SPAN.search(server_timing or "")
+    if match:
+        attrs = dict(pair.split("=", 1) for pair in match.group(1).split() if "=" in pair)
+        return attrs.get("tier") if attrs.get("tier") not in (None, "None") else attrs.get("source", "none")
+    # No provider extraction: local OMR, nothing to extract (blank pages), or a cache hit
+    if body.get("engine"):
+        return body["engine"]
+    return "no_extraction" if "error" in body else "cache"
+
+
+# ==================================================================
+# PROCESSES
+# ==================================================================
+
+def start_process(args: List[str], env: Optional[dict] = None, log=subprocess.DEVNULL) -> subprocess.Popen:
+    kwargs = {}
+    if sys.platform == "win32":
+        kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+    return subprocess.Popen([sys.executable, *args], env={**os.environ, **(env or {})}, stdout=log, stderr=log, **kwargs)
+
+
+def stop_process(proc: Optional[subprocess.Popen]):
+    if proc and proc.poll() is None:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+async def wait_until(url: str, timeout: float, proc: Optional[subprocess.Popen] = None):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=2.0) as http:
+        while time.monotonic() < deadline:
+            if proc and proc.poll() is not None:
+                raise SystemExit(f"Process serving {url} exited with code {proc.returncode}")
+            try:
+                if (await http.get(url)).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.25)
+    raise SystemExit(f"{url} was not ready after {timeout:.0f}s")
+
+
+def app_environment(mock_url: str, database: str, extra: List[str]) -> dict:
+    env = {
+        "DATABASE_URL": f"sqlite:///{database}",  # a scratch database, so runs never touch cbse.db
+        "GEMINI_API_KEY": "mock",
+        "GEMINI_BASE_URL": mock_url,
+        "AZURE_OPENAI_KEY": "mock",
+        "AZURE_OPENAI_ENDPOINT": mock_url,
+        "AZURE_OPENAI_DEPLOYMENT_NAME": "mock-gpt-4o",
+        "COHERE_API_KEY": "mock",
+        "COHERE_BASE_URL": mock_url,
+        "EXTRACTION_CACHE_ENABLED": "0",  # every request should reach the providers
+        "GEMINI_INLINE_MAX_BYTES": str(1 << 30),  # the mock does not emulate the Files API
+        "TRACING_ENABLED": "1",
+        "PYTHONUNBUFFERED": "1",
+    }
+    for item in extra:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return env
+
+
+# ==================================================================
+# LOAD
+# ==================================================================
+
+async def drive(base_url: str, uploads, answer_key: str, total: int, concurrency: int, expected: int) -> dict:
+    latencies, tiers, attempts, failures = [], Counter(), Counter(), Counter()
+    sheets = itertools.cycle(uploads)
+    remaining = iter(range(total))
+
+    async def client(http: httpx.AsyncClient):
+        for _ in remaining:
+            name, data, content_type = next(sheets)
+            started = time.perf_counter()
+            try:
+                resp = await http.post(
+                    "/mcq/evaluate",
+                    files={"student_answer_scripts": (name, data, content_type)},
+                    data={"type_answer_key_text": answer_key},
+                )
+            except httpx.HTTPError as e:
+                failures[type(e).__name__] += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            if resp.status_code != 200:
+                failures[f"http_{resp.status_code}"] += 1
+                continue
+            body = resp.json()
+            timing = resp.headers.get("server-timing", "")
+            tiers[winning_tier(timing, body)] += 1
+            attempts[len(ATTEMPT_SPAN.findall(timing))] += 1
+            if "error" in body:
+                failures["graded_with_error"] += 1
+            elif body.get("score") != expected:
+                failures["wrong_score"] += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as http:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(http) for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+    return {"wall": wall, "latencies": latencies, "tiers": tiers, "attempts": attempts, "failures": failures}
+
+
+def report(result: dict, total: int, concurrency: int, mock_stats: dict):
+    latencies = result["latencies"]
+    done = len(latencies)
+    print(f"requests      : {done}/{total} completed, concurrency {concurrency}, {result['wall']:.2f}s wall")
+    print(f"throughput    : {done / result['wall']:.2f} req/s" if result["wall"] else "throughput    : -")
+    print("latency (s)   : " + "  ".join(f"p{q}={percentile(latencies, q):.3f}" for q in (50, 95, 99))
+          + f"  max={max(latencies, default=0):.3f}")
+    print("failures      : " + (", ".join(f"{k}={v}" for k, v in result["failures"].most_common()) or "none"))
+    print("winning tier  :")
+    for tier, count in result["tiers"].most_common():
+        print(f"    {tier:<32} {count:>6}  ({100 * count / max(done, 1):.1f}%)")
+    print("attempts/req  : " + ", ".join(f"{n}={count}" for n, count in sorted(result["attempts"].items())))
+    print("mock calls    :")
+    for target, row in sorted(mock_stats.get("calls", {}).items()):
+        print(f"    {target:<32} ok={row.get('success', 0):>6} err={row.get('error', 0):>6} {row.get('bytes', 0) / 2**20:>8.2f} MB")
+
+
+async def run(args):
+    uploads = load_uploads(args.dir)
+    if not uploads:
+        raise SystemExit(f"No PDF/PNG/JPEG sheets in {args.dir}/")
+    answers = json.loads(Path(args.answers).read_text()) if args.answers else DEFAULT_ANSWERS
+    answer_key = ", ".join(f"{q} {a}" for q, a in answers.items())
+
+    mock_url = f"http://127.0.0.1:{args.mock_port}"
+    mock_args = ["-m", "benchmarks.mock_llm", "--port", str(args.mock_port)]
+    for rule in args.latency or []:
+        mock_args += ["--latency", rule]
+    for rule in args.error_rate or []:
+        mock_args += ["--error-rate", rule]
+    if args.answers:
+        mock_args += ["--answers", args.answers]
+    if args.seed is not None:
+        mock_args += ["--seed", str(args.seed)]
+
+    mock = api = None
+    log = open(args.app_log, "ab") if args.app_log else subprocess.DEVNULL
+    scratch = tempfile.TemporaryDirectory(prefix="load_test_")
+    try:
+        mock = start_process(mock_args)
+        await wait_until(mock_url + "/", 30, mock)
+        base_url = args.url
+        if not base_url:
+            base_url = f"http://127.0.0.1:{args.port}"
+            api = start_process(
+                ["-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(args.port), "--log-level", "warning"],
+                app_environment(mock_url, os.path.join(scratch.name, "load_test.db"), args.app_env or []),
+                log,
+            )
+        await wait_until(base_url + "/ready", 120, api)
+
+        if args.warmup:
+            await drive(base_url, uploads, answer_key, args.warmup, min(args.warmup, args.concurrency), len(answers))
+        result = await drive(base_url, uploads, answer_key, args.requests, args.concurrency, len(answers))
+        async with httpx.AsyncClient() as http:
+            mock_stats = (await http.get(mock_url + "/__stats")).json()
+    finally:
+        stop_process(api)
+        stop_process(mock)
+        if args.app_log:
+            log.close()
+        scratch.cleanup()
+
+    print(f"sheets        : {len(uploads)} from {args.dir}/, {len(answers)}-question key")
+    report(result, args.requests, args.concurrency, mock_stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--requests", type=int, default=100)
+    parser.add_argument("-c", "--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=4, help="Requests sent (and not measured) before the run")
+    parser.add_argument("--dir", default="uploaded_sheets")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the API under test")
+    parser.add_argument("--mock-port", type=int, default=9100)
+    parser.add_argument("--url", help="Load an already running API instead of starting one")
+    parser.add_argument("--app-env", action="append", metavar="KEY=VALUE", help="Extra environment for the API process")
+    parser.add_argument("--app-log", help="Append the API's output (including app.trace lines) to this file")
+    parser.add_argument("--answers", help="Canned answer map JSON (also used as the answer key)")
+    parser.add_argument("--latency", action="append", metavar="TARGET=DIST:PARAMS", help="Passed to the mock (see benchmarks.mock_llm)")
+    parser.add_argument("--error-rate", action="append", metavar="TARGET=RATE[:STATUS]", help="Passed to the mock")
+    parser.add_argument("--seed", type=int)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
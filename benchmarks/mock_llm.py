@@ -0,0 +1,191 @@
+"""
+Local stand-in for the Gemini, Azure OpenAI and Cohere HTTP APIs.
+
+Answers every extraction call with a canned answer map after a sampled
+delay, and fails a configurable share of calls with an HTTP error, so
+the fallback chain, circuit breakers and hedging can be load-tested
+offline. Point the app at it with:
+
+    GEMINI_BASE_URL=http://127.0.0.1:9100
+    AZURE_OPENAI_ENDPOINT=http://127.0.0.1:9100   (plus any AZURE_OPENAI_KEY / _DEPLOYMENT_NAME)
+    COHERE_BASE_URL=http://127.0.0.1:9100         (plus any COHERE_API_KEY)
+
+Latency and error rules apply to a target: a provider (gemini, azure,
+cohere), a model / deployment name, or * for everything. The most
+specific rule wins (model, then provider, then *).
+
+    --latency TARGET=fixed:SECONDS | uniform:LOW:HIGH | normal:MEAN:SD | lognormal:MEDIAN:SIGMA
+    --error-rate TARGET=RATE[:STATUS]      (STATUS defaults to 503)
+
+Call counts per target and outcome are served at GET /__stats.
+
+Usage:
+    python -m benchmarks.mock_llm --port 9100
+    python -m benchmarks.mock_llm --latency gemini=lognormal:1.5:0.5 --error-rate gemini-2.0-flash-exp=0.3:429
+    python -m benchmarks.mock_llm --answers answers.json --latency '*=uniform:0.2:0.8'
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+DEFAULT_ANSWERS = {str(q): "ABCD"[(q - 1) % 4] for q in range(1, 21)}
+DISTRIBUTIONS = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+
+
+class Scenario:
+    """Latency / error rules and the canned answers, parsed from the CLI."""
+
+    def __init__(self, answers: dict, latency: Dict[str, Tuple[str, list]], errors: Dict[str, Tuple[float, int]], seed: Optional[int] = None):
+        self.answers = answers
+        self.latency = latency
+        self.errors = errors
+        self.random = random.Random(seed)
+
+    @staticmethod
+    def _rule(rules: dict, provider: str, model: str):
+        for target in (model, provider, "*"):
+            if target in rules:
+                return rules[target]
+        return None
+
+    def delay(self, provider: str, model: str) -> float:
+        rule = self._rule(self.latency, provider, model)
+        if rule is None:
+            return 0.0
+        dist, params = rule
+        if dist == "fixed":
+            value = params[0]
+        elif dist == "uniform":
+            value = self.random.uniform(*params)
+        elif dist == "normal":
+            value = self.random.gauss(*params)
+        else:  # lognormal: median, sigma
+            value = params[0] * self.random.lognormvariate(0.0, params[1])
+        return max(0.0, value)
+
+    def error(self, provider: str, model: str) -> Optional[int]:
+        rule = self._rule(self.errors, provider, model)
+        if rule and self.random.random() < rule[0]:
+            return rule[1]
+        return None
+
+
+def parse_latency(specs) -> Dict[str, Tuple[str, list]]:
+    rules = {}
+    for spec in specs or []:
+        target, _, rule = spec.partition("=")
+        dist, *params = rule.split(":")
+        if dist not in DISTRIBUTIONS or len(params) != DISTRIBUTIONS[dist]:
+            raise argparse.ArgumentTypeError(f"Bad latency rule '{spec}'")
+        rules[target] = (dist, [float(p) for p in params])
+    return rules
+
+
+def parse_errors(specs) -> Dict[str, Tuple[float, int]]:
+    rules = {}
+    for spec in specs or []:
+        target, _, rule = spec.partition("=")
+        rate, _, status = rule.partition(":")
+        rules[target] = (float(rate), int(status or 503))
+    return rules
+
+
+def create_app(scenario: Scenario) -> FastAPI:
+    app = FastAPI(title="Mock LLM providers")
+    calls: Counter = Counter()
+    started = time.time()
+
+    async def respond(provider: str, model: str, body_bytes: int, success):
+        await asyncio.sleep(scenario.delay(provider, model))
+        status = scenario.error(provider, model)
+        calls[(provider, model, "error" if status else "success")] += 1
+        calls[(provider, model, "bytes")] += body_bytes
+        if status:
+            # Same error envelope shape as the Google APIs; the OpenAI and Cohere SDKs only need the status
+            return JSONResponse(status_code=status, content={"error": {"code": status, "message": "mock provider error", "status": "UNAVAILABLE"}})
+        return success(json.dumps(scenario.answers))
+
+    # ---------- Gemini: POST /v1beta/models/{model}:generateContent ----------
+    @app.post("/{version}/models/{target}")
+    async def gemini(version: str, target: str, request: Request):
+        model, _, action = target.partition(":")
+        body = await request.body()
+        if action != "generateContent":
+            return JSONResponse(status_code=404, content={"error": {"code": 404, "message": f"{action} not mocked"}})
+        return await respond("gemini", model, len(body), lambda text: {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP", "index": 0}],
+            "usageMetadata": {"promptTokenCount": len(body) // 4, "candidatesTokenCount": len(text) // 4, "totalTokenCount": (len(body) + len(text)) // 4},
+            "modelVersion": model,
+        })
+
+    # ---------- Azure OpenAI: POST /openai/deployments/{deployment}/chat/completions ----------
+    @app.post("/openai/deployments/{deployment}/chat/completions")
+    async def azure(deployment: str, request: Request):
+        body = await request.body()
+        return await respond("azure", deployment, len(body), lambda text: {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": deployment,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(body) // 4, "completion_tokens": len(text) // 4, "total_tokens": (len(body) + len(text)) // 4},
+        })
+
+    # ---------- Cohere: POST /v1/chat ----------
+    @app.post("/v1/chat")
+    async def cohere(request: Request):
+        body = await request.body()
+        model = json.loads(body or b"{}").get("model", "command")
+        return await respond("cohere", model, len(body), lambda text: {
+            "text": text,
+            "generation_id": uuid.uuid4().hex,
+            "finish_reason": "COMPLETE",
+            "meta": {"tokens": {"input_tokens": len(body) // 4, "output_tokens": len(text) // 4}},
+        })
+
+    @app.get("/__stats")
+    def stats():
+        rows = {}
+        for (provider, model, kind), count in calls.items():
+            rows.setdefault(f"{provider}:{model}", {})[kind] = count
+        return {"uptime_s": round(time.time() - started, 1), "calls": rows}
+
+    @app.head("/")
+    @app.get("/")
+    def root():
+        return {"status": "mock"}
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--answers", help="JSON file with the canned answer map, e.g. {\"1\": \"A\"}")
+    parser.add_argument("--latency", action="append", metavar="TARGET=DIST:PARAMS")
+    parser.add_argument("--error-rate", action="append", metavar="TARGET=RATE[:STATUS]")
+    parser.add_argument("--seed", type=int, help="Seed for reproducible latency and error sampling")
+    args = parser.parse_args()
+
+    answers = DEFAULT_ANSWERS
+    if args.answers:
+        with open(args.answers, encoding="utf-8") as f:
+            answers = json.load(f)
+    scenario = Scenario(answers, parse_latency(args.latency), parse_errors(args.error_rate), args.seed)
+    uvicorn.run(create_app(scenario), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
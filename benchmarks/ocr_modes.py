@@ -0,0 +1,93 @@
+"""
+Peak memory and wall time of process_answer_ocr per PDF preparation mode.
+
+Builds a scanned answer booklet (--pages noisy handwriting-like pages,
+default 40), then runs process_answer_ocr once per mode, each in a fresh
+interpreter so one mode's high-water mark cannot hide another's. The
+Gemini call is replaced by a stand-in that returns an empty answer set.
+
+Only the calling process is measured: in legacy mode the page renders
+also use the CPU pool workers, so its real footprint is larger still.
+
+Usage:
+    python -m benchmarks.ocr_modes --pages 40
+    python -m benchmarks.ocr_modes --modes stream legacy
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import cv2
+import fitz  # PyMuPDF
+import numpy as np
+
+MODES = ["direct", "stream", "legacy"]
+
+
+def booklet(pages: int, path: str):
+    rng = np.random.default_rng(0)
+    doc = fitz.open()
+    for n in range(pages):
+        img = np.full((1754, 1240), 235, np.uint8)
+        for line in range(40):
+            y = 120 + line * 38
+            cv2.putText(img, f"Q{n * 40 + line + 1}. " + "answer " * 6, (80, y), cv2.FONT_HERSHEY_SCRIPT_SIMPLEX, 0.9, 30, 2)
+        img = np.clip(img + rng.normal(0, 10, img.shape), 0, 255).astype(np.uint8)
+        ok, jpg = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 75])
+        page = doc.new_page(width=595, height=842)
+        page.insert_image(page.rect, stream=jpg.tobytes())
+    doc.save(path)
+    doc.close()
+
+
+def child(path: str, mode: str):
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    from app.utils import ocr
+    from app.utils.pool import shutdown_process_pool
+
+    class FakeClient:
+        def generate_structured_json(self, contents, schema, call_type_for_logging=""):
+            return ocr.MockResponse("{}")
+
+    ocr.GRADING_CLIENT_INSTANCE = FakeClient()
+    with tempfile.TemporaryDirectory() as out:
+        result = ocr.process_answer_ocr(path, out, out, 1, mode=mode)
+    shutdown_process_pool()
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--child", nargs=2, metavar=("PDF", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "booklet.pdf")
+        booklet(args.pages, path)
+        print(f"booklet: {args.pages} pages, {os.path.getsize(path) / 2**20:.1f} MB")
+        print(f"{'mode':<8} {'pages':>5} {'wall s':>8} {'peak RSS MB':>12} {'delta MB':>9}")
+        for mode in args.modes:
+            proc = subprocess.run([sys.executable, "-m", "benchmarks.ocr_modes", "--child", path, mode],
+                                  capture_output=True, text=True)
+            if proc.returncode != 0 or not proc.stdout.strip():
+                print(f"{mode:<8} failed:\n{proc.stderr[-2000:]}")
+                continue
+            r = json.loads(proc.stdout.strip().splitlines()[-1])
+            if not r.get("success"):
+                print(f"{mode:<8} failed: {r.get('error')}")
+                continue
+            print(f"{r['mode']:<8} {r['pages_processed']:>5} {r['wall_time_s']:>8.2f} {r['peak_rss_mb']:>12.1f} {r['rss_delta_mb']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
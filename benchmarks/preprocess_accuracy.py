@@ -0,0 +1,137 @@
+"""
+Accuracy regression harness for the image preprocessing stage.
+
+Every sheet under --dir (images, and PDF pages rendered to PNG) is run
+through each preprocessing preset and then through the real extraction
+chain. Accuracy is the share of reference answers reproduced. The
+reference is --truth (JSON: {"file name": {"1": "A", ...}}) when given,
+otherwise what the providers extract from the original, unprocessed
+upload. The last line names the smallest preset that keeps accuracy
+within --tolerance of the original.
+
+Needs provider keys in the environment; --dry-run only reports payload
+sizes and preprocessing time, with no provider calls.
+
+Usage:
+    python -m benchmarks.preprocess_accuracy --dry-run
+    python -m benchmarks.preprocess_accuracy --truth sheets_truth.json
+    python -m benchmarks.preprocess_accuracy --presets original jpeg85-2000 webp60-1600
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+os.environ["PREPROCESS_ENABLED"] = "0"  # presets are applied here, not again inside the extractor
+os.environ.setdefault("EXTRACTION_CACHE_ENABLED", "0")
+
+from app.prompts.mcq_prompt import STUDENT_ANSWER_EXTRACTION_PROMPT
+from app.utils.preprocess import PreprocessOptions, preprocess_image
+from app.utils.uploads import UploadBuffer
+
+PRESETS: Dict[str, Optional[PreprocessOptions]] = {
+    "original": None,
+    "jpeg85-2000": PreprocessOptions(fmt="jpeg", quality=85, max_edge=2000),
+    "jpeg75-1600": PreprocessOptions(fmt="jpeg", quality=75, max_edge=1600),
+    "webp60-1600": PreprocessOptions(fmt="webp", quality=60, max_edge=1600),
+    "webp50-1200": PreprocessOptions(fmt="webp", quality=50, max_edge=1200),
+    "binary-png-1600": PreprocessOptions(fmt="png", max_edge=1600, binarize=True),
+    "binary-webp-1200": PreprocessOptions(fmt="webp", quality=40, max_edge=1200, binarize=True),
+}
+IMAGE_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg"}
+
+
+def load_sheets(folder: str) -> List[Tuple[str, bytes, str]]:
+    """(name, bytes, content type) per image, and per PDF page as PNG."""
+    import fitz  # PyMuPDF
+
+    sheets = []
+    for path in sorted(Path(folder).iterdir()):
+        suffix = path.suffix.lower()
+        if suffix in IMAGE_TYPES:
+            sheets.append((path.name, path.read_bytes(), IMAGE_TYPES[suffix]))
+        elif suffix == ".pdf":
+            doc = fitz.open(path)
+            for i, page in enumerate(doc):
+                sheets.append((f"{path.name}#{i + 1}", page.get_pixmap(dpi=200).tobytes("png"), "image/png"))
+            doc.close()
+    return sheets
+
+
+def accuracy(reference: dict, answers: dict) -> Optional[float]:
+    if not reference:
+        return None
+    hits = sum(str(answers.get(q, "")).upper() == str(a).upper() for q, a in reference.items())
+    return hits / len(reference)
+
+
+async def extract(data: bytes, content_type: str) -> dict:
+    from app.routers.mcq import ai_extract_answers
+
+    buffer = UploadBuffer("sheet", content_type, memoryview(data))
+    try:
+        return await ai_extract_answers([buffer], STUDENT_ANSWER_EXTRACTION_PROMPT)
+    finally:
+        buffer.close()
+
+
+async def run(args) -> None:
+    from app.utils.provider_clients import provider_clients
+
+    sheets = load_sheets(args.dir)
+    truth = json.loads(Path(args.truth).read_text()) if args.truth else {}
+    presets = {name: PRESETS[name] for name in args.presets}
+    rows = {name: {"bytes": 0, "ms": 0.0, "scores": []} for name in presets}
+    original_bytes = sum(len(data) for _, data, _ in sheets)
+
+    try:
+        for name, data, content_type in sheets:
+            reference = truth.get(name)
+            if reference is None and not args.dry_run:
+                reference = await extract(data, content_type)
+            for preset, options in presets.items():
+                started = time.perf_counter()
+                payload, payload_type = (data, content_type) if options is None else preprocess_image(data, content_type, options)[:2]
+                rows[preset]["ms"] += (time.perf_counter() - started) * 1000
+                rows[preset]["bytes"] += len(payload)
+                if not args.dry_run:
+                    answers = reference if options is None and name not in truth else await extract(payload, payload_type)
+                    score = accuracy(reference, answers)
+                    if score is not None:
+                        rows[preset]["scores"].append(score)
+    finally:
+        await provider_clients.aclose()
+
+    print(f"{len(sheets)} sheets, {original_bytes / 2**20:.2f} MB original"
+          f" ({'truth file' if truth else 'reference = original upload'})")
+    print(f"{'preset':<18} {'MB':>7} {'% orig':>7} {'ms/sheet':>9} {'accuracy':>9}")
+    results = []
+    for preset, row in rows.items():
+        acc = sum(row["scores"]) / len(row["scores"]) if row["scores"] else None
+        results.append((preset, row["bytes"], acc))
+        print(f"{preset:<18} {row['bytes'] / 2**20:>7.2f} {100 * row['bytes'] / max(original_bytes, 1):>6.1f}%"
+              f" {row['ms'] / max(len(sheets), 1):>9.1f} {'-' if acc is None else f'{acc:.3f}':>9}")
+
+    baseline = next((acc for preset, _, acc in results if preset == "original"), None)
+    if baseline is not None:
+        keeping = [(size, preset) for preset, size, acc in results if acc is not None and acc >= baseline - args.tolerance]
+        if keeping:
+            print(f"smallest preset within {args.tolerance:.3f} of the original: {min(keeping)[1]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default="uploaded_sheets")
+    parser.add_argument("--truth", help="JSON file of expected answers per sheet name")
+    parser.add_argument("--presets", nargs="+", choices=list(PRESETS), default=list(PRESETS))
+    parser.add_argument("--tolerance", type=float, default=0.0, help="accuracy a preset may lose vs the original")
+    parser.add_argument("--dry-run", action="store_true", help="payload sizes only, no provider calls")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
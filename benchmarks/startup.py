@@ -0,0 +1,74 @@
+"""
+Import-time report for the API process, to catch startup regressions.
+
+Runs `python -X importtime -c "import app.main"` in fresh interpreters
+(--runs, default 5) and prints the median total import time, the
+heaviest modules by cumulative time and which heavy optional
+dependencies were pulled in eagerly. With --budget, exits 1 when the
+median exceeds it, so it can gate CI.
+
+Usage:
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 10 --top 25 --budget 1.0
+    python -m benchmarks.startup --module app.worker
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+# Modules the API should only load in the background warm-up or on first use
+LAZY_MODULES = ["google.genai", "openai", "cohere", "fitz", "cv2", "numpy", "ultralytics", "torch"]
+
+
+def sample(module: str) -> dict:
+    """One cold import of `module`: {name: (self_us, cumulative_us)} in import order."""
+    env = {**os.environ, "GEMINI_API_KEY": os.environ.get("GEMINI_API_KEY", "benchmark"), "PYTHONPATH": os.getcwd()}
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, env=env)
+    if proc.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget", type=float, help="fail if the median import time (seconds) exceeds this")
+    args = parser.parse_args()
+
+    runs = [sample(args.module) for _ in range(args.runs)]
+    totals = [run[args.module][1] / 1e6 for run in runs]
+    cumulative = defaultdict(list)
+    for run in runs:
+        for name, (_, cum) in run.items():
+            cumulative[name].append(cum)
+
+    median = statistics.median(totals)
+    print(f"import {args.module}: median {median:.3f}s  min {min(totals):.3f}s  max {max(totals):.3f}s  ({args.runs} runs)")
+    print(f"\n{'cumulative ms':>13}  module")
+    heaviest = sorted(cumulative.items(), key=lambda kv: -statistics.median(kv[1]))
+    for name, values in heaviest[: args.top]:
+        print(f"{statistics.median(values) / 1000:>13.1f}  {name}")
+
+    eager = [m for m in LAZY_MODULES if m in runs[0]]
+    print(f"\neagerly imported heavy modules: {', '.join(eager) or 'none'}")
+
+    if args.budget is not None and median > args.budget:
+        print(f"FAIL: median {median:.3f}s exceeds budget {args.budget:.3f}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
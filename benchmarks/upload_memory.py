@@ -0,0 +1,147 @@
+"""
+Peak memory of one /mcq/evaluate request carrying a large scanned PDF.
+
+Builds a PDF of noisy JPEG pages (--size-mb, default 50), starts the
+app under uvicorn in a child process with a stand-in Gemini client,
+posts the PDF to /mcq/evaluate and samples the server's RSS every few
+milliseconds. Reports the peak and how far it rose above the idle
+server, i.e. what handling the upload costs, both as total RSS and as
+anonymous memory (RSS minus file-backed pages such as a mapped spool
+file, which the kernel can reclaim).
+
+Usage:
+    python -m benchmarks.upload_memory --size-mb 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("EXTRACTION_CACHE_ENABLED", "0")
+os.environ.setdefault("OMR_ENABLED", "0")
+os.environ.setdefault("MAX_UPLOAD_BYTES", str(200 * 1024 * 1024))
+
+import cv2
+import fitz  # PyMuPDF
+import httpx
+import numpy as np
+import psutil
+import uvicorn
+
+from app.main import app
+from app.utils.provider_clients import provider_clients
+
+
+class FakeModels:
+    async def generate_content(self, **kwargs):
+        await asyncio.sleep(0.05)
+        return SimpleNamespace(text=json.dumps({"answers": {"1": "A"}}))
+
+
+class FakeFiles:
+    """Drains the upload stream in 8 MB chunks, like the SDK's resumable upload."""
+
+    async def upload(self, file, config=None):
+        while file.read(8 * 1024 * 1024):
+            await asyncio.sleep(0)
+        return SimpleNamespace(name="files/bench", uri="https://example.invalid/files/bench")
+
+    async def delete(self, name):
+        pass
+
+
+def scanned_pdf(size_mb: int) -> bytes:
+    """Noise compresses badly, so each 1700x2400 JPEG page is a few MB."""
+    rng = np.random.default_rng(0)
+    doc = fitz.open()
+    while True:
+        img = rng.integers(0, 256, (2400, 1700), dtype=np.uint8)
+        ok, jpg = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        page = doc.new_page(width=595, height=842)
+        page.insert_image(page.rect, stream=jpg.tobytes())
+        data = doc.tobytes()
+        if len(data) >= size_mb * 1024 * 1024:
+            doc.close()
+            return data
+
+
+class RSSSampler(threading.Thread):
+    def __init__(self, pid: int, interval: float = 0.002):
+        super().__init__(daemon=True)
+        self.proc = psutil.Process(pid)
+        self.interval = interval
+        self.peak = self.peak_anon = 0
+        self.done = threading.Event()
+
+    def run(self):
+        while not self.done.is_set():
+            mem = self.proc.memory_info()
+            self.peak = max(self.peak, mem.rss)
+            # File-backed pages (the mmap'd spool file) are page cache the kernel can drop
+            self.peak_anon = max(self.peak_anon, mem.rss - mem.shared)
+            time.sleep(self.interval)
+
+
+def serve(port: int):
+    provider_clients.gemini = SimpleNamespace(aio=SimpleNamespace(models=FakeModels(), files=FakeFiles()))
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def run(pdf: bytes, port: int):
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.upload_memory", "--serve", str(port)])
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        with httpx.Client(base_url=base_url, timeout=None) as http:
+            for _ in range(100):
+                try:
+                    http.get("/docs")
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.2)
+
+            idle = psutil.Process(server.pid).memory_info()
+            sampler = RSSSampler(server.pid)
+            sampler.start()
+            start = time.perf_counter()
+            resp = http.post(
+                "/mcq/evaluate",
+                files={"student_answer_scripts": ("scan.pdf", pdf, "application/pdf")},
+                data={"type_answer_key_text": "1 A"},
+            )
+            elapsed = time.perf_counter() - start
+            time.sleep(0.05)
+            sampler.done.set()
+            sampler.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    resp.raise_for_status()
+    print(f"upload size         : {len(pdf) / 2**20:.1f} MB")
+    print(f"response            : {resp.json().get('score')} / {resp.json().get('total_questions')}")
+    print(f"wall time           : {elapsed * 1000:.0f} ms")
+    print(f"server peak RSS     : {sampler.peak / 2**20:.1f} MB ({(sampler.peak - idle.rss) / 2**20:+.1f} MB over idle)")
+    print(f"  anonymous         : {sampler.peak_anon / 2**20:.1f} MB ({(sampler.peak_anon - idle.rss + idle.shared) / 2**20:+.1f} MB over idle)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=50)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve)
+    else:
+        run(scanned_pdf(args.size_mb), args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -25,12 +25,15 @@ def main():
     print("\n[1/3] Starting Backend Server (Uvicorn)...")
     # Start uvicorn as a subprocess. Using sys.executable ensures we use the same venv.
     # We redirect output to avoid clutter, unless debugging is needed.
+    extra = {}
+    if sys.platform == "win32":
+        extra["creationflags"] = subprocess.CREATE_NEW_CONSOLE # Give it its own window/process group on Windows
     server_process = subprocess.Popen(
         [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", "8000"],
         cwd=os.getcwd(),
         # stdout=subprocess.DEVNULL, 
         # stderr=subprocess.PIPE,  # Capture stderr for errors
-        creationflags=subprocess.CREATE_NEW_CONSOLE # Try to give it its own window/process group on Windows
+        **extra
     )
 
     print(f"      Server process started with PID: {server_process.pid}")
@@ -0,0 +1,35 @@
+from app.utils.scoring import encode_answers, score_class, score_matrix
+
+
+def test_non_string_answers_are_graded_not_raised():
+    # A malformed extraction can put a list, dict, number or null where a letter belongs
+    key = {"1": "A", "2": "B", "3": "C", "4": "D", "5": "A"}
+    answers = {"1": ["A"], "2": {"option": "B"}, "3": None, "4": "d", "5": 1}
+
+    matrix = encode_answers(key, {"s1": answers})
+    scored = score_matrix(matrix)
+
+    assert scored["correct_count"][0] == 1   # only "d" -> "D"
+    assert scored["blank_count"][0] == 1     # None is unanswered
+    assert scored["wrong_count"][0] == 3
+
+
+def test_score_class_counts_add_up():
+    key = {"1": "A", "2": "B"}
+    report = score_class(key, {"s1": {"1": "A", "2": ["B", "C"]}, "s2": {}})
+
+    for student in report["students"]:
+        assert student["correct"] + student["wrong"] + student["unanswered"] == 2
+
+
+def test_kr20_never_reports_negative_zero():
+    import json
+
+    import numpy as np
+
+    from app.utils.scoring import item_analysis
+
+    key = {"1": "A", "2": "B"}
+    matrix = encode_answers(key, {"s1": {"1": "A"}, "s2": {"2": "B"}, "s3": {"1": "A", "2": "B"}})
+    report = item_analysis(matrix, np.asarray(score_matrix(matrix)["correct"]))
+    assert "-0.0" not in json.dumps(report["kr20"])